@@ -0,0 +1,456 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from search import SearchIndex
+from storage import (FAVORITES_DIR, STORAGE_ENGINES, USERS_FILE, LibraryRepository, dump_json, favorites_path,
+                     iter_records, open_backend, write_atomic)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_SEED = 42
+
+GENRES = ("Biography", "Contemporary Fiction", "Crime Fiction", "Fantasy", "Fantasy Romance", "Gothic Horror",
+          "Historical Romance", "Memoir", "Romance", "Science Fiction", "Thriller", "Poetry", "History",
+          "Philosophy", "Young Adult", "Self-Help")
+ADJECTIVES = ("Silent", "Broken", "Golden", "Hidden", "Last", "Crimson", "Wild", "Distant", "Burning", "Lost",
+              "Quiet", "Secret", "Frozen", "Midnight", "Hollow", "Bright", "Forgotten", "Iron", "Paper", "Northern")
+NOUNS = ("River", "Garden", "Empire", "Storm", "Letters", "House", "Kingdom", "Shadow", "Promise", "Orchard",
+         "Harbor", "Winter", "Crown", "Lantern", "Island", "Mountain", "Daughter", "Library", "Sea", "Road")
+FIRST_NAMES = ("Maria", "Juan", "Ana", "Jose", "Sofia", "Miguel", "Isabel", "Carlos", "Elena", "Rafael",
+               "Grace", "Daniel", "Clara", "Paolo", "Nina", "Marco", "Andrea", "Luis", "Bea", "Tomas")
+LAST_NAMES = ("Santos", "Reyes", "Cruz", "Bautista", "Garcia", "Mendoza", "Torres", "Flores", "Ramos", "Villanueva",
+              "Castillo", "Aquino", "Navarro", "Morales", "Dela Cruz", "Lopez", "Rivera", "Gonzales", "Tan", "Lim")
+STREETS = ("Rizal St.", "Mabini Ave.", "Bonifacio Rd.", "Luna St.", "Del Pilar St.", "Quezon Blvd.")
+
+
+def isbn13(number, prefix="978"):
+    """A valid ISBN-13 for ``number`` < 10**9."""
+    digits = f"{prefix}{number:09d}"
+    check = -sum((3 if i % 2 else 1) * int(digit) for i, digit in enumerate(digits)) % 10
+    return digits + str(check)
+
+
+def _day(rng, today, back):
+    return (today - timedelta(days=rng.randrange(back))).strftime("%Y-%m-%d")
+
+
+def generate_books(count, loaned, seed=DEFAULT_SEED, today=None):
+    """Yield ``count`` books, the indexes in ``loaned`` are marked as borrowed."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    for i in range(count):
+        title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+        if rng.random() < 0.3:
+            title = f"The {title} of {rng.choice(NOUNS)}"
+        yield {
+            "title": title,
+            "author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            # a multiplier coprime with 10**9 spreads the ISBNs and keeps them unique
+            "isbn": isbn13(i * 7919 % 10 ** 9),
+            "genre": rng.choice(GENRES),
+            "available": i not in loaned,
+            "date_added": _day(rng, today, 5 * 365),
+        }
+
+
+def generate_users(count, seed=DEFAULT_SEED):
+    """Yield ``count`` accounts; user ``i`` logs in as ``user{i}`` with the password ``pass{i}``."""
+    rng = random.Random(seed + 1)
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        faculty = rng.random() < 0.1
+        yield {
+            "role": "Faculty" if faculty else "Student",
+            "student_id": "Faculty" if faculty else f"{20000000 + i:08d}",
+            "name": f"{first} {last}",
+            "username": f"user{i}",
+            "password": f"pass{i}",
+            "email": f"user{i}@example.edu",
+            "contact": f"09{rng.randrange(10 ** 9):09d}",
+            "address": f"{rng.randrange(1, 999)} {rng.choice(STREETS)}",
+            "age": str(rng.randint(25, 65) if faculty else rng.randint(17, 24)),
+        }
+
+
+def generate_library(directory, books, users=None, loans=None, favorites=None, seed=DEFAULT_SEED,
+                     books_format="json"):
+    """Write a synthetic library to ``directory`` in the layout of the JSON stores.
+
+    The same arguments give the same library, with dates counted back from
+    today. Users default to one per 20 books, loans to half as many as users;
+    the first tenth of the users have ``favorites`` favorites each, by default
+    one per 1000 books and at least 10. Loans start over the last 20 days and
+    run for two weeks, so some are overdue. Books are streamed to disk, so
+    even a million of them don't have to fit in memory at once.
+    """
+    users = max(100, books // 20) if users is None else users
+    loans = min(books, users // 2) if loans is None else min(books, loans)
+    favorites = max(10, books // 1000) if favorites is None else favorites
+    rng = random.Random(seed + 2)
+    today = date.today()
+    os.makedirs(directory, exist_ok=True)
+
+    loaned = rng.sample(range(books), loans)
+    borrows = []
+    for index in loaned:
+        borrowed = today - timedelta(days=rng.randrange(20))
+        borrows.append({"isbn": isbn13(index * 7919 % 10 ** 9), "username": f"user{rng.randrange(users)}",
+                        "borrow_date": borrowed.strftime("%Y-%m-%d"),
+                        "due_date": (borrowed + timedelta(days=14)).strftime("%Y-%m-%d")})
+
+    books_file = os.path.join(directory, f"books.{books_format}")
+    book_records = generate_books(books, set(loaned), seed, today)
+    if books_format == "jsonl":
+        write_atomic(books_file, dump_json(books_file, book_records))
+    else:
+        write_atomic(books_file, _json_array(book_records))
+
+    users_file = os.path.join(directory, USERS_FILE)
+    write_atomic(users_file, dump_json(users_file, generate_users(users, seed)))
+    write_atomic(os.path.join(directory, "borrows.json"), json.dumps(borrows, indent=4))
+    favorites_dir = os.path.join(directory, FAVORITES_DIR)
+    os.makedirs(favorites_dir, exist_ok=True)
+    total_favorites = 0
+    for user in range(max(1, users // 10)):
+        isbns = [isbn13(index * 7919 % 10 ** 9) for index in rng.sample(range(books), min(books, favorites))]
+        write_atomic(favorites_path(favorites_dir, f"user{user}"), json.dumps(isbns), durability="off")
+        total_favorites += len(isbns)
+    return {"books": books, "users": users, "loans": loans, "favorites": total_favorites}
+
+
+def _json_array(records):
+    yield "["
+    for i, record in enumerate(records):
+        yield ("\n" if i == 0 else ",\n") + json.dumps(record)
+    yield "\n]"
+
+
+def summarize(operation, samples, **extra):
+    """One result row: the spread of ``samples`` (seconds) in milliseconds."""
+    samples = sorted(samples)
+    result = {"operation": operation, "runs": len(samples)}
+    result.update(extra)
+    result.update({
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "max_ms": samples[-1] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+    })
+    return result
+
+
+def _timed(call, *args):
+    started = time.perf_counter()
+    result = call(*args)
+    return time.perf_counter() - started, result
+
+
+@contextmanager
+def _working_directory(path):
+    # the stores use paths relative to the working directory, like the app
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def search_queries(books, rng):
+    """Queries of each kind the search box sees, taken from the catalog itself."""
+    book = rng.choice(books)
+    return {
+        "one letter": "a",
+        "two letters": book["title"][:2].lower(),
+        "word": book["title"].split()[-1].lower(),
+        "author": book["author"].split()[-1].lower(),
+        "isbn prefix": "978",
+        "full isbn": book["isbn"],
+        "no match": "zzqx",
+    }
+
+
+def bench_storage(directory, engine, books_file="books.json", repeat=5, mutations=100, seed=DEFAULT_SEED,
+                  durability="normal"):
+    """Time the repository operations behind the dashboards on one engine; returns result rows."""
+    rng = random.Random(seed + 3)
+    results = []
+
+    def open_repository():
+        return LibraryRepository(open_backend(engine, books_file=books_file, durability=durability))
+
+    with _working_directory(directory):
+        if engine == "sqlite":
+            # the first run copies the JSON stores into the database
+            elapsed, repository = _timed(open_repository)
+            repository.close()
+            results.append(summarize("sqlite_import", [elapsed]))
+
+        # a cold load opens the stores from scratch every time
+        samples = []
+        for _ in range(repeat):
+            repository = open_repository()
+            samples.append(_timed(repository.get_books)[0])
+            repository.close()
+        results.append(summarize("load_books", samples))
+
+        repository = open_repository()
+        try:
+            books = repository.get_books()
+            results.append(summarize("build_index", [_timed(SearchIndex().build, books)[0] for _ in range(repeat)]))
+
+            repository.warm_up()
+            for kind, query in search_queries(books, rng).items():
+                samples = [_timed(repository.search_books, query)[0] for _ in range(repeat)]
+                results.append(summarize("search_books", samples, query=kind,
+                                         matches=len(repository.search_books(query))))
+
+            results.append(summarize("show_borrowed", [_timed(repository.get_borrow_rows)[0] for _ in range(repeat)]))
+            results.append(summarize("show_borrowed", [_timed(repository.get_borrow_rows, None, "overdue")[0]
+                                                       for _ in range(repeat)], scope="overdue"))
+            results.append(summarize("overdue_counts", [_timed(repository.overdue_counts)[0] for _ in range(repeat)]))
+            # user0 is one of the users the generator gives favorites
+            results.append(summarize("get_favorite_books", [_timed(repository.favorite_books, "user0")[0]
+                                                            for _ in range(repeat)]))
+
+            accounts = rng.sample(repository.load_users(), min(len(repository.load_users()), mutations))
+            results.append(summarize("show_borrowed", [_timed(repository.get_borrow_rows, user["username"])[0]
+                                                       for user in accounts], scope="one user"))
+            results.append(summarize("login", [_timed(repository.authenticate, user["username"], user["password"])[0]
+                                               for user in accounts]))
+
+            today = datetime.now()
+            available = [book["isbn"] for book in books if book.get("available", True)]
+            records = [{"isbn": isbn, "username": accounts[i % len(accounts)]["username"],
+                        "borrow_date": today.strftime("%Y-%m-%d"),
+                        "due_date": (today + timedelta(days=14)).strftime("%Y-%m-%d")}
+                       for i, isbn in enumerate(rng.sample(available, min(len(available), mutations)))]
+            results.append(summarize("borrow_book", [_timed(repository.borrow_book, record)[0] for record in records]))
+            results.append(summarize("return_book", [_timed(repository.return_book, record["isbn"],
+                                                            record["username"])[0] for record in records]))
+            results.append(summarize("add_favorite", [_timed(repository.add_favorite, record["username"],
+                                                             record["isbn"])[0] for record in records]))
+
+            samples = []
+            for i, book in enumerate(generate_books(mutations, set(), seed + 4)):
+                # the generated catalog only uses the 978 prefix
+                book["isbn"] = isbn13(i, prefix="979")
+                samples.append(_timed(repository.add_book, book)[0])
+            results.append(summarize("add_book", samples))
+
+            samples = []
+            for i, user in enumerate(generate_users(mutations, seed + 5)):
+                user["username"] = f"benchmark{i}"
+                samples.append(_timed(repository.add_user, user)[0])
+            results.append(summarize("signup", samples))
+        finally:
+            elapsed = _timed(repository.close)[0]
+        results.append(summarize("close", [elapsed]))
+    return results
+
+
+def has_display():
+    # Tk needs an X server on Linux, run under xvfb-run for a virtual one
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY"))
+
+
+def bench_render(books, repeat=5, scroll_steps=50):
+    """Time the book grid of the dashboards: showing a catalog and paging through it."""
+    # the GUI toolkit is only loaded when there is something to draw on
+    import customtkinter as ctk
+    from main import VirtualBookGrid
+
+    def bind_card(card, book):
+        card.show(book)
+        card.set_buttons([{"text": "Borrow", "command": lambda: None}] if book.get("available", True) else [])
+
+    root = ctk.CTk()
+    root.geometry("980x600")
+    grid = VirtualBookGrid(root, bind_card=bind_card)
+    grid.pack(fill="both", expand=True)
+    root.update()
+
+    results = []
+    try:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            grid.set_books(books)
+            root.update()
+            samples.append(time.perf_counter() - started)
+        results.append(summarize("render_books", samples))
+
+        samples = []
+        for step in range(1, scroll_steps + 1):
+            started = time.perf_counter()
+            grid.scroll_to(step / scroll_steps)
+            root.update()
+            samples.append(time.perf_counter() - started)
+        results.append(summarize("scroll_books", samples))
+    finally:
+        root.destroy()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=DEFAULT_SIZES, engines=STORAGE_ENGINES, workdir=None, books_format="json", render=True,
+        repeat=5, mutations=100, seed=DEFAULT_SEED, durability="normal"):
+    """Benchmark every engine on each catalog size and return the report.
+
+    Each size is generated once and every engine runs on its own copy, so
+    they all start from the same data. Without ``workdir`` the data lives in
+    a temporary directory that is removed afterwards.
+    """
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"books_format": books_format, "repeat": repeat, "mutations": mutations, "seed": seed,
+                     "durability": durability},
+        "results": [],
+    }
+    temporary = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="elibrary-benchmark-")
+    books_file = f"books.{books_format}"
+    try:
+        for size in sizes:
+            source = os.path.join(workdir, str(size), "data")
+            elapsed, counts = _timed(generate_library, source, size, None, None, None, seed, books_format)
+            print(f"Generated {size:,} books in {elapsed:.1f}s", file=sys.stderr)
+
+            for engine in engines:
+                target = os.path.join(workdir, str(size), engine)
+                shutil.rmtree(target, ignore_errors=True)
+                shutil.copytree(source, target)
+                started = time.perf_counter()
+                for row in bench_storage(target, engine, books_file, repeat, mutations, seed, durability):
+                    report["results"].append({"engine": engine, **counts, **row})
+                print(f"  {engine}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+            if not render:
+                continue
+            if not has_display():
+                report["results"].append({"engine": None, **counts, "operation": "render_books",
+                                          "skipped": "no display, run under xvfb-run"})
+                continue
+            books = list(iter_records(os.path.join(source, books_file)))
+            for row in bench_render(books, repeat):
+                report["results"].append({"engine": None, **counts, **row})
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def _result_key(row):
+    return tuple(row.get(name) for name in ("engine", "books", "operation", "query", "scope", "after"))
+
+
+def compare(baseline, current, threshold=1.25, min_change_ms=0.05):
+    """Pair up the rows of two reports; yields ``(row, baseline_ms, current_ms, regressed)`` by median.
+
+    A row regressed when it is more than ``threshold`` times slower and by
+    more than ``min_change_ms``, so timer noise on sub-millisecond
+    operations isn't reported.
+    """
+    before = {_result_key(row): row for row in baseline["results"] if "median_ms" in row}
+    for row in current["results"]:
+        old = before.get(_result_key(row))
+        if old is None or "median_ms" not in row:
+            continue
+        old_ms, new_ms = old["median_ms"], row["median_ms"]
+        regressed = new_ms > old_ms * threshold and new_ms - old_ms > min_change_ms
+        yield row, old_ms, new_ms, regressed
+
+
+def _label(row):
+    details = ", ".join(f"{row[name]}" for name in ("query", "scope", "after") if row.get(name))
+    label = f"{row['engine'] or 'render'} {row['books']:>9,} {row['operation']}"
+    return f"{label} ({details})" if details else label
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the E-Library storage, search and book grid.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="generate catalogs and time the operations on them")
+    run_parser.add_argument("--books", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                            help="catalog sizes, e.g. 1000 10000 100000 1000000")
+    run_parser.add_argument("--engines", nargs="+", choices=STORAGE_ENGINES, default=list(STORAGE_ENGINES))
+    run_parser.add_argument("--format", choices=("json", "jsonl"), default="json", help="format of the books file")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--mutations", type=int, default=100,
+                            help="borrows, returns, logins, new books and signups per engine")
+    run_parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    run_parser.add_argument("--durability", default="normal")
+    run_parser.add_argument("--workdir", help="keep the generated data here instead of a temporary directory")
+    run_parser.add_argument("--no-render", dest="render", action="store_false", help="skip the book grid")
+    run_parser.add_argument("--output", help="write the JSON report here, standard output by default")
+
+    generate_parser = commands.add_parser("generate", help="only write a synthetic library, e.g. to try the app")
+    generate_parser.add_argument("directory")
+    generate_parser.add_argument("--books", type=int, default=10000)
+    generate_parser.add_argument("--users", type=int)
+    generate_parser.add_argument("--loans", type=int)
+    generate_parser.add_argument("--favorites", type=int)
+    generate_parser.add_argument("--format", choices=("json", "jsonl"), default="json")
+    generate_parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+
+    compare_parser = commands.add_parser("compare", help="compare two reports, exits with 1 on a regression")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=1.25,
+                                help="how many times slower a median may get before it counts")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        counts = generate_library(args.directory, args.books, args.users, args.loans, args.favorites, args.seed,
+                                  args.format)
+        print(", ".join(f"{count:,} {name}" for name, count in counts.items()))
+        return 0
+
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+        regressions = 0
+        for row, old_ms, new_ms, regressed in compare(baseline, current, args.threshold):
+            regressions += regressed
+            print(f"{_label(row):<60} {old_ms:10.2f} -> {new_ms:10.2f} ms  {new_ms / old_ms if old_ms else 0:5.2f}x"
+                  + ("  REGRESSION" if regressed else ""))
+        print(f"{regressions} regression(s) between {baseline.get('commit')} and {current.get('commit')}")
+        return 1 if regressions else 0
+
+    report = run(args.books, args.engines, args.workdir, args.format, args.render, args.repeat, args.mutations,
+                 args.seed, args.durability)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
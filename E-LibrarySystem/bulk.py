@@ -0,0 +1,310 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from loans import is_overdue
+from storage import LibraryRepository, open_backend
+
+REQUIRED_FIELDS = ("title", "author", "isbn")
+BOOK_FIELDS = ("title", "author", "isbn", "genre")
+
+# CSV columns per collection; passwords are never exported
+EXPORT_FIELDS = {
+    "books": ("isbn", "title", "author", "genre", "available", "copies", "available_copies", "date_added"),
+    "borrows": ("isbn", "username", "borrow_date", "due_date"),
+    "users": ("username", "name", "role", "student_id", "email", "contact", "address", "age"),
+}
+PRIVATE_FIELDS = ("password",)
+EXPORT_FILTERS = {"books": ("available", "genre"), "borrows": ("overdue", "username"), "users": ("role",)}
+
+
+def detect_format(path):
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def read_rows(path, fmt=None):
+    """Yield ``(line, row)`` pairs from a CSV or JSON Lines file, one row at a time.
+
+    Rows that can't be parsed come through as ``(line, None)`` so they can be
+    reported along with the invalid ones.
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except json.JSONDecodeError:
+                row = None
+            yield line, {str(key).strip().lower(): value for key, value in row.items()} if isinstance(row, dict) else None
+
+
+def normalize_isbn(value):
+    return str(value or "").replace("-", "").replace(" ", "").strip()
+
+
+def isbn_error(isbn):
+    # the Add Book form only takes digits, so neither can an import (no "X" check digits)
+    if not isbn.isdigit():
+        return "ISBN must contain only numbers"
+    if len(isbn) == 10:
+        valid = sum((10 - i) * int(digit) for i, digit in enumerate(isbn)) % 11 == 0
+    elif len(isbn) == 13:
+        valid = sum((3 if i % 2 else 1) * int(digit) for i, digit in enumerate(isbn)) % 10 == 0
+    else:
+        return "ISBN must have 10 or 13 digits"
+    return None if valid else "ISBN check digit does not match"
+
+
+def validate_row(row, date_added):
+    """Return ``(book, None)`` for a valid row or ``(None, reason)``."""
+    if row is None:
+        return None, "Row could not be parsed"
+
+    book = {field: str(row.get(field) or "").strip() for field in BOOK_FIELDS}
+    book["isbn"] = normalize_isbn(book["isbn"])
+
+    missing = [field for field in REQUIRED_FIELDS if not book[field]]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+
+    error = isbn_error(book["isbn"])
+    if error:
+        return None, error
+
+    # one record per title, an optional copies column says how many the library owns
+    count = str(row.get("copies") or "").strip()
+    if count:
+        if not count.isdigit() or int(count) < 1:
+            return None, "Copies must be a whole number of at least 1"
+        book["copies"] = book["available_copies"] = int(count)
+
+    book["available"] = True
+    book["date_added"] = str(row.get("date_added") or date_added)
+    return book, None
+
+
+def validate_chunk(chunk, date_added):
+    # runs in the worker processes, so it only gets and returns plain data
+    return [(line,) + validate_row(row, date_added) for line, row in chunk]
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _validated(rows, workers, chunk_size, date_added):
+    # keeps a bounded number of chunks in flight so the input is never read ahead in full
+    if workers <= 1:
+        for chunk in _chunks(rows, chunk_size):
+            yield from validate_chunk(chunk, date_added)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunks(rows, chunk_size):
+            pending.append(executor.submit(validate_chunk, chunk, date_added))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.rejected = []
+        self.batches = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self, max_rejected=20):
+        lines = [f"Imported {self.imported:,} of {self.rows:,} rows in {self.elapsed:.1f}s "
+                 f"({self.rows_per_second:,.0f} rows/s, {self.batches} commits)",
+                 f"  duplicates: {self.duplicates:,}, rejected: {len(self.rejected):,}"]
+        for line, reason in self.rejected[:max_rejected]:
+            lines.append(f"  line {line}: {reason}")
+        if len(self.rejected) > max_rejected:
+            lines.append(f"  ... and {len(self.rejected) - max_rejected:,} more")
+        return "\n".join(lines)
+
+    def write_rejected(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["line", "reason"])
+            writer.writerows(self.rejected)
+
+
+def import_books(repository, path, fmt=None, workers=None, chunk_size=2000, batch_size=10000):
+    """Stream books from a CSV or JSON Lines file into the catalog.
+
+    Rows are validated in a process pool with the rules of the Add Book form
+    plus an ISBN check digit test, ISBNs already in the catalog or earlier in
+    the file are skipped, and the rest is added ``batch_size`` books per
+    backend write.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    date_added = datetime.now().strftime("%Y-%m-%d")
+
+    seen = set()
+    batch = []
+    for line, book, reason in _validated(read_rows(path, fmt), workers, chunk_size, date_added):
+        report.rows += 1
+        if book is None:
+            report.rejected.append((line, reason))
+            continue
+
+        isbn = book["isbn"]
+        if isbn in seen or repository.has_book(isbn):
+            report.duplicates += 1
+            continue
+
+        seen.add(isbn)
+        batch.append(book)
+        if len(batch) >= batch_size:
+            repository.add_books(batch)
+            report.imported += len(batch)
+            report.batches += 1
+            batch = []
+
+    if batch:
+        repository.add_books(batch)
+        report.imported += len(batch)
+        report.batches += 1
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def record_filter(available=None, genre=None, overdue=None, username=None, role=None, today=None):
+    """A predicate for the exported records, ``None`` leaves a filter out."""
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    checks = []
+    if available is not None:
+        checks.append(lambda record: bool(record.get("available", True)) == available)
+    if genre:
+        checks.append(lambda record: str(record.get("genre", "")).lower() == genre.lower())
+    if overdue is not None:
+        checks.append(lambda record: is_overdue(record, today) == overdue)
+    if username:
+        checks.append(lambda record: record.get("username") == username)
+    if role:
+        checks.append(lambda record: str(record.get("role", "")).lower() == role.lower())
+    return lambda record: all(check(record) for check in checks)
+
+
+def export_records(backend, collection, out, fmt="csv", keep=None, chunk_size=1000):
+    """Stream one collection of the backend to the open file ``out``.
+
+    Records are read one at a time and written ``chunk_size`` rows at a time,
+    so memory use doesn't grow with the size of the store. Returns the number
+    of records written.
+    """
+    records = getattr(backend, f"iter_{collection}")()
+    if keep is not None:
+        records = filter(keep, records)
+
+    if fmt == "csv":
+        writer = csv.DictWriter(out, EXPORT_FIELDS[collection], extrasaction="ignore")
+        writer.writeheader()
+        write_chunk = writer.writerows
+    else:
+        def write_chunk(chunk):
+            out.writelines(json.dumps({key: value for key, value in record.items() if key not in PRIVATE_FIELDS}) + "\n"
+                           for record in chunk)
+
+    count = 0
+    for chunk in _chunks(records, chunk_size):
+        write_chunk(chunk)
+        count += len(chunk)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk tools for the E-Library stores.")
+    parser.add_argument("--engine", default=os.environ.get("ELIBRARY_STORAGE", "journal"),
+                        help="storage engine: json, journal or sqlite")
+    parser.add_argument("--books-file", default=f"books.{os.environ.get('ELIBRARY_BOOKS_FORMAT', 'json')}")
+    parser.add_argument("--durability", default=os.environ.get("ELIBRARY_DURABILITY", "normal"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="import books from a CSV or JSON Lines file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=("csv", "jsonl"))
+    import_parser.add_argument("--workers", type=int)
+    import_parser.add_argument("--batch-size", type=int, default=10000)
+    import_parser.add_argument("--rejected", help="write the rejected rows to this CSV file")
+
+    export_parser = commands.add_parser("export", help="export books, borrows or users as CSV or JSON Lines")
+    export_parser.add_argument("collection", choices=tuple(EXPORT_FIELDS))
+    export_parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    export_parser.add_argument("--output", help="file to write, standard output by default")
+    availability = export_parser.add_mutually_exclusive_group()
+    availability.add_argument("--available", dest="available", action="store_true", default=None)
+    availability.add_argument("--borrowed", dest="available", action="store_false")
+    export_parser.add_argument("--genre")
+    overdue = export_parser.add_mutually_exclusive_group()
+    overdue.add_argument("--overdue", dest="overdue", action="store_true", default=None)
+    overdue.add_argument("--not-overdue", dest="overdue", action="store_false")
+    export_parser.add_argument("--username")
+    export_parser.add_argument("--role")
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        for name in ("available", "genre", "overdue", "username", "role"):
+            if getattr(args, name) not in (None, "") and name not in EXPORT_FILTERS[args.collection]:
+                parser.error(f"--{name} does not apply to {args.collection}")
+
+    backend = open_backend(args.engine, books_file=args.books_file, durability=args.durability)
+    repository = LibraryRepository(backend)
+    try:
+        if args.command == "import":
+            report = import_books(repository, args.path, args.format, args.workers, batch_size=args.batch_size)
+            print(report.summary())
+            if args.rejected:
+                report.write_rejected(args.rejected)
+        else:
+            keep = record_filter(args.available, args.genre, args.overdue, args.username, args.role)
+            out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+            try:
+                started = time.perf_counter()
+                count = export_records(backend, args.collection, out, args.format, keep)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"Exported {count:,} {args.collection} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
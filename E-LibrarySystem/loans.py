@@ -0,0 +1,226 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, deque
+from datetime import date, timedelta
+
+# two weeks, for the desk and for books handed to the next holder
+LOAN_DAYS = 14
+# books a user may have on loan at once
+LOAN_LIMIT = 3
+
+
+def new_loan(isbn, username, today=None):
+    """A borrow record starting ``today`` (``YYYY-MM-DD``, default the real one) for the usual loan period."""
+    today = today or date.today().isoformat()
+    return {"isbn": isbn, "username": username, "borrow_date": today, "due_date": _days_after(today, LOAN_DAYS)}
+
+
+def copies(book):
+    """Copies of the title the library owns; records from before copy counts are one copy."""
+    return int(book.get("copies", 1))
+
+
+def available_copies(book):
+    """Copies on the shelf, from the counter or, for an old record, its ``available`` flag."""
+    if "available_copies" in book:
+        return int(book["available_copies"])
+    return copies(book) if book.get("available", True) else 0
+
+
+def set_copies(book, total, available):
+    """Set both counters; ``available`` is kept as the flag everything else reads."""
+    book["copies"] = total
+    book["available_copies"] = available
+    book["available"] = available > 0
+
+
+def _days_after(today, days):
+    return (date.fromisoformat(today) + timedelta(days=days)).isoformat()
+
+
+def is_overdue(record, today):
+    """The rule the dashboards have always used: overdue once the due date has begun.
+
+    Due dates and ``today`` are ``YYYY-MM-DD`` strings, compared as text.
+    """
+    due_date = record.get("due_date")
+    return bool(due_date) and str(due_date) <= today
+
+
+class DueDateIndex:
+    """Loans ordered by due date, kept in step with borrows and returns.
+
+    Due dates are ISO strings, which sort like the dates they stand for, so
+    nothing is parsed: the loans overdue today are everything due before
+    tomorrow, found with a bisect. Loans without a due date are left out.
+    Every ``today`` is a ``YYYY-MM-DD`` string and defaults to the real one.
+    """
+
+    def __init__(self):
+        # parallel lists, the keys sorted and each record at the position of its key
+        self._keys = []
+        self._records = []
+
+    def build(self, borrows):
+        entries = sorted(((self._key(record), record) for record in borrows if record.get("due_date")),
+                         key=lambda entry: entry[0])
+        self._keys = [key for key, record in entries]
+        self._records = [record for key, record in entries]
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _key(record):
+        return str(record.get("due_date")), record.get("username", ""), record.get("isbn", "")
+
+    def add(self, record):
+        if not record.get("due_date"):
+            return
+        key = self._key(record)
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._records.insert(position, record)
+
+    def remove(self, record):
+        key = self._key(record)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+            del self._records[position]
+
+    def ordered(self):
+        """Every indexed loan, the earliest due first."""
+        return list(self._records)
+
+    def overdue(self, today=None):
+        """Loans due today or earlier, the longest overdue first."""
+        today = today or date.today().isoformat()
+        return self._records[:bisect_left(self._keys, (_days_after(today, 1),))]
+
+    def due_within(self, days, today=None):
+        """Loans that are not overdue yet and are due in the next ``days`` days."""
+        today = today or date.today().isoformat()
+        start = bisect_left(self._keys, (_days_after(today, 1),))
+        end = bisect_left(self._keys, (_days_after(today, days + 1),))
+        return self._records[start:end]
+
+    def overdue_counts(self, today=None):
+        """Overdue loans per username."""
+        return Counter(record.get("username") for record in self.overdue(today))
+
+
+class _HoldQueue:
+    __slots__ = ("entries", "next_ticket", "cancelled")
+
+    def __init__(self):
+        # (ticket, record) in the order the holds were placed
+        self.entries = deque()
+        self.next_ticket = 0
+        # sorted tickets of cancelled holds that are still in ``entries``
+        self.cancelled = []
+
+    def trim(self):
+        # cancelled holds stay queued until they reach the front
+        while self.cancelled and self.entries and self.entries[0][0] == self.cancelled[0]:
+            self.entries.popleft()
+            self.cancelled.pop(0)
+
+    def __len__(self):
+        return len(self.entries) - len(self.cancelled)
+
+
+class HoldQueues:
+    """First come, first served holds on borrowed books, one queue per ISBN.
+
+    Each queue is a deque, so placing a hold and handing a returned book to
+    the next holder are O(1); only holders passed over for the book are
+    walked. Holds are numbered per queue as they come in
+    and indexed by user, so a holder's position is their number minus the
+    number at the front, less the cancelled holds between them (a bisect);
+    nothing walks a queue. A cancelled hold is left in its deque and
+    dropped once it reaches the front.
+    """
+
+    def __init__(self):
+        self._queues = {}
+        # username -> {isbn: (ticket, record)}
+        self._by_user = {}
+
+    def build(self, holds):
+        self._queues = {}
+        self._by_user = {}
+        for record in holds:
+            self.add(record)
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def add(self, record):
+        """Queue ``record`` behind the holds already placed on its ISBN; returns its position."""
+        isbn, username = record.get("isbn"), record.get("username")
+        queue = self._queues.setdefault(isbn, _HoldQueue())
+        ticket = queue.next_ticket
+        queue.next_ticket += 1
+        queue.entries.append((ticket, record))
+        self._by_user.setdefault(username, {})[isbn] = (ticket, record)
+        return len(queue)
+
+    def has(self, username, isbn):
+        return isbn in self._by_user.get(username, ())
+
+    def cancel(self, username, isbn):
+        """Drop the hold of ``username`` on ``isbn``; returns its record, or None if there was none."""
+        if not self.has(username, isbn):
+            return None
+        ticket, record = self._forget(username, isbn)
+
+        queue = self._queues[isbn]
+        insort(queue.cancelled, ticket)
+        queue.trim()
+        if not queue:
+            del self._queues[isbn]
+        return record
+
+    def peek(self, isbn):
+        queue = self._queues.get(isbn)
+        return queue.entries[0][1] if queue else None
+
+    def pop(self, isbn, eligible=None):
+        """Take the first hold on ``isbn`` whose record passes ``eligible``, None if there is none.
+
+        The holders passed over keep their place in line.
+        """
+        queue = self._queues.get(isbn)
+        if not queue:
+            return None
+        for ticket, record in queue.entries:
+            cancelled = bisect_left(queue.cancelled, ticket)
+            if cancelled < len(queue.cancelled) and queue.cancelled[cancelled] == ticket:
+                continue
+            if eligible is None or eligible(record):
+                return self.cancel(record.get("username"), isbn)
+        return None
+
+    def _forget(self, username, isbn):
+        holds = self._by_user[username]
+        entry = holds.pop(isbn)
+        if not holds:
+            del self._by_user[username]
+        return entry
+
+    def position(self, username, isbn):
+        """1 for the next in line, None without a hold."""
+        entry = self._by_user.get(username, {}).get(isbn)
+        if entry is None:
+            return None
+        queue = self._queues[isbn]
+        ticket = entry[0]
+        return ticket - queue.entries[0][0] + 1 - bisect_left(queue.cancelled, ticket)
+
+    def queue_length(self, isbn):
+        queue = self._queues.get(isbn)
+        return len(queue) if queue else 0
+
+    def holds_of(self, username):
+        """``(record, position)`` for every hold of ``username``, in the order they were placed."""
+        return [(record, self.position(username, isbn)) for isbn, (ticket, record) in self._by_user.get(username, {}).items()]
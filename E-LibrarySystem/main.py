@@ -1,16 +1,34 @@
 import os
-import json
+import sys
 import re
+import queue
+import time
 import tkinter as tk
 from tkinter import messagebox
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import customtkinter as ctk
+from loans import LOAN_LIMIT, available_copies, copies, new_loan
+from perf import MetricsDump, PhaseTimer, timings
+from search import book_matches
+from storage import FAVORITES_DIR, LibraryRepository, convert_to_json_lines, is_json_lines, open_backend, write_json
 
 ctk.set_appearance_mode("light")
 ctk.set_default_color_theme("blue")
 
+# the admin Borrowed Books filters, button label -> get_borrow_rows argument
+DUE_SOON_DAYS = 7
+BORROW_STATUSES = {"All": "all", "Overdue": "overdue", f"Due in {DUE_SOON_DAYS} days": "due_soon"}
+BORROW_ORDERS = {"Borrowed": None, "Due first": "due_date", "Due last": "-due_date"}
+
 class App(ctk.CTk):
     def __init__(self):
+        startup = PhaseTimer()
+        # ELIBRARY_TIMINGS=1 records and prints timings, ELIBRARY_TIMINGS=overlay also shows them;
+        # ELIBRARY_METRICS_FILE dumps them every ELIBRARY_METRICS_INTERVAL seconds
+        timings_mode = os.environ.get("ELIBRARY_TIMINGS", "")
+        metrics_file = os.environ.get("ELIBRARY_METRICS_FILE")
+        timings.enabled = bool(timings_mode or metrics_file)
         super().__init__()
         self.title("E-Library System")
         self.geometry("980x600")
@@ -24,18 +42,74 @@ class App(ctk.CTk):
         self.container.grid_rowconfigure(0, weight=1)
 
         self.current_user = None
-
+        startup.mark("window")
+
+        # one catalog shared by every page, ELIBRARY_STORAGE picks json, journal or sqlite,
+        # ELIBRARY_DURABILITY off, normal or full and ELIBRARY_BOOKS_FORMAT json or jsonl;
+        # with ELIBRARY_SERVICE set the desk is a client of a running service.py instead,
+        # ELIBRARY_SERVICE_KEY is the key the service was started with
+        service_url = os.environ.get("ELIBRARY_SERVICE")
+        repository = None
+        if service_url:
+            # only a desk client needs the HTTP code
+            from service import RemoteRepository
+            repository = RemoteRepository(service_url, os.environ.get("ELIBRARY_SERVICE_KEY", ""))
+        books_format = os.environ.get("ELIBRARY_BOOKS_FORMAT", "json")
+        self.db = Database(books_file=f"books.{books_format}", repository=repository,
+                           engine=os.environ.get("ELIBRARY_STORAGE", "journal"),
+                           durability=os.environ.get("ELIBRARY_DURABILITY", "normal"))
+        self.repository = self.db.repository
+        startup.mark("storage")
+
+        # storage calls run here, pages show a first page of books while the catalog loads
+        self.worker = StorageWorker(self)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self.metrics = None
+        if metrics_file:
+            self.metrics = MetricsDump(metrics_file, self._collect_metrics,
+                                       float(os.environ.get("ELIBRARY_METRICS_INTERVAL", 10)))
+            self.metrics.start()
+
+        # F12 shows the latest timings, and starts recording them if nothing else did
+        self.overlay = None
+        self.bind("<F12>", lambda event: self.toggle_overlay())
+
+        # pages are built the first time they are shown
         self.frames = {}
-
-        for F in (LoginPage, SignupPage, AdminDashboard, UserDashboard):
-            frame = F(self.container, self)
-            self.frames[F] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
-
         self.show_frame(LoginPage)
+        startup.mark("login page")
+
+        # the catalog starts loading once the login screen is up, not ahead of it
+        self.after_idle(lambda: self._started(startup))
+
+    def _started(self, startup):
+        startup.mark("first draw")
+        for name, seconds in startup.phases:
+            timings.record(f"startup {name}", seconds)
+        if os.environ.get("ELIBRARY_TIMINGS"):
+            print(startup.report())
+        if os.environ.get("ELIBRARY_TIMINGS") == "overlay":
+            self.toggle_overlay()
+        self.worker.submit(self.repository.warm_up)
+
+    def toggle_overlay(self):
+        timings.enabled = True
+        if self.overlay is None:
+            self.overlay = PerfOverlay(self)
+        self.overlay.toggle()
+
+    def _collect_metrics(self):
+        metrics = {"timings": timings.stats(), "counters": timings.counters()}
+        if hasattr(self.repository, "stats"):
+            metrics["storage"] = self.repository.stats()
+        return metrics
 
     def show_frame(self, cont):
-        frame = self.frames[cont]
+        frame = self.frames.get(cont)
+        if frame is None:
+            frame = self.frames[cont] = cont(self.container, self)
+            frame.grid(row=0, column=0, sticky="nsew")
 
         # Clear login fields when showing login page
         if cont == LoginPage:
@@ -50,94 +124,508 @@ class App(ctk.CTk):
     def set_current_user(self, user):
         self.current_user = user
 
+    def on_close(self):
+        self.worker.shutdown()
+        if self.metrics is not None:
+            self.metrics.stop()
+        self.db.close()
+        # ELIBRARY_TIMINGS=1 prints how long logins, signups and the like took
+        if os.environ.get("ELIBRARY_TIMINGS"):
+            print(timings.report())
+        self.destroy()
+
 class Database:
-    def __init__(self, books_file="books.json", favorites_file="favorites.json"):
+    def __init__(self, books_file="books.json", favorites_dir=FAVORITES_DIR, repository=None,
+                 engine="json", database_file="library.db", durability="normal"):
         self.books_file = books_file
-        self.favorites_file = favorites_file
+        self.favorites_dir = favorites_dir
+        self.engine = engine
+        self.durability = durability
 
-        self._initialize_files()
+        if repository is None:
+            repository = LibraryRepository(self._create_backend(database_file))
+        self.repository = repository
+
+    def _create_backend(self, database_file):
+        if self.engine in ("json", "journal"):
+            self._initialize_files()
+        return open_backend(self.engine, self.books_file, self.favorites_dir, database_file, self.durability)
+
+    def close(self):
+        self.repository.close()
 
     def _initialize_files(self):
 
+        if is_json_lines(self.books_file):
+            # switching to JSON Lines: convert the existing catalog one book at a time
+            convert_to_json_lines(self.books_file, "books.json", self.durability)
         if not os.path.exists(self.books_file):
-            with open(self.books_file, 'w') as f:
-                json.dump([], f)
-
-        if not os.path.exists(self.favorites_file):
-            with open(self.favorites_file, 'w') as f:
-                json.dump([], f)
+            write_json(self.books_file, [], indent=None, durability=self.durability)
 
     def get_book_by_isbn(self, isbn):
         try:
-            with open(self.books_file, 'r') as f:
-                books = json.load(f)
-                for book in books:
-                    if book.get('isbn') == isbn:
-                        return book
-            return None
+            return self.repository.get_book(isbn)
         except Exception as e:
             print(f"Error getting book by ISBN: {e}")
             return None
 
-    def is_book_in_favorites(self, isbn):
+    def is_book_in_favorites(self, username, isbn):
         try:
-            with open(self.favorites_file, 'r') as f:
-                favorites = json.load(f)
-                return isbn in favorites
+            return self.repository.is_favorite(username, isbn)
         except Exception as e:
             print(f"Error checking if book is in favorites: {e}")
             return False
 
-    def add_book_to_favorites(self, isbn):
+    def add_book_to_favorites(self, username, isbn):
         try:
-            with open(self.favorites_file, 'r') as f:
-                favorites = json.load(f)
-
-            if isbn not in favorites:
-                favorites.append(isbn)
-
-            with open(self.favorites_file, 'w') as f:
-                json.dump(favorites, f)
-
+            self.repository.add_favorite(username, isbn)
             return True
         except Exception as e:
             print(f"Error adding book to favorites: {e}")
             return False
 
-    def remove_book_from_favorites(self, isbn):
+    def remove_book_from_favorites(self, username, isbn):
         try:
-            with open(self.favorites_file, 'r') as f:
-                favorites = json.load(f)
-
-            if isbn in favorites:
-                favorites.remove(isbn)
-
-            with open(self.favorites_file, 'w') as f:
-                json.dump(favorites, f)
-
+            self.repository.remove_favorite(username, isbn)
             return True
         except Exception as e:
             print(f"Error removing book from favorites: {e}")
             return False
 
-    def get_favorite_books(self):
+    def get_favorite_books(self, username):
         try:
-            with open(self.favorites_file, 'r') as f:
-                favorite_isbns = json.load(f)
-
-            with open(self.books_file, 'r') as f:
-                all_books = json.load(f)
-
-            favorite_books = []
-            for book in all_books:
-                if book.get('isbn') in favorite_isbns:
-                    favorite_books.append(book)
-
-            return favorite_books
+            return self.repository.favorite_books(username)
         except Exception as e:
             print(f"Error getting favorite books: {e}")
             return []
 
+class DebouncedSearch:
+    """As-you-type search that waits for a pause in typing before running.
+
+    When the new query contains the previous one, the previous results are
+    filtered instead of searching the whole catalog again. With a worker the
+    search itself runs in the background and only the latest query renders.
+    """
+
+    def __init__(self, widget, search, render, delay=250, worker=None):
+        self.widget = widget
+        self.search = search
+        self.render = render
+        self.delay = delay
+        self.worker = worker
+        self._pending = None
+        self._last_query = None
+        self._last_results = None
+        self._searching = None
+
+    def schedule(self, query):
+        query = query.lower()
+        if self._pending is None and query == self._last_query:
+            return  # e.g. arrow keys or shift, nothing to do
+
+        self.cancel()
+        self._pending = self.widget.after(self.delay, lambda: self.run(query))
+
+    def cancel(self):
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+            self._pending = None
+
+    def reset(self):
+        # forget the previous results, e.g. after the catalog changed
+        self.cancel()
+        self._last_query = None
+        self._last_results = None
+        self._searching = None
+
+    def run(self, query):
+        self.cancel()
+        query = query.lower()
+
+        if self._last_query and self._last_query in query:
+            self._finish(query, [book for book in self._last_results if book_matches(book, query)])
+        elif self.worker is None:
+            self._finish(query, self.search(query))
+        else:
+            self._searching = query
+            self.worker.submit(lambda: self.search(query),
+                               lambda results: self._searching == query and self._finish(query, results),
+                               name="search")
+
+    def _finish(self, query, results):
+        self._searching = None
+        self._last_query = query
+        self._last_results = results
+        self.render(query, results)
+
+def _task_name(*functions):
+    """Name a background task after the first of ``functions`` that is not a lambda or a local helper."""
+    for function in functions:
+        name = getattr(function, "__name__", "")
+        if name and name not in ("<lambda>", "done"):
+            return name.strip("_")
+    return "task"
+
+
+class StorageWorker:
+    """Runs storage calls on a thread pool and hands the results back on the Tk thread.
+
+    Tk may only be used from its own thread, so finished calls are queued and
+    picked up by an after() poll that only runs while calls are in flight.
+    """
+
+    def __init__(self, widget, workers=2, poll_interval=15):
+        self.widget = widget
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="storage")
+        self._done = queue.SimpleQueue()
+        self._in_flight = 0
+        self._polling = False
+
+    def submit(self, call, on_done=None, on_error=None, name=None):
+        if timings.enabled:
+            call, on_done = self._timed(name or _task_name(on_done, call), call, on_done)
+        self._in_flight += 1
+        future = self._executor.submit(call)
+        future.add_done_callback(lambda f: self._done.put((f, on_done, on_error)))
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_interval, self._drain)
+        return future
+
+    @staticmethod
+    def _timed(name, call, on_done):
+        """Wrap a task to record its storage time, its render time and the total from submit to rendered."""
+        submitted = time.perf_counter()
+
+        def timed_call():
+            with timings.timed(f"storage {name}"):
+                return call()
+
+        def timed_done(result):
+            with timings.timed(f"render {name}"):
+                if on_done is not None:
+                    on_done(result)
+            timings.record(f"total {name}", time.perf_counter() - submitted)
+
+        return timed_call, timed_done
+
+    def load_into(self, placeholder, call, render):
+        """Run ``call`` and replace the ``placeholder`` widget with ``render(result)``.
+
+        A placeholder destroyed in the meantime means the user moved on to
+        another view, and the result is dropped.
+        """
+        def done(result):
+            if placeholder.winfo_exists():
+                placeholder.destroy()
+                render(result)
+
+        return self.submit(call, done, name=_task_name(render, call))
+
+    def _drain(self):
+        finished = []
+        while True:
+            try:
+                finished.append(self._done.get_nowait())
+            except queue.Empty:
+                break
+
+        self._in_flight -= len(finished)
+        # keep polling before running callbacks, one of them may open a modal dialog
+        if self._in_flight:
+            self.widget.after(self.poll_interval, self._drain)
+        else:
+            self._polling = False
+
+        for future, on_done, on_error in finished:
+            error = future.exception()
+            if error is None:
+                if on_done is not None:
+                    on_done(future.result())
+            elif on_error is not None:
+                on_error(error)
+            else:
+                messagebox.showerror("Error", f"Storage error: {error}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+def loading_placeholder(parent, **pack_options):
+    label = ctk.CTkLabel(parent, text="Loading...")
+    label.pack(**(pack_options or {"pady": 20}))
+    return label
+
+def after_catalog_loaded(widget, repository, callback, interval=100):
+    """Run ``callback`` on the Tk thread once the repository has finished loading in the background."""
+    def poll():
+        if repository.is_loaded():
+            callback()
+        else:
+            widget.after(interval, poll)
+
+    widget.after(interval, poll)
+
+class PerfOverlay(ctk.CTkFrame):
+    """Latest timings and counters in a corner of the window, refreshed while it is shown."""
+
+    def __init__(self, master, interval=500, limit=12, **kwargs):
+        super().__init__(master, fg_color="#202020", corner_radius=6, **kwargs)
+        self.interval = interval
+        self.limit = limit
+        self._refreshing = None
+
+        self.label = ctk.CTkLabel(self, text="", justify="left", text_color="#e0e0e0",
+                                  font=("Courier", 11))
+        self.label.pack(padx=8, pady=6)
+
+    def show(self):
+        self.place(relx=1, rely=1, anchor="se", x=-10, y=-10)
+        self.lift()
+        self.refresh()
+
+    def hide(self):
+        if self._refreshing is not None:
+            self.after_cancel(self._refreshing)
+            self._refreshing = None
+        self.place_forget()
+
+    def toggle(self):
+        if self.winfo_ismapped():
+            self.hide()
+        else:
+            self.show()
+
+    def refresh(self):
+        lines = [f"{name[:28]:<28} {stat['last_ms']:7.1f} ms  avg {stat['avg_ms']:6.1f}  {stat['count']}x"
+                 for name, stat in timings.latest(self.limit)]
+        lines += [f"{name[:28]:<28} {count}" for name, count in sorted(timings.counters().items())]
+        self.label.configure(text="\n".join(lines) or "No timings yet")
+        self._refreshing = self.after(self.interval, self.refresh)
+
+class BookCard(ctk.CTkFrame):
+    """A book card whose labels and buttons can be rebound to another book."""
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, corner_radius=10, **kwargs)
+
+        self.title_label = ctk.CTkLabel(self, text="", font=("Century Gothic", 16, "bold"))
+        self.title_label.pack(pady=(10, 5), padx=10)
+        self.author_label = ctk.CTkLabel(self, text="")
+        self.author_label.pack(pady=2, padx=10, anchor="w")
+        self.isbn_label = ctk.CTkLabel(self, text="")
+        self.isbn_label.pack(pady=2, padx=10, anchor="w")
+        self.genre_label = ctk.CTkLabel(self, text="")
+        self.genre_label.pack(pady=2, padx=10, anchor="w")
+        self.status_label = ctk.CTkLabel(self, text="")
+        self.status_label.pack(pady=2, padx=10, anchor="w")
+
+        self.buttons_frame = ctk.CTkFrame(self, height=38, fg_color="transparent")
+        self.buttons_frame.pack(pady=10, padx=10, fill="x")
+
+        self._buttons = [ctk.CTkButton(self.buttons_frame, text=""), ctk.CTkButton(self.buttons_frame, text="")]
+        self._button_count = 0
+
+    def show(self, book, unavailable_text="Borrowed"):
+        self.title_label.configure(text=book.get("title", ""))
+        self.author_label.configure(text=f"Author: {book.get('author', 'Unknown')}")
+        self.isbn_label.configure(text=f"ISBN: {book.get('isbn', 'N/A')}")
+        self.genre_label.configure(text=f"Genre: {book.get('genre', 'N/A')}")
+
+        availability = book.get("available", True)
+        status_text = "Status: Available" if availability else f"Status: {unavailable_text}"
+        if copies(book) > 1:
+            status_text += f" ({available_copies(book)} of {copies(book)} copies)"
+        status_color = "#28a745" if availability else "#dc3545"
+        self.status_label.configure(text=status_text, text_color=status_color)
+
+    def set_buttons(self, buttons):
+        # buttons are CTkButton options; unset colours go back to the theme default
+        for button, spec in zip(self._buttons, buttons):
+            options = {
+                "width": 120,
+                "fg_color": ctk.ThemeManager.theme["CTkButton"]["fg_color"],
+                "hover_color": ctk.ThemeManager.theme["CTkButton"]["hover_color"],
+            }
+            options.update(spec)
+            button.configure(**options)
+
+        if len(buttons) == self._button_count:
+            return
+
+        for button in self._buttons:
+            button.pack_forget()
+
+        # a single button is centred, a pair is pushed to either side
+        if len(buttons) == 1:
+            self._buttons[0].pack()
+        elif len(buttons) == 2:
+            self._buttons[0].pack(side="left", padx=(0, 5))
+            self._buttons[1].pack(side="right", padx=(5, 0))
+
+        self._button_count = len(buttons)
+
+class BookCardPool:
+    """Book cards kept alive in a canvas so they are rebound instead of rebuilt."""
+
+    def __init__(self, canvas, on_create=None):
+        self.canvas = canvas
+        self.on_create = on_create
+        self.windows = {}
+        self._free = []
+
+    def __len__(self):
+        return len(self.windows)
+
+    def acquire(self):
+        if self._free:
+            return self._free.pop()
+
+        with timings.timed("widgets.create"):
+            card = BookCard(self.canvas)
+        timings.count("cards.created")
+        self.windows[card] = self.canvas.create_window(0, 0, window=card, anchor="nw")
+        if self.on_create:
+            self.on_create(card)
+        return card
+
+    def release(self, card):
+        self.canvas.itemconfigure(self.windows[card], state="hidden")
+        self._free.append(card)
+
+class VirtualBookGrid(ctk.CTkFrame):
+    """Card grid that only builds the cards in view plus a few overscan rows.
+
+    Cards that scroll out of view are rebound to the books scrolling in, so the
+    number of widgets depends on the viewport and not on the number of books.
+    """
+
+    def __init__(self, master, bind_card=None, columns=3, row_height=240, overscan=1, height=450, **kwargs):
+        super().__init__(master, fg_color="transparent", height=height, **kwargs)
+        self.bind_card = bind_card
+        self.columns = columns
+        self.row_height = row_height
+        self.overscan = overscan
+        self.books = []
+
+        self._visible = {}
+        self._card_width = 1
+
+        # keep the requested height instead of shrinking to the canvas
+        self.grid_propagate(False)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self._viewport = ctk.CTkCanvas(self, highlightthickness=0,
+                                       bg=self._apply_appearance_mode(self._bg_color),
+                                       yscrollincrement=self._apply_widget_scaling(30))
+        self._viewport.grid(row=0, column=0, sticky="nsew")
+
+        self._scrollbar = ctk.CTkScrollbar(self, command=self._viewport.yview)
+        self._scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self._viewport.configure(yscrollcommand=self._on_scroll)
+        self._viewport.bind("<Configure>", lambda event: self._layout())
+        self._bind_mouse_wheel(self._viewport)
+
+        self._pool = BookCardPool(self._viewport, on_create=self._bind_mouse_wheel)
+
+    def set_books(self, books, bind_card=None):
+        # switching views only rebinds the pooled cards to the new books
+        self.books = books
+        if bind_card is not None:
+            self.bind_card = bind_card
+
+        for card in self._visible.values():
+            self._pool.release(card)
+        self._visible.clear()
+
+        self._viewport.yview_moveto(0)
+        with timings.timed("render.grid"):
+            self._layout()
+
+    def scroll_to(self, fraction):
+        """Scroll so that ``fraction`` of the grid is above the viewport."""
+        self._viewport.yview_moveto(fraction)
+
+    def _row_height(self):
+        return self._apply_widget_scaling(self.row_height)
+
+    def page_size(self):
+        # the books needed to fill the viewport at the configured height
+        rows = -(-self.cget("height") // self.row_height) + self.overscan
+        return rows * self.columns
+
+    def _layout(self):
+        width = self._viewport.winfo_width()
+        rows = -(-len(self.books) // self.columns)
+        self._card_width = max(width // self.columns, 1)
+        self._viewport.configure(scrollregion=(0, 0, width, rows * self._row_height()))
+
+        for index, card in self._visible.items():
+            self._place(index, card)
+
+        self._update_visible()
+
+    def _on_scroll(self, first, last):
+        self._scrollbar.set(first, last)
+        self._update_visible()
+
+    def _update_visible(self):
+        row_height = self._row_height()
+        top = self._viewport.canvasy(0)
+        bottom = top + self._viewport.winfo_height()
+
+        first_row = max(int(top // row_height) - self.overscan, 0)
+        last_row = int(bottom // row_height) + self.overscan
+        start = first_row * self.columns
+        end = min((last_row + 1) * self.columns, len(self.books))
+
+        for index in [i for i in self._visible if not start <= i < end]:
+            self._pool.release(self._visible.pop(index))
+
+        bound = 0
+        for index in range(start, end):
+            if index not in self._visible:
+                card = self._pool.acquire()
+                self.bind_card(card, self.books[index])
+                self._visible[index] = card
+                self._place(index, card)
+                bound += 1
+        timings.count("cards.bound", bound)
+
+    def _place(self, index, card):
+        row, col = divmod(index, self.columns)
+        row_height = self._row_height()
+        padding = self._apply_widget_scaling(10)
+
+        window = self._pool.windows[card]
+        self._viewport.coords(window, col * self._card_width + padding, row * row_height + padding)
+        self._viewport.itemconfigure(window, width=max(self._card_width - 2 * padding, 1),
+                                     height=row_height - 2 * padding, state="normal")
+
+    def _bind_mouse_wheel(self, widget):
+        # bind on the plain tk widgets so the event never reaches the
+        # surrounding CTkScrollableFrame's bind_all handler
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tk.Misc.bind(widget, sequence, self._on_mouse_wheel, "+")
+
+        for child in widget.winfo_children():
+            self._bind_mouse_wheel(child)
+
+    def _on_mouse_wheel(self, event):
+        if event.num == 4:
+            step = -1
+        elif event.num == 5:
+            step = 1
+        elif sys.platform == "darwin":
+            step = -event.delta
+        else:
+            step = -1 if event.delta > 0 else 1
+
+        self._viewport.yview_scroll(step, "units")
+        return "break"
+
 class LoginPage(ctk.CTkFrame):
     def __init__(self, parent, controller):
         super().__init__(parent)
@@ -195,19 +683,18 @@ class LoginPage(ctk.CTkFrame):
             self.controller.show_frame(AdminDashboard)
             return
 
-        # check user credentials from JSON file
-        if os.path.exists("users.json"):
-            try:
-                with open("users.json", "r") as file:
-                    users = json.load(file)
-                    for user in users:
-                        if user.get("username") == username and user.get("password") == password:
-                            self.controller.set_current_user(user)
-                            self.controller.show_frame(UserDashboard)
-                            return
-            except json.JSONDecodeError:
-                messagebox.showerror("Error", "Database error!")
-                return
+        # check user credentials against the stored accounts
+        started = time.perf_counter()
+        self.controller.worker.submit(lambda: self.controller.repository.authenticate(username, password),
+                                      lambda user: self._finish_login(user, started), name="login")
+
+    def _finish_login(self, user, started):
+        # from the click to the answer, worker queue included
+        timings.record("login_page", time.perf_counter() - started)
+        if user:
+            self.controller.set_current_user(user)
+            self.controller.show_frame(UserDashboard)
+            return
 
         messagebox.showerror("Error", "Invalid username or password!")
 
@@ -344,22 +831,17 @@ class SignupPage(ctk.CTkFrame):
             messagebox.showerror("Error", "Username taken!")
             return
 
-        # check for existing username
-        users = []
-        if os.path.exists("users.json"):
-            try:
-                with open("users.json", "r") as file:
-                    users = json.load(file)
-                    if any(user.get("username") == data["username"] for user in users):
-                        messagebox.showerror("Error", "Username taken!")
-                        return
-            except json.JSONDecodeError:
-                pass
-
-        # add new user and save
-        users.append(data)
-        with open("users.json", "w") as file:
-            json.dump(users, file, indent=4)
+        # the username check and the new account are one transaction
+        repository = self.controller.repository
+        started = time.perf_counter()
+        self.controller.worker.submit(lambda: repository.add_user(data),
+                                      lambda created: self._finish_signup(created, started), name="signup")
+
+    def _finish_signup(self, created, started):
+        timings.record("signup_page", time.perf_counter() - started)
+        if not created:
+            messagebox.showerror("Error", "Username taken!")
+            return
 
         messagebox.showinfo("Success", "Account created successfully!")
         self.controller.show_frame(LoginPage)
@@ -368,7 +850,16 @@ class AdminDashboard(ctk.CTkFrame):
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
+        self.repository = controller.repository
         self.current_book_isbn = None
+        self.borrow_status = "All"
+        self.borrow_order = "Borrowed"
+
+        self.worker = controller.worker
+        self.library_search = DebouncedSearch(self, self._search_library, self._show_library_results,
+                                              worker=self.worker)
+        self.edit_search = DebouncedSearch(self, self.repository.search_books, self._show_edit_results,
+                                           worker=self.worker)
 
         # frame responsive
         self.columnconfigure(1, weight=1)
@@ -402,46 +893,67 @@ class AdminDashboard(ctk.CTkFrame):
         self.content_frame = ctk.CTkScrollableFrame(self.main_container)
         self.content_frame.grid(row=1, column=0, sticky="nsew")
 
-        self.refresh_content()
+        # one grid for every book view, it survives _clear_content
+        self.book_grid = VirtualBookGrid(self.content_frame)
+        self.main_container.bind("<Configure>", lambda event: self._fit_book_grid(), add="+")
 
     def refresh_content(self):
         self.show_library()
 
     def _clear_content(self):
+        self.library_search.reset()
+        self.edit_search.reset()
+        self.book_grid.pack_forget()
+
         for widget in self.content_frame.winfo_children():
+            if widget is not self.book_grid:
+                widget.destroy()
+
+    def _clear_results(self):
+        self.book_grid.pack_forget()
+
+        for widget in self.results_frame.winfo_children():
             widget.destroy()
 
-    def search_books(self, search_entry=None):
-        query = search_entry.get().lower() if search_entry else ""
+    def _book_grid_height(self):
+        # the header and search bar take roughly 160px of the main container
+        return max(self.main_container.winfo_height() - 160, 320)
+
+    def _show_book_grid(self, books, bind_card):
+        # packed last, so it sits below the header and the results frame
+        self._fit_book_grid()
+        self.book_grid.pack(fill="both", expand=True)
+        self.book_grid.set_books(books, bind_card)
 
-        books = self._load_books()
+    def _fit_book_grid(self):
+        height = self._book_grid_height()
+        if self.book_grid.cget("height") != height:
+            self.book_grid.configure(height=height)
 
+    def search_books(self, search_entry=None):
+        self.library_search.run(search_entry.get() if search_entry else "")
+
+    def _search_library(self, query):
         if query:
-            results = [book for book in books if
-                       query in book.get("title", "").lower() or
-                       query in book.get("author", "").lower() or
-                       query in book.get("isbn", "").lower() or
-                       query in book.get("genre", "").lower()]
-        else:
-            results = books
+            return self.repository.search_books(query)
+        return sorted(self._load_books(), key=lambda x: x.get('title', '').lower())
 
-        for widget in self.content_frame.winfo_children():
-            if widget != self.content_frame.winfo_children()[0]:
-                widget.destroy()
+    def _show_library_results(self, query, results):
+        self._clear_results()
 
         if query:
-            results_label = ctk.CTkLabel(self.content_frame,
+            results_label = ctk.CTkLabel(self.results_frame,
                                          text=f"Found {len(results)} matching books for '{query}'")
             results_label.pack(pady=(10, 5))
 
-            back_btn = ctk.CTkButton(self.content_frame, text="← Show All Books",
+            back_btn = ctk.CTkButton(self.results_frame, text="← Show All Books",
                                      fg_color="transparent", text_color=("#1F6AA5"),
                                      hover_color=("#E5E5E5"), width=150,
                                      command=lambda: self.show_library())
             back_btn.pack(pady=(0, 10))
 
         if not results:
-            ctk.CTkLabel(self.content_frame, text="No matching books found").pack(pady=20)
+            ctk.CTkLabel(self.results_frame, text="No matching books found").pack(pady=20)
             return
 
         self._display_books(results)
@@ -466,53 +978,47 @@ class AdminDashboard(ctk.CTkFrame):
         search_entry.pack(side="left", padx=(285, 10), pady=(10, 0))
 
         def on_search(*args):
-            self.search_books(search_entry)
+            self.library_search.schedule(search_entry.get())
 
         search_entry.bind("<KeyRelease>", on_search)
 
         ctk.CTkButton(search_frame, text="Search", width=80,
                       command=lambda: self.search_books(search_entry)).pack(anchor="e", padx=(0, 10), pady=(10, 0))
 
-        books = self._load_books()
-        if not books:
-            ctk.CTkLabel(self.content_frame, text="No books available in the library").pack(pady=20)
+        self.results_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
+        self.results_frame.pack(fill="both", expand=True)
+
+        if not self.repository.is_loaded():
+            # first page straight from the store, sorted once the whole catalog is in
+            self._fit_book_grid()
+            loading_label = ctk.CTkLabel(self.results_frame, text="Loading the full catalog...")
+            loading_label.pack(pady=(10, 5))
+            self._display_books(self.repository.preview_books(self.book_grid.page_size()))
+            after_catalog_loaded(self, self.repository,
+                                 lambda: loading_label.winfo_exists() and self.show_library())
             return
 
-        sorted_books = sorted(books, key=lambda x: x.get('title', '').lower())
-
-        self._display_books(sorted_books)
-
-    def _display_books(self, books):
-        books_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
-        books_frame.pack(fill="both", expand=True)
-
-        columns = 3
-        for i in range(columns):
-            books_frame.columnconfigure(i, weight=1)
-
-        for i, book in enumerate(books):
-            row, col = divmod(i, columns)
+        self.worker.load_into(loading_placeholder(self.results_frame),
+                              lambda: self._search_library(""), self._show_all_books)
 
-            card = ctk.CTkFrame(books_frame, corner_radius=10)
-            card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
+    def _show_all_books(self, books):
+        if not books:
+            ctk.CTkLabel(self.results_frame, text="No books available in the library").pack(pady=20)
+            return
 
-            ctk.CTkLabel(card, text=book.get("title", ""),
-                         font=("Century Gothic", 16, "bold")).pack(pady=(10, 5), padx=10)
-            ctk.CTkLabel(card, text=f"Author: {book.get('author', 'Unknown')}").pack(pady=2, padx=10, anchor="w")
-            ctk.CTkLabel(card, text=f"ISBN: {book.get('isbn', 'N/A')}").pack(pady=2, padx=10, anchor="w")
-            ctk.CTkLabel(card, text=f"Genre: {book.get('genre', 'N/A')}").pack(pady=2, padx=10, anchor="w")
+        self._display_books(books)
 
-            availability = book.get("available", True)
-            status_text = "Status: Available" if availability else "Status: Borrowed"
-            status_color = "#28a745" if availability else "#dc3545"
+    def _display_books(self, books):
+        self._show_book_grid(books, self._bind_library_card)
 
-            ctk.CTkLabel(card, text=status_text, text_color=status_color).pack(pady=2, padx=10, anchor="w")
+    def _bind_library_card(self, card, book):
+        card.show(book)
 
-            if availability:
-                ctk.CTkButton(card, text="Borrow", width=120,
-                              command=lambda isbn=book.get("isbn"): self.borrow_book(isbn)).pack(pady=10, padx=10)
-            else:
-                ctk.CTkFrame(card, height=38, fg_color="transparent").pack(pady=10, padx=10)
+        if book.get("available", True):
+            card.set_buttons([{"text": "Borrow",
+                               "command": lambda isbn=book.get("isbn"): self.borrow_book(isbn)}])
+        else:
+            card.set_buttons([])
 
     def show_add_book(self):
         self._clear_content()
@@ -533,7 +1039,8 @@ class AdminDashboard(ctk.CTkFrame):
             ("Title:", "title_entry"),
             ("Author:", "author_entry"),
             ("ISBN:", "isbn_entry"),
-            ("Genre:", "genre_entry")
+            ("Genre:", "genre_entry"),
+            ("Copies:", "copies_entry")
         ]
 
         self.book_entries = {}
@@ -542,6 +1049,8 @@ class AdminDashboard(ctk.CTkFrame):
             entry = ctk.CTkEntry(form_frame, width=300)
             entry.grid(row=i, column=1, padx=10, pady=10, sticky="w")
             self.book_entries[entry_name] = entry
+        # copies of one title share its record instead of getting made-up ISBNs
+        self.book_entries["copies_entry"].insert(0, "1")
 
         ctk.CTkButton(form_frame, text="Add Book", command=self.add_book).grid(
             row=len(fields) + 1, column=0, columnspan=2, pady=20)
@@ -565,15 +1074,17 @@ class AdminDashboard(ctk.CTkFrame):
             messagebox.showerror("Error", "ISBN must contain only numbers!")
             return
 
-        books = self._load_books()
-
-        if any(book.get("isbn") == data["isbn"] for book in books):
-            messagebox.showerror("Error", "A book with this ISBN already exists!")
+        total = self._copies_entered()
+        if total is None:
             return
+        data["copies"] = total
 
-        books.append(data)
+        self.worker.submit(lambda: self.repository.add_book(data), self._finish_add_book)
 
-        self._save_books(books)
+    def _finish_add_book(self, added):
+        if not added:
+            messagebox.showerror("Error", "A book with this ISBN already exists!")
+            return
 
         messagebox.showinfo("Success", "Book added successfully!")
 
@@ -599,7 +1110,7 @@ class AdminDashboard(ctk.CTkFrame):
         search_entry.pack(side="left", padx=(285, 10), pady=(10, 0))
 
         def on_search(*args):
-            self.search_books_to_edit(search_entry)
+            self.edit_search.schedule(search_entry.get())
 
         search_entry.bind("<KeyRelease>", on_search)
 
@@ -607,33 +1118,25 @@ class AdminDashboard(ctk.CTkFrame):
                       command=lambda: self.search_books_to_edit(search_entry)).pack(anchor="e", padx=(0, 10),
                                                                                     pady=(10, 0))
 
-        self.display_books_for_editing()
+        self.results_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
+        self.results_frame.pack(fill="both", expand=True)
 
-    def search_books_to_edit(self, search_entry=None):
-        query = search_entry.get().lower() if search_entry else ""
-
-        books = self._load_books()
+        self.worker.load_into(loading_placeholder(self.results_frame), self._load_books,
+                              self.display_books_for_editing)
 
-        if query:
-            results = [book for book in books if
-                       query in book.get("title", "").lower() or
-                       query in book.get("author", "").lower() or
-                       query in book.get("isbn", "").lower() or
-                       query in book.get("genre", "").lower()]
-        else:
-            results = books
+    def search_books_to_edit(self, search_entry=None):
+        self.edit_search.run(search_entry.get() if search_entry else "")
 
-        for widget in self.content_frame.winfo_children():
-            if len(self.content_frame.winfo_children()) > 1 and widget != self.content_frame.winfo_children()[0]:
-                widget.destroy()
+    def _show_edit_results(self, query, results):
+        self._clear_results()
 
         if query:
-            results_label = ctk.CTkLabel(self.content_frame,
+            results_label = ctk.CTkLabel(self.results_frame,
                                          text=f"Found {len(results)} matching books for '{query}'")
             results_label.pack(pady=(10, 5))
 
         if not results:
-            ctk.CTkLabel(self.content_frame, text="No matching books found").pack(pady=20)
+            ctk.CTkLabel(self.results_frame, text="No matching books found").pack(pady=20)
             return
 
         self.display_books_for_editing(results)
@@ -643,53 +1146,26 @@ class AdminDashboard(ctk.CTkFrame):
             books = self._load_books()
 
         if not books:
-            ctk.CTkLabel(self.content_frame, text="No books available in the library").pack(pady=20)
+            ctk.CTkLabel(self.results_frame, text="No books available in the library").pack(pady=20)
             return
 
-        books_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
-        books_frame.pack(fill="both", expand=True)
+        self._show_book_grid(books, self._bind_edit_card)
 
-        columns = 3
-        for i in range(columns):
-            books_frame.columnconfigure(i, weight=1)
-
-        for i, book in enumerate(books):
-            row, col = divmod(i, columns)
-
-            card = ctk.CTkFrame(books_frame, corner_radius=10)
-            card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
-
-            ctk.CTkLabel(card, text=book.get("title", ""),
-                         font=("Century Gothic", 16, "bold")).pack(pady=(10, 5), padx=10)
-            ctk.CTkLabel(card, text=f"Author: {book.get('author', 'Unknown')}").pack(pady=2, padx=10, anchor="w")
-            ctk.CTkLabel(card, text=f"ISBN: {book.get('isbn', 'N/A')}").pack(pady=2, padx=10, anchor="w")
-            ctk.CTkLabel(card, text=f"Genre: {book.get('genre', 'N/A')}").pack(pady=2, padx=10, anchor="w")
-
-            availability = book.get("available", True)
-            status_text = "Status: Available" if availability else "Status: Borrowed"
-            status_color = "#28a745" if availability else "#dc3545"
-
-            ctk.CTkLabel(card, text=status_text, text_color=status_color).pack(pady=2, padx=10, anchor="w")
-
-            buttons_frame = ctk.CTkFrame(card, fg_color="transparent")
-            buttons_frame.pack(pady=10, padx=10, fill="x")
-
-            ctk.CTkButton(buttons_frame, text="Edit",
-                          command=lambda isbn=book.get("isbn"): self.edit_book(isbn),
-                          width=80).pack(side="left", padx=(0, 5))
-
-            ctk.CTkButton(buttons_frame, text="Delete",
-                          command=lambda isbn=book.get("isbn"): self.delete_book(isbn),
-                          fg_color="#D35B58", hover_color="#C77C78",
-                          width=80).pack(side="right", padx=(5, 0))
+    def _bind_edit_card(self, card, book):
+        card.show(book)
+        card.set_buttons([
+            {"text": "Edit", "width": 80,
+             "command": lambda isbn=book.get("isbn"): self.edit_book(isbn)},
+            {"text": "Delete", "width": 80, "fg_color": "#D35B58", "hover_color": "#C77C78",
+             "command": lambda isbn=book.get("isbn"): self.delete_book(isbn)},
+        ])
 
     def edit_book(self, isbn):
         if not isbn:
             messagebox.showerror("Error", "Please enter a valid ISBN!")
             return
 
-        books = self._load_books()
-        book = next((b for b in books if b.get("isbn") == isbn), None)
+        book = self.repository.get_book(isbn)
 
         if not book:
             messagebox.showerror("Error", "Book not found!")
@@ -707,6 +1183,7 @@ class AdminDashboard(ctk.CTkFrame):
             ("Author:", "author_entry", book.get("author", "")),
             ("ISBN:", "isbn_entry", book.get("isbn", "")),
             ("Genre:", "genre_entry", book.get("genre", "")),
+            ("Copies:", "copies_entry", str(copies(book))),
         ]
 
         self.book_entries = {}
@@ -741,53 +1218,77 @@ class AdminDashboard(ctk.CTkFrame):
             messagebox.showerror("Error", "ISBN must contain only numbers!")
             return
 
-        books = self._load_books()
-
-        # check for ISBN conflict
-        if data["isbn"] != self.current_book_isbn and any(book.get("isbn") == data["isbn"] for book in books):
-            messagebox.showerror("Error", "A book with this ISBN already exists!")
+        total = self._copies_entered()
+        if total is None:
             return
+        data["copies"] = total
 
-        for book in books:
-            if book.get("isbn") == self.current_book_isbn:
-                data["available"] = book.get("available", True)
+        isbn = self.current_book_isbn
+
+        def update():
+            book = self.repository.get_book(isbn)
+            if book:
+                on_loan = copies(book) - available_copies(book)
+                if total < on_loan:
+                    return f"{on_loan} copies are on loan, the book can't have fewer copies than that!"
                 data["date_added"] = book.get("date_added", datetime.now().strftime("%Y-%m-%d"))
-                for key, value in data.items():
-                    book[key] = value
-                break
+                # the repository checks for an ISBN conflict in the same transaction as the update
+                if self.repository.update_book(isbn, data) is False:
+                    return "A book with this ISBN already exists!"
+            return None
 
-        self._save_books(books)
+        self.worker.submit(update, self._finish_update_book)
+
+    def _copies_entered(self):
+        count = self.book_entries["copies_entry"].get().strip()
+        if not count.isdigit() or int(count) < 1:
+            messagebox.showerror("Error", "Copies must be a whole number of at least 1!")
+            return None
+        return int(count)
+
+    def _finish_update_book(self, error):
+        if error:
+            messagebox.showerror("Error", error)
+            return
 
         messagebox.showinfo("Success", "Book updated successfully!")
         self.show_library()
 
     def delete_book(self, isbn):
-        if messagebox.askyesno("Confirm", "Are you sure you want to delete this book?"):
-            books = self._load_books()
+        if not messagebox.askyesno("Confirm", "Are you sure you want to delete this book?"):
+            return
 
-            index = next((i for i, book in enumerate(books) if book.get("isbn") == isbn), -1)
+        def delete():
+            book = self.repository.get_book(isbn)
+            if not book:
+                return "Book not found!"
+            if available_copies(book) < copies(book):
+                return "Cannot delete a book that is currently borrowed!"
 
-            if index >= 0:
-                book = books[index]
-                if not book.get("available", True):
-                    messagebox.showerror("Error", "Cannot delete a book that is currently borrowed!")
-                    return
+            self.repository.delete_book(isbn)
+            return None
 
-                books.pop(index)
-                self._save_books(books)
-                messagebox.showinfo("Success", "Book deleted successfully!")
-                self.show_library()
-            else:
-                messagebox.showerror("Error", "Book not found!")
+        self.worker.submit(delete, self._finish_delete_book)
+
+    def _finish_delete_book(self, error):
+        if error:
+            messagebox.showerror("Error", error)
+            return
+
+        messagebox.showinfo("Success", "Book deleted successfully!")
+        self.show_library()
 
     def borrow_book(self, isbn):
-        # Load users for selection
-        users = self._load_users()
+        # Load users for selection, with all their loan counts in the same task,
+        # so filtering the list as you type never waits on storage
+        self.worker.submit(lambda: (self._load_users(), self._get_book_by_isbn(isbn), self.repository.loan_counts()),
+                           lambda loaded: self._show_borrow_dialog(isbn, *loaded), name="borrow_dialog")
+
+    def _show_borrow_dialog(self, isbn, users, book, loan_counts):
         if not users:
             messagebox.showerror("Error", "No users found in the system!")
             return
 
-        book = self._get_book_by_isbn(isbn)
         if not book:
             messagebox.showerror("Error", "Book not found!")
             return
@@ -818,12 +1319,9 @@ class AdminDashboard(ctk.CTkFrame):
         users_frame = ctk.CTkScrollableFrame(dialog_frame)
         users_frame.pack(fill="both", expand=True)
 
-        selected_username = None
-
         def select_user(username):
-            nonlocal selected_username
-            selected_username = username
             user_dialog.destroy()
+            self._borrow_for(isbn, username)
 
         def display_users(search_text=""):
             for widget in users_frame.winfo_children():
@@ -853,12 +1351,10 @@ class AdminDashboard(ctk.CTkFrame):
                 ctk.CTkLabel(info_frame,
                              text=f"Username: {user.get('username', '')}").pack(anchor="w")
 
-                borrows = self._load_borrows()
-                user_borrows = [b for b in borrows if b.get("username") == user.get("username")]
-                borrow_count = len(user_borrows)
+                borrow_count = loan_counts.get(user.get("username"), 0)
 
-                status_text = f"Borrowed: {borrow_count}/3 books"
-                status_color = "#28a745" if borrow_count < 3 else "#dc3545"
+                status_text = f"Borrowed: {borrow_count}/{LOAN_LIMIT} books"
+                status_color = "#28a745" if borrow_count < LOAN_LIMIT else "#dc3545"
 
                 ctk.CTkLabel(info_frame,
                              text=status_text,
@@ -868,7 +1364,7 @@ class AdminDashboard(ctk.CTkFrame):
                     user_frame,
                     text="Select",
                     width=80,
-                    state="normal" if borrow_count < 3 else "disabled",
+                    state="normal" if borrow_count < LOAN_LIMIT else "disabled",
                     command=lambda u=user.get("username"): select_user(u)
                 )
                 select_btn.pack(side="right", padx=10, pady=10)
@@ -880,40 +1376,32 @@ class AdminDashboard(ctk.CTkFrame):
 
         display_users()
 
-        self.wait_window(user_dialog)
-
-        # If no user was selected, return
-        if not selected_username:
-            return
-
-        today = datetime.now()
-        due_date = today + timedelta(days=14)  # 2 weeks borrowing period
-
-        borrow_record = {
-            "isbn": isbn,
-            "username": selected_username,
-            "borrow_date": today.strftime("%Y-%m-%d"),
-            "due_date": due_date.strftime("%Y-%m-%d")
-        }
-
-        # Update book availability
-        books = self._load_books()
-        for b in books:
-            if b.get("isbn") == isbn:
-                b["available"] = False
-                break
+    def _borrow_for(self, isbn, selected_username):
+        # the usual two weeks, the same loan a returned book's next holder gets
+        borrow_record = new_loan(isbn, selected_username)
+
+        def borrow():
+            # Update book availability and record the loan
+            if not self.repository.borrow_book(borrow_record):
+                return False, None
+            return True, self._get_user_by_username(selected_username)
+
+        def done(result):
+            borrowed, user = result
+            if not borrowed:
+                # e.g. another desk lent the last copy while the dialog was open
+                messagebox.showerror("Error", "The book could not be borrowed: no copy is left, "
+                                              f"the user already has one or has {LOAN_LIMIT} books")
+                self.show_library()
+                return
 
-        self._save_books(books)
-        borrows = self._load_borrows()
-        borrows.append(borrow_record)
-        self._save_borrows(borrows)
+            user_name = user.get("name", selected_username) if user else selected_username
 
-        user = self._get_user_by_username(selected_username)
-        user_name = user.get("name", selected_username) if user else selected_username
+            messagebox.showinfo("Success",
+                                f"Book borrowed successfully by {user_name}!\nDue date: {borrow_record['due_date']}")
+            self.show_library()
 
-        messagebox.showinfo("Success",
-                            f"Book borrowed successfully by {user_name}!\nDue date: {borrow_record['due_date']}")
-        self.show_library()
+        self.worker.submit(borrow, done)
 
     def show_borrowed(self):
         self._clear_content()
@@ -927,9 +1415,36 @@ class AdminDashboard(ctk.CTkFrame):
         ctk.CTkLabel(title_frame, text="Borrowed Books",
                      font=("Century Gothic", 24, "bold")).pack(anchor="w")
 
-        borrows = self._load_borrows()
-        if not borrows:
-            ctk.CTkLabel(self.content_frame, text="No books are currently borrowed").pack(pady=20)
+        # filter and sort come from the due date index, the choice sticks across returns
+        controls_frame = ctk.CTkFrame(borrowed_frame, fg_color="transparent")
+        controls_frame.pack(fill="x", padx=20, pady=(0, 10))
+
+        ctk.CTkLabel(controls_frame, text="Show:").pack(side="left", padx=(0, 5))
+        status_filter = ctk.CTkSegmentedButton(controls_frame, values=list(BORROW_STATUSES),
+                                               command=lambda label: self._set_borrow_view(status=label))
+        status_filter.set(self.borrow_status)
+        status_filter.pack(side="left")
+
+        ctk.CTkLabel(controls_frame, text="Sort:").pack(side="left", padx=(20, 5))
+        order_filter = ctk.CTkSegmentedButton(controls_frame, values=list(BORROW_ORDERS),
+                                              command=lambda label: self._set_borrow_view(order=label))
+        order_filter.set(self.borrow_order)
+        order_filter.pack(side="left")
+
+        status, order = BORROW_STATUSES[self.borrow_status], BORROW_ORDERS[self.borrow_order]
+        self.worker.load_into(loading_placeholder(self.content_frame),
+                              lambda: self.repository.get_borrow_rows(status=status, days=DUE_SOON_DAYS, order=order),
+                              self._show_borrow_rows)
+
+    def _set_borrow_view(self, status=None, order=None):
+        self.borrow_status = status or self.borrow_status
+        self.borrow_order = order or self.borrow_order
+        self.show_borrowed()
+
+    def _show_borrow_rows(self, rows):
+        if not rows:
+            text = "No books are currently borrowed" if self.borrow_status == "All" else "No matching loans"
+            ctk.CTkLabel(self.content_frame, text=text).pack(pady=20)
             return
 
         headers = ["Book Title", "Borrowed By", "Borrow Date", "Due Date", "Actions"]
@@ -948,23 +1463,20 @@ class AdminDashboard(ctk.CTkFrame):
                 font=("Century Gothic", 12, "bold"),
             ).grid(row=0, column=i, sticky="ew", padx=4, pady=(5, 10))
 
-        for row_idx, record in enumerate(borrows):
-            book = self._get_book_by_isbn(record.get("isbn", ""))
-            book_title = book.get("title", "Unknown") if book else "Unknown"
-
-            user = self._get_user_by_username(record.get("username", ""))
-            user_name = user.get("name", record.get("username", "Unknown")) if user else record.get("username",
-                                                                                                    "Unknown")
-
+        for row_idx, record in enumerate(rows):
             row_color = "#F0F0F0" if row_idx % 2 == 0 else "#FFFFFF"
 
-            cell_data = [book_title, user_name, record.get("borrow_date", ""), record.get("due_date", "")]
+            cell_data = [record["book_title"], record["user_name"], record.get("borrow_date", ""),
+                         record.get("due_date", "")]
             for col_idx, text in enumerate(cell_data):
-                ctk.CTkLabel(
+                label = ctk.CTkLabel(
                     table_container,
                     text=text,
                     fg_color=row_color
-                ).grid(row=row_idx + 1, column=col_idx, sticky="ew", padx=2, pady=3)
+                )
+                label.grid(row=row_idx + 1, column=col_idx, sticky="ew", padx=2, pady=3)
+                if col_idx == 3 and record.get("overdue"):
+                    label.configure(text_color="#D35B58")
 
             actions_frame = ctk.CTkFrame(table_container, fg_color=row_color)
             actions_frame.grid(row=row_idx + 1, column=4, sticky="ew", padx=2, pady=3)
@@ -982,31 +1494,26 @@ class AdminDashboard(ctk.CTkFrame):
             messagebox.showerror("Error", "Invalid book or user!")
             return
 
-        books = self._load_books()
-        book_updated = False
-
-        for book in books:
-            if book.get("isbn") == isbn:
-                book["available"] = True
-                book_updated = True
-                break
-
-        if book_updated:
-            self._save_books(books)
-
-            borrows = self._load_borrows()
-            borrows = [b for b in borrows if not (b.get("isbn") == isbn and b.get("username") == username)]
-            self._save_borrows(borrows)
+        self.worker.submit(lambda: self.repository.return_book(isbn, username), self._finish_return)
 
+    def _finish_return(self, returned):
+        if isinstance(returned, dict):
+            # someone was holding the book, it went straight to them
+            messagebox.showinfo("Success", f"Book returned successfully!\nIt is now lent to "
+                                           f"{returned['username']}, the next holder, until {returned['due_date']}.")
+            self.show_borrowed()
+        elif returned:
             messagebox.showinfo("Success", "Book returned successfully!")
             self.show_borrowed()
         else:
-            messagebox.showerror("Error", "Book not found!")
+            messagebox.showerror("Error", "This loan was not found, it may have been returned already!")
+            self.show_borrowed()
 
     def show_users(self):
         self._clear_content()
+        self.worker.load_into(loading_placeholder(self.content_frame), self._load_users, self._show_user_rows)
 
-        users = self._load_users()
+    def _show_user_rows(self, users):
         if not users:
             ctk.CTkLabel(self.content_frame, text="No users registered").pack(pady=20)
             return
@@ -1070,70 +1577,47 @@ class AdminDashboard(ctk.CTkFrame):
                 row_sep.grid(row=row_index + 1, column=0, columnspan=len(headers), sticky="ew")
 
     def delete_user(self, username):
-        if messagebox.askyesno("Confirm", f"Are you sure you want to delete user '{username}'?"):
-            borrows = self._load_borrows()
-            if any(b.get("username") == username for b in borrows):
-                messagebox.showerror("Error", "Cannot delete user with borrowed books!")
-                return
+        if not messagebox.askyesno("Confirm", f"Are you sure you want to delete user '{username}'?"):
+            return
 
-            users = self._load_users()
-            users = [u for u in users if u.get("username") != username]
-            self._save_users(users)
+        def delete():
+            if self.repository.loan_count(username):
+                return False
+            self.repository.delete_user(username)
+            return True
 
-            messagebox.showinfo("Success", "User deleted successfully!")
-            self.show_users()
+        self.worker.submit(delete, self._finish_delete_user)
 
-    def _load_books(self):
-        books = []
-        try:
-            with open("books.json", "r", encoding="utf-8") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return[]
+    def _finish_delete_user(self, deleted):
+        if not deleted:
+            messagebox.showerror("Error", "Cannot delete user with borrowed books!")
+            return
 
-    def _save_books(self, books):
-        with open("books.json", "w", encoding="utf-8") as f:
-            json.dump(books, f, indent=4)
+        messagebox.showinfo("Success", "User deleted successfully!")
+        self.show_users()
 
-    def _load_borrows(self):
-        if os.path.exists("borrows.json"):
-            try:
-                with open("borrows.json", "r") as file:
-                    return json.load(file)
-            except json.JSONDecodeError:
-                return []
-        return []
+    def _load_books(self):
+        return self.repository.get_books()
 
-    def _save_borrows(self, borrows):
-        with open("borrows.json", "w") as file:
-            json.dump(borrows, file, indent=4)
+    def _load_borrows(self):
+        return self.repository.load_borrows()
 
     def _load_users(self):
-        if os.path.exists("users.json"):
-            try:
-                with open("users.json", "r") as file:
-                    return json.load(file)
-            except json.JSONDecodeError:
-                return []
-        return []
-
-    def _save_users(self, users):
-        with open("users.json", "w") as file:
-            json.dump(users, file, indent=4)
+        return self.repository.load_users()
 
     def _get_book_by_isbn(self, isbn):
-        books = self._load_books()
-        return next((book for book in books if book.get("isbn") == isbn), None)
+        return self.repository.get_book(isbn)
 
     def _get_user_by_username(self, username):
-        users = self._load_users()
-        return next((user for user in users if user.get("username") == username), None)
+        return self.repository.get_user(username)
 
 class UserDashboard(ctk.CTkFrame):
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
-        self.db = Database()
+        self.repository = controller.repository
+        self.db = controller.db
+        self.worker = controller.worker
 
         self.columnconfigure(1, weight=1)
         self.rowconfigure(0, weight=1)
@@ -1148,6 +1632,7 @@ class UserDashboard(ctk.CTkFrame):
             ("Browse Books", self.show_library),
             ("Favorites", self.show_favorites),
             ("Borrowed Books", self.show_borrowed),
+            ("My Holds", self.show_holds),
             ("Account", self.show_account)
         ]
 
@@ -1185,6 +1670,10 @@ class UserDashboard(ctk.CTkFrame):
         self.content_frame = ctk.CTkScrollableFrame(self.main_container)
         self.content_frame.grid(row=1, column=0, sticky="nsew")
 
+        # one grid for every book view, it survives _clear_content
+        self.book_grid = VirtualBookGrid(self.content_frame)
+        self.main_container.bind("<Configure>", lambda event: self._fit_book_grid(), add="+")
+
     def refresh_content(self):
         if self.controller.current_user:
             self.username_label.configure(text=self.controller.current_user.get("name",
@@ -1195,8 +1684,10 @@ class UserDashboard(ctk.CTkFrame):
 
     def _clear_content(self):
         """Clear the content area"""
+        self.book_grid.pack_forget()
         for widget in self.content_frame.winfo_children():
-            widget.destroy()
+            if widget is not self.book_grid:
+                widget.destroy()
 
     def search_books(self):
         self._clear_content()
@@ -1214,13 +1705,10 @@ class UserDashboard(ctk.CTkFrame):
                                  command=self.show_library)
         back_btn.pack(anchor="w", pady=(0, 10))
 
-        books = self._load_books()
-        results = [book for book in books if
-                   query in book.get("title", "").lower() or
-                   query in book.get("author", "").lower() or
-                   query in book.get("isbn", "").lower() or
-                   query in book.get("genre", "").lower()]
+        self.worker.load_into(loading_placeholder(self.content_frame),
+                              lambda: self.repository.search_books(query), self._show_search_results)
 
+    def _show_search_results(self, results):
         if not results:
             ctk.CTkLabel(self.content_frame, text="No matching books found").pack(pady=20)
             return
@@ -1230,7 +1718,19 @@ class UserDashboard(ctk.CTkFrame):
     def show_library(self):
         self._clear_content()
 
-        books = self._load_books()
+        if not self.repository.is_loaded():
+            # first page straight from the store while the catalog loads in the background
+            self._fit_book_grid()
+            loading_label = ctk.CTkLabel(self.content_frame, text="Loading the full catalog...")
+            loading_label.pack(pady=(0, 10))
+            self._display_books(self.repository.preview_books(self.book_grid.page_size()))
+            after_catalog_loaded(self, self.repository,
+                                 lambda: loading_label.winfo_exists() and self.show_library())
+            return
+
+        self.worker.load_into(loading_placeholder(self.content_frame), self._load_books, self._show_all_books)
+
+    def _show_all_books(self, books):
         if not books:
             ctk.CTkLabel(self.content_frame, text="No books available in the library").pack(pady=20)
             return
@@ -1238,60 +1738,127 @@ class UserDashboard(ctk.CTkFrame):
         self._display_books(books)
 
     def _display_books(self, books, is_favorites=False):
-        books_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
-        books_frame.pack(fill="both", expand=True)
-
-        columns = 3
-        for i in range(columns):
-            books_frame.columnconfigure(i, weight=1)
-
-        for i, book in enumerate(books):
-            row, col = divmod(i, columns)
-
-            card = ctk.CTkFrame(books_frame, corner_radius=10)
-            card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
-
-            ctk.CTkLabel(card, text=book.get("title", ""),
-                         font=("Century Gothic", 16, "bold")).pack(pady=(10, 5), padx=10)
-            ctk.CTkLabel(card, text=f"Author: {book.get('author', 'Unknown')}").pack(pady=2, padx=10, anchor="w")
-            ctk.CTkLabel(card, text=f"ISBN: {book.get('isbn', 'N/A')}").pack(pady=2, padx=10, anchor="w")
-            ctk.CTkLabel(card, text=f"Genre: {book.get('genre', 'N/A')}").pack(pady=2, padx=10, anchor="w")
-
-            availability = book.get("available", True)
-            status_text = "Status: Available" if availability else "Status: Not Available"
-            status_color = "#28a745" if availability else "#dc3545"
-
-            ctk.CTkLabel(card, text=status_text, text_color=status_color).pack(pady=2, padx=10, anchor="w")
-
-            book_isbn = book.get("isbn", "")
-            if is_favorites:
-                ctk.CTkButton(
-                    card,
-                    text="Remove from favorites",
-                    width=150,
-                    fg_color="#dc3545",
-                    hover_color="#c82333",
-                    command=lambda isbn=book_isbn: self.remove_from_favorites(isbn)
-                ).pack(pady=10, padx=10)
-            else:
-                ctk.CTkButton(
-                    card,
-                    text="Add to favorites",
-                    width=120,
-                    command=lambda isbn=book_isbn: self.add_to_favorites(isbn)
-                ).pack(pady=10, padx=10)
+        self._fit_book_grid()
+        self.book_grid.pack(fill="both", expand=True)
+        self.book_grid.set_books(books, lambda card, book: self._bind_book_card(card, book, is_favorites))
+
+    def _book_grid_height(self):
+        # leave room for the search bar and a page header or back button
+        return max(self.main_container.winfo_height() - 140, 320)
+
+    def _fit_book_grid(self):
+        height = self._book_grid_height()
+        if self.book_grid.cget("height") != height:
+            self.book_grid.configure(height=height)
+
+    def _bind_book_card(self, card, book, is_favorites):
+        card.show(book, unavailable_text="Not Available")
+
+        book_isbn = book.get("isbn", "")
+        if is_favorites:
+            buttons = [{"text": "Remove from favorites", "width": 150,
+                        "fg_color": "#dc3545", "hover_color": "#c82333",
+                        "command": lambda isbn=book_isbn: self.remove_from_favorites(isbn)}]
+        else:
+            buttons = [{"text": "Add to favorites",
+                        "command": lambda isbn=book_isbn: self.add_to_favorites(isbn)}]
+        # a borrowed book can be queued for instead
+        if not book.get("available", True):
+            buttons.append({"text": "Place Hold", "width": 100,
+                            "command": lambda isbn=book_isbn: self.place_hold(isbn)})
+        card.set_buttons(buttons)
+
+    def place_hold(self, isbn):
+        username = self.controller.current_user.get("username")
+        self.worker.submit(lambda: self.repository.place_hold(username, isbn), self._finish_place_hold)
+
+    def _finish_place_hold(self, position):
+        if position is None:
+            messagebox.showinfo("Info", "You can't place a hold on this book: it is on the shelf, "
+                                        "already on loan to you or already held by you")
+        elif position == 1:
+            messagebox.showinfo("Success", "Hold placed, you are next in line")
+        else:
+            messagebox.showinfo("Success", f"Hold placed, you are number {position} in line")
 
-    def add_to_favorites(self, isbn):
-        book = self.db.get_book_by_isbn(isbn)
-        if not book:
-            messagebox.showerror("Error", "Book not found in database")
+    def show_holds(self):
+        if not self.controller.current_user:
+            messagebox.showerror("Error", "You must be logged in to view your holds!")
             return
 
-        if self.db.is_book_in_favorites(isbn):
-            messagebox.showinfo("Info", "This book is already in your favorites")
+        self._clear_content()
+
+        holds_frame = ctk.CTkFrame(self.content_frame, corner_radius=10)
+        holds_frame.pack(fill="x", padx=10, pady=10)
+
+        ctk.CTkLabel(holds_frame, text="My Holds",
+                     font=("Century Gothic", 18, "bold")).pack(anchor="w", padx=20, pady=(10, 10))
+
+        username = self.controller.current_user.get("username")
+        self.worker.load_into(loading_placeholder(self.content_frame),
+                              lambda: self.repository.get_hold_rows(username), self._show_holds)
+
+    def _show_holds(self, holds):
+        if not holds:
+            ctk.CTkLabel(self.content_frame, text="You have no holds. Borrowed books can be held from Browse Books."
+                         ).pack(pady=20)
+            return
+
+        for hold in holds:
+            card = ctk.CTkFrame(self.content_frame, corner_radius=10)
+            card.pack(fill="x", padx=10, pady=10)
+
+            details_frame = ctk.CTkFrame(card, fg_color="transparent")
+            details_frame.pack(side="left", fill="x", expand=True, padx=15, pady=15)
+            details_frame.columnconfigure(1, weight=1)
+
+            ctk.CTkLabel(details_frame, text=hold["book_title"],
+                         font=("Century Gothic", 16, "bold")).grid(row=0, column=0, columnspan=2, sticky="w",
+                                                                   pady=(0, 5))
+            ctk.CTkLabel(details_frame, text=f"by {hold['author']}").grid(
+                row=1, column=0, columnspan=2, sticky="w", pady=(0, 10))
+
+            ctk.CTkLabel(details_frame, text="Placed:").grid(row=2, column=0, sticky="w", pady=2)
+            ctk.CTkLabel(details_frame, text=hold.get("hold_date", "")).grid(row=2, column=1, sticky="w", pady=2)
+
+            ctk.CTkLabel(details_frame, text="In line:").grid(row=3, column=0, sticky="w", pady=2)
+            ctk.CTkLabel(details_frame, text=f"{hold['position']} of {hold['waiting']}").grid(
+                row=3, column=1, sticky="w", pady=2)
+
+            ctk.CTkButton(card, text="Cancel Hold", width=100, fg_color="#D35B58", hover_color="#C77C78",
+                          command=lambda isbn=hold.get("isbn"): self.cancel_hold(isbn)).pack(side="right", padx=15)
+
+    def cancel_hold(self, isbn):
+        if not messagebox.askyesno("Confirm", "Are you sure you want to cancel this hold?"):
             return
 
-        if self.db.add_book_to_favorites(isbn):
+        username = self.controller.current_user.get("username")
+        self.worker.submit(lambda: self.repository.cancel_hold(username, isbn), self._finish_cancel_hold)
+
+    def _finish_cancel_hold(self, cancelled):
+        if not cancelled:
+            messagebox.showerror("Error", "This hold no longer exists")
+        self.show_holds()
+
+    def add_to_favorites(self, isbn):
+        # favorites belong to the user who is logged in
+        username = self.controller.current_user.get("username")
+
+        def add():
+            if not self.db.get_book_by_isbn(isbn):
+                return "missing"
+            if self.db.is_book_in_favorites(username, isbn):
+                return "exists"
+            return "added" if self.db.add_book_to_favorites(username, isbn) else "failed"
+
+        self.worker.submit(add, self._finish_add_favorite)
+
+    def _finish_add_favorite(self, outcome):
+        if outcome == "missing":
+            messagebox.showerror("Error", "Book not found in database")
+        elif outcome == "exists":
+            messagebox.showinfo("Info", "This book is already in your favorites")
+        elif outcome == "added":
             messagebox.showinfo("Success", "Book added to favorites")
         else:
             messagebox.showerror("Error", "Failed to add book to favorites")
@@ -1301,7 +1868,11 @@ class UserDashboard(ctk.CTkFrame):
         if not confirm:
             return
 
-        if self.db.remove_book_from_favorites(isbn):
+        username = self.controller.current_user.get("username")
+        self.worker.submit(lambda: self.db.remove_book_from_favorites(username, isbn), self._finish_remove_favorite)
+
+    def _finish_remove_favorite(self, removed):
+        if removed:
             messagebox.showinfo("Success", "Book removed from favorites")
         else:
             messagebox.showerror("Error", "Failed to remove book from favorites")
@@ -1320,8 +1891,11 @@ class UserDashboard(ctk.CTkFrame):
         ctk.CTkLabel(header_frame, text="My Favorites",
                      font=("Century Gothic", 18, "bold")).pack(anchor="w")
 
-        favorite_books = self.db.get_favorite_books()
+        username = self.controller.current_user.get("username")
+        self.worker.load_into(loading_placeholder(self.content_frame), lambda: self.db.get_favorite_books(username),
+                              self._show_favorite_books)
 
+    def _show_favorite_books(self, favorite_books):
         if not favorite_books:
             empty_label = ctk.CTkLabel(
                 self.content_frame,
@@ -1340,18 +1914,16 @@ class UserDashboard(ctk.CTkFrame):
 
         self._clear_content()
 
-        borrows = self._load_borrows()
-        user_borrows = [b for b in borrows if b.get("username") == self.controller.current_user.get("username")]
+        username = self.controller.current_user.get("username")
+        self.worker.load_into(loading_placeholder(self.content_frame),
+                              lambda: self.repository.get_borrow_rows(username=username), self._show_user_borrows)
 
-        if not user_borrows:
+    def _show_user_borrows(self, rows):
+        if not rows:
             ctk.CTkLabel(self.content_frame, text="You have not borrowed any books").pack(pady=20)
             return
 
-        for borrow in user_borrows:
-            book = self._get_book_by_isbn(borrow.get("isbn"))
-            if not book:
-                continue
-
+        for row in rows:
             card = ctk.CTkFrame(self.content_frame, corner_radius=10)
             card.pack(fill="x", padx=10, pady=10)
 
@@ -1359,20 +1931,20 @@ class UserDashboard(ctk.CTkFrame):
             details_frame.pack(fill="x", padx=15, pady=15)
             details_frame.columnconfigure(1, weight=1)
 
-            ctk.CTkLabel(details_frame, text=book.get("title", "Unknown"),
+            ctk.CTkLabel(details_frame, text=row["book_title"],
                          font=("Century Gothic", 16, "bold")).grid(row=0, column=0, columnspan=2, sticky="w",
                                                                    pady=(0, 5))
-            ctk.CTkLabel(details_frame, text=f"by {book.get('author', 'Unknown')}").grid(
+            ctk.CTkLabel(details_frame, text=f"by {row['book_author']}").grid(
                 row=1, column=0, columnspan=2, sticky="w", pady=(0, 10))
 
             ctk.CTkLabel(details_frame, text="Borrowed:").grid(row=2, column=0, sticky="w", pady=2)
-            ctk.CTkLabel(details_frame, text=borrow.get("borrow_date", "")).grid(row=2, column=1, sticky="w", pady=2)
+            ctk.CTkLabel(details_frame, text=row.get("borrow_date", "")).grid(row=2, column=1, sticky="w", pady=2)
 
             ctk.CTkLabel(details_frame, text="Due date:").grid(row=3, column=0, sticky="w", pady=2)
-            due_date_label = ctk.CTkLabel(details_frame, text=borrow.get("due_date", ""))
+            due_date_label = ctk.CTkLabel(details_frame, text=row.get("due_date", ""))
             due_date_label.grid(row=3, column=1, sticky="w", pady=2)
 
-            if datetime.strptime(borrow.get("due_date", ""), "%Y-%m-%d") < datetime.now():
+            if row["overdue"]:
                 due_date_label.configure(text_color="#D35B58")
 
 
@@ -1417,11 +1989,13 @@ class UserDashboard(ctk.CTkFrame):
         ctk.CTkLabel(stats_frame, text="Library Statistics",
                      font=("Century Gothic", 18, "bold")).pack(anchor="w", padx=20, pady=(20, 10))
 
-        borrows = self._load_borrows()
-        user_borrows = [b for b in borrows if b.get("username") == self.controller.current_user.get("username")]
+        username = self.controller.current_user.get("username")
+        self.worker.load_into(loading_placeholder(stats_frame, padx=20, pady=(0, 20)),
+                              lambda: self.repository.loan_count(username),
+                              lambda current_borrows: self._show_loan_stats(stats_frame, current_borrows))
 
-        current_borrows = len(user_borrows)
-        remaining = 3 - current_borrows  # Max 3 books
+    def _show_loan_stats(self, stats_frame, current_borrows):
+        remaining = LOAN_LIMIT - current_borrows
 
         stats_details = ctk.CTkFrame(stats_frame, fg_color="transparent")
         stats_details.pack(fill="x", padx=20, pady=(0, 20))
@@ -1437,34 +2011,7 @@ class UserDashboard(ctk.CTkFrame):
             row=1, column=1, sticky="w", padx=20, pady=8)
 
     def _load_books(self):
-        if os.path.exists("books.json"):
-            try:
-                with open("books.json", "r") as file:
-                    return json.load(file)
-            except json.JSONDecodeError:
-                return []
-        return []
-
-    def _save_books(self, books):
-        with open("books.json", "w") as file:
-            json.dump(books, file, indent=4)
-
-    def _load_borrows(self):
-        if os.path.exists("borrows.json"):
-            try:
-                with open("borrows.json", "r") as file:
-                    return json.load(file)
-            except json.JSONDecodeError:
-                return []
-        return []
-
-    def _save_borrows(self, borrows):
-        with open("borrows.json", "w") as file:
-            json.dump(borrows, file, indent=4)
-
-    def _get_book_by_isbn(self, isbn):
-        books = self._load_books()
-        return next((book for book in books if book.get("isbn") == isbn), None)
+        return self.repository.get_books()
 
 if __name__ == "__main__":
     app = App()
@@ -0,0 +1,154 @@
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+_NOT_TIMED = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("timings", "name", "started")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings.record(self.name, time.perf_counter() - self.started)
+
+
+class Timings:
+    """Count, average, maximum and latest duration of named operations, plus plain counters.
+
+    Off by default: while ``enabled`` is false, timed() hands back a shared
+    no-op context and record() and count() return at once, so instrumented
+    code pays for an attribute check and nothing else.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._counters = {}
+        self._sequence = itertools.count()
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            count, total, longest, last, _ = self._totals.get(name, (0, 0.0, 0.0, 0.0, 0))
+            self._totals[name] = (count + 1, total + seconds, max(longest, seconds), seconds, next(self._sequence))
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def timed(self, name):
+        """A context manager that records how long its block took."""
+        return _Timer(self, name) if self.enabled else _NOT_TIMED
+
+    def timer(self, name):
+        """Decorator recording every call of the function as ``name``."""
+        def decorate(function):
+            @functools.wraps(function)
+            def timed_function(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - started)
+            return timed_function
+        return decorate
+
+    def stats(self):
+        with self._lock:
+            return {name: {"count": count, "avg_ms": total / count * 1000,
+                           "max_ms": longest * 1000, "last_ms": last * 1000}
+                    for name, (count, total, longest, last, _) in self._totals.items()}
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def latest(self, limit=10):
+        """The ``limit`` most recently recorded operations, newest first."""
+        with self._lock:
+            names = sorted(self._totals, key=lambda name: self._totals[name][4], reverse=True)[:limit]
+        stats = self.stats()
+        return [(name, stats[name]) for name in names]
+
+    def report(self):
+        return "\n".join(f"{name}: {stat['count']}x, avg {stat['avg_ms']:.1f} ms, max {stat['max_ms']:.1f} ms, "
+                         f"last {stat['last_ms']:.1f} ms" for name, stat in sorted(self.stats().items()))
+
+
+class PhaseTimer:
+    """Wall time of consecutive phases, e.g. of the start up."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []
+
+    def mark(self, name):
+        """End the phase called ``name``, which began where the previous one ended."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def total(self):
+        return self._last - self.started
+
+    def report(self, title="Startup"):
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases)
+        return f"{title}: {phases} (total {self.total() * 1000:.0f} ms)"
+
+
+class MetricsDump:
+    """Writes ``collect()`` as JSON to ``path`` every ``interval`` seconds from a background thread.
+
+    The file is replaced in one rename, so a reader never sees half a dump.
+    """
+
+    def __init__(self, path, collect, interval=10.0):
+        self.path = path
+        self.collect = collect
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # one last dump, so the file ends up covering the whole session
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        data = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **self.collect()}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+# shared by the storage layer and the pages, the app switches it on
+timings = Timings()
@@ -0,0 +1,114 @@
+SEARCH_FIELDS = ("title", "author", "isbn", "genre")
+GRAM_SIZE = 3
+
+
+def book_matches(book, query):
+    """Substring test used by the search boxes, ``query`` is already lowercased."""
+    return any(query in str(book.get(field, "") or "").lower() for field in SEARCH_FIELDS)
+
+
+def _grams(text):
+    # texts shorter than a trigram are indexed whole so they can still be found
+    if len(text) < GRAM_SIZE:
+        return {text} if text else set()
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class SearchIndex:
+    """Trigram inverted index over the searchable book fields.
+
+    Matches the old substring search exactly: candidates come from the
+    postings of the query's trigrams and are then verified against the
+    indexed text, so a query only touches the books that could match.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._short_keys = {}
+        self._docs = {}
+        self._next_seq = 0
+
+    def build(self, books):
+        self._postings.clear()
+        self._short_keys.clear()
+        self._docs.clear()
+        self._next_seq = 0
+        for book in books:
+            self.add(book)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, book, seq=None):
+        isbn = book.get("isbn")
+        if isbn in self._docs:
+            seq = self._docs[isbn][0] if seq is None else seq
+            self.remove(isbn)
+
+        if seq is None:
+            seq = self._next_seq
+        self._next_seq = max(self._next_seq, seq + 1)
+
+        texts = tuple(str(book.get(field, "") or "").lower() for field in SEARCH_FIELDS)
+        self._docs[isbn] = (seq, texts)
+
+        for gram in set().union(*(_grams(text) for text in texts)):
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = set()
+                self._link_short_keys(gram)
+            posting.add(isbn)
+
+    def remove(self, isbn):
+        doc = self._docs.pop(isbn, None)
+        if doc is None:
+            return None
+
+        for gram in set().union(*(_grams(text) for text in doc[1])):
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            posting.discard(isbn)
+            if not posting:
+                del self._postings[gram]
+                self._unlink_short_keys(gram)
+        return doc[0]
+
+    def update(self, old_isbn, book):
+        # keep the original position so edited books don't jump to the end
+        seq = self.remove(old_isbn)
+        self.add(book, seq)
+
+    def search(self, query):
+        """Return the ISBNs whose fields contain ``query``, in catalog order."""
+        query = query.lower()
+        if not query:
+            matches = self._docs.keys()
+        elif len(query) < GRAM_SIZE:
+            matches = set()
+            for gram in self._short_keys.get(query, ()):
+                matches.update(self._postings[gram])
+        else:
+            postings = sorted((self._postings.get(gram, ()) for gram in _grams(query)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            matches = [isbn for isbn in candidates
+                       if any(query in text for text in self._docs[isbn][1])]
+
+        return sorted(matches, key=lambda isbn: self._docs[isbn][0])
+
+    def _link_short_keys(self, gram):
+        for fragment in self._fragments(gram):
+            self._short_keys.setdefault(fragment, set()).add(gram)
+
+    def _unlink_short_keys(self, gram):
+        for fragment in self._fragments(gram):
+            keys = self._short_keys.get(fragment)
+            if keys is not None:
+                keys.discard(gram)
+                if not keys:
+                    del self._short_keys[fragment]
+
+    @staticmethod
+    def _fragments(gram):
+        # every substring shorter than a trigram, used to answer 1-2 character queries
+        return {gram[i:i + n] for n in range(1, GRAM_SIZE) for i in range(len(gram) - n + 1)}
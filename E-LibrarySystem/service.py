@@ -0,0 +1,485 @@
+import argparse
+import hmac
+import http.client
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from bulk import PRIVATE_FIELDS
+from storage import LibraryRepository, open_backend
+
+DEFAULT_PORT = 8765
+
+
+def public_user(user):
+    """An account without the fields that never leave the service, such as the password."""
+    return {key: value for key, value in user.items() if key not in PRIVATE_FIELDS} if user else user
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class LibraryService:
+    """The repository operations the Tk pages use, as JSON request handlers.
+
+    One process owns the data in memory and every desk talks to it, so the
+    stores are parsed once and concurrent changes can't overwrite each other.
+    Handlers run under the repository lock; only the network I/O doesn't.
+    Anything but a GET needs the desks' shared ``key``, and accounts are
+    only ever sent without their private fields.
+    """
+
+    def __init__(self, repository, key):
+        self.repository = repository
+        self.key = key
+        self.version = 0
+        # collection name -> (the list last served, the reload it was numbered)
+        self._reloads = {}
+        self._reload_count = 0
+        self.routes = [
+            ("GET", r"/books", self.list_books),
+            ("POST", r"/books", self.add_book),
+            ("GET", r"/books/(?P<isbn>[^/]+)", self.get_book),
+            ("PUT", r"/books/(?P<isbn>[^/]+)", self.update_book),
+            ("DELETE", r"/books/(?P<isbn>[^/]+)", self.delete_book),
+            ("GET", r"/borrows", self.list_borrows),
+            ("POST", r"/borrows", self.borrow_book),
+            ("POST", r"/returns", self.return_book),
+            ("GET", r"/loans", self.loan_counts),
+            ("GET", r"/loans/(?P<username>[^/]+)", self.loan_count),
+            ("GET", r"/overdue", self.overdue_counts),
+            ("GET", r"/users", self.list_users),
+            ("POST", r"/users", self.add_user),
+            ("GET", r"/users/(?P<username>[^/]+)", self.get_user),
+            ("DELETE", r"/users/(?P<username>[^/]+)", self.delete_user),
+            ("POST", r"/login", self.login),
+            ("GET", r"/users/(?P<username>[^/]+)/holds", self.list_holds),
+            ("PUT", r"/users/(?P<username>[^/]+)/holds/(?P<isbn>[^/]+)", self.place_hold),
+            ("DELETE", r"/users/(?P<username>[^/]+)/holds/(?P<isbn>[^/]+)", self.cancel_hold),
+            ("GET", r"/users/(?P<username>[^/]+)/favorites", self.list_favorites),
+            ("GET", r"/users/(?P<username>[^/]+)/favorites/books", self.favorite_books),
+            ("GET", r"/users/(?P<username>[^/]+)/favorites/(?P<isbn>[^/]+)", self.is_favorite),
+            ("PUT", r"/users/(?P<username>[^/]+)/favorites/(?P<isbn>[^/]+)", self.add_favorite),
+            ("DELETE", r"/users/(?P<username>[^/]+)/favorites/(?P<isbn>[^/]+)", self.remove_favorite),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in self.routes]
+
+    def authorized(self, authorization):
+        expected = f"Bearer {self.key}"
+        return authorization is not None and hmac.compare_digest(authorization.encode("utf-8"), expected.encode("utf-8"))
+
+    def dispatch(self, method, path, query, body, authorization=None):
+        """Return ``(status, payload, etag)``; an etag is only given for the live collections."""
+        if method != "GET" and not self.authorized(authorization):
+            return 403, json.dumps({"error": "A valid desk key is required"}).encode("utf-8"), None
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                params = {key: unquote(value) for key, value in match.groupdict().items()}
+                with self.repository.lock:
+                    status, payload, etag = handler(query=query, body=body, **params)
+                    if method != "GET" and handler != self.login and status < 300:
+                        self.version += 1
+                    # encode while the lock still keeps the collections from changing
+                    return status, json.dumps(payload).encode("utf-8"), etag
+        return 404, json.dumps({"error": f"No route for {method} {path}"}).encode("utf-8"), None
+
+    def _collection(self, name, items, payload=None):
+        # collections are cached by clients until a change goes through us or the
+        # backend hands the repository a new list because of an outside change;
+        # the list is kept so a new one is always told apart from the last
+        served, reload = self._reloads.get(name, (None, 0))
+        if served is not items:
+            self._reload_count += 1
+            reload = self._reload_count
+            self._reloads[name] = (items, reload)
+        return 200, items if payload is None else payload, f'"{self.version}-{reload}"'
+
+    def list_books(self, query, body):
+        if "q" in query:
+            return 200, self.repository.search_books(query["q"]), None
+        if "limit" in query:
+            return 200, self.repository.preview_books(int(query["limit"])), None
+        return self._collection("books", self.repository.get_books())
+
+    def get_book(self, query, body, isbn):
+        book = self.repository.get_book(isbn)
+        return (200, book, None) if book else (404, {"error": "Book not found"}, None)
+
+    def add_book(self, query, body):
+        if not self.repository.add_book(body):
+            return 409, {"error": "A book with this ISBN already exists"}, None
+        return 201, body, None
+
+    def update_book(self, query, body, isbn):
+        book = self.repository.update_book(isbn, body)
+        if book is False:
+            return 409, {"error": "A book with this ISBN already exists"}, None
+        return (200, book, None) if book else (404, {"error": "Book not found"}, None)
+
+    def delete_book(self, query, body, isbn):
+        book = self.repository.delete_book(isbn)
+        return (200, book, None) if book else (404, {"error": "Book not found"}, None)
+
+    def list_borrows(self, query, body):
+        if "rows" in query:
+            rows = self.repository.get_borrow_rows(query.get("username"), query.get("status", "all"),
+                                                   int(query.get("days", 7)), query.get("order"))
+            return 200, rows, None
+        return self._collection("borrows", self.repository.load_borrows())
+
+    def borrow_book(self, query, body):
+        return 200, {"ok": self.repository.borrow_book(body)}, None
+
+    def return_book(self, query, body):
+        # a return can lend the book straight to the next holder
+        result = self.repository.return_book(body.get("isbn"), body.get("username"))
+        return 200, {"ok": bool(result), "loan": result if isinstance(result, dict) else None}, None
+
+    def loan_count(self, query, body, username):
+        return 200, {"count": self.repository.loan_count(username)}, None
+
+    def loan_counts(self, query, body):
+        return 200, self.repository.loan_counts(), None
+
+    def overdue_counts(self, query, body):
+        return 200, self.repository.overdue_counts(), None
+
+    def list_users(self, query, body):
+        users = self.repository.load_users()
+        return self._collection("users", users, [public_user(user) for user in users])
+
+    def get_user(self, query, body, username):
+        user = self.repository.get_user(username)
+        return (200, public_user(user), None) if user else (404, {"error": "User not found"}, None)
+
+    def add_user(self, query, body):
+        if not self.repository.add_user(body):
+            return 409, {"error": "Username taken"}, None
+        return 201, public_user(body), None
+
+    def delete_user(self, query, body, username):
+        user = self.repository.delete_user(username)
+        return (200, public_user(user), None) if user else (404, {"error": "User not found"}, None)
+
+    def login(self, query, body):
+        user = self.repository.authenticate(body.get("username"), body.get("password"))
+        return (200, public_user(user), None) if user else (401, {"error": "Invalid username or password"}, None)
+
+    def list_holds(self, query, body, username):
+        return 200, self.repository.get_hold_rows(username), None
+
+    def place_hold(self, query, body, username, isbn):
+        return 200, {"position": self.repository.place_hold(username, isbn)}, None
+
+    def cancel_hold(self, query, body, username, isbn):
+        return 200, {"ok": self.repository.cancel_hold(username, isbn)}, None
+
+    def list_favorites(self, query, body, username):
+        return self._collection(f"favorites/{username}", self.repository.load_favorites(username))
+
+    def favorite_books(self, query, body, username):
+        return 200, self.repository.favorite_books(username), None
+
+    def is_favorite(self, query, body, username, isbn):
+        return 200, {"ok": self.repository.is_favorite(username, isbn)}, None
+
+    def add_favorite(self, query, body, username, isbn):
+        return 200, {"ok": self.repository.add_favorite(username, isbn)}, None
+
+    def remove_favorite(self, query, body, username, isbn):
+        return 200, {"ok": self.repository.remove_favorite(username, isbn)}, None
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps client connections open between requests; without Nagle the
+    # separate header and body writes don't wait for the client's delayed ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    service = None
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length)) if length else None
+            status, data, etag = self.service.dispatch(self.command, url.path, query, body,
+                                                       self.headers.get("Authorization"))
+        except (ValueError, TypeError, AttributeError) as e:
+            status, data, etag = 400, json.dumps({"error": str(e)}).encode("utf-8"), None
+        except Exception:
+            # the desk still gets a JSON answer, the details stay in the service's log
+            traceback.print_exc()
+            status, data, etag = 500, json.dumps({"error": "Internal server error"}).encode("utf-8"), None
+
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            status, data = 304, b""
+
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(repository, key, host="127.0.0.1", port=DEFAULT_PORT):
+    handler = type("Handler", (ServiceRequestHandler,), {"service": LibraryService(repository, key)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class ConnectionPool:
+    """Keep-alive connections to the service, shared by every thread of a desk."""
+
+    def __init__(self, host, port, size=8, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {}, **{"Content-Type": "application/json"})
+        for attempt in range(2):
+            try:
+                connection, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                # the service closed an idle connection, try once more on a fresh one
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                try:
+                    self._idle.put_nowait(connection)
+                except queue.Full:
+                    connection.close()
+            return response.status, response.headers, data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RemoteRepository:
+    """LibraryRepository's interface backed by a running library service.
+
+    Whole collections are cached with their ETag and revalidated on each
+    read, so an unchanged catalog costs a round trip but no transfer. ``key``
+    is the service's desk key, sent with every request.
+    """
+
+    def __init__(self, url, key, pool_size=8):
+        url = urlsplit(url if "//" in url else f"http://{url}")
+        self.pool = ConnectionPool(url.hostname or "127.0.0.1", url.port or DEFAULT_PORT, pool_size)
+        self.headers = {"Authorization": f"Bearer {key}"}
+        self.lock = threading.RLock()
+        self._cache = {}
+
+    def close(self):
+        self.pool.close()
+
+    def _call(self, method, path, payload=None, missing=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        status, headers, data = self.pool.request(method, path, body, self.headers)
+        if status == 404 or status == 401:
+            return missing
+        if status >= 300:
+            raise ServiceError(status, json.loads(data).get("error", "") if data else "")
+        return json.loads(data)
+
+    def _collection(self, path):
+        cached = self._cache.get(path)
+        headers = dict(self.headers, **{"If-None-Match": cached[0]}) if cached else self.headers
+        status, response_headers, data = self.pool.request("GET", path, headers=headers)
+        if status == 304:
+            return cached[1]
+        if status >= 300:
+            raise ServiceError(status, json.loads(data).get("error", "") if data else "")
+
+        items = json.loads(data)
+        if response_headers.get("ETag"):
+            self._cache[path] = (response_headers["ETag"], items)
+        return items
+
+    @staticmethod
+    def _key(value):
+        return quote(str(value), safe="")
+
+    def warm_up(self):
+        pass
+
+    def is_loaded(self):
+        return True
+
+    def get_books(self):
+        return self._collection("/books")
+
+    def preview_books(self, limit):
+        return self._call("GET", f"/books?limit={int(limit)}")
+
+    def get_book(self, isbn):
+        return self._call("GET", f"/books/{self._key(isbn)}")
+
+    def has_book(self, isbn):
+        return self.get_book(isbn) is not None
+
+    def search_books(self, query):
+        return self._call("GET", f"/books?q={self._key(query)}")
+
+    def add_book(self, book):
+        try:
+            self._call("POST", "/books", book)
+        except ServiceError as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    def update_book(self, isbn, data):
+        try:
+            return self._call("PUT", f"/books/{self._key(isbn)}", data)
+        except ServiceError as e:
+            if e.status == 409:
+                return False
+            raise
+
+    def delete_book(self, isbn):
+        return self._call("DELETE", f"/books/{self._key(isbn)}")
+
+    def load_borrows(self):
+        return self._collection("/borrows")
+
+    def loan_count(self, username):
+        return self._call("GET", f"/loans/{self._key(username)}")["count"]
+
+    def loan_counts(self):
+        return self._call("GET", "/loans")
+
+    def borrow_book(self, record):
+        return self._call("POST", "/borrows", record)["ok"]
+
+    def return_book(self, isbn, username):
+        result = self._call("POST", "/returns", {"isbn": isbn, "username": username})
+        return result["loan"] or result["ok"]
+
+    def place_hold(self, username, isbn):
+        return self._call("PUT", f"/users/{self._key(username)}/holds/{self._key(isbn)}")["position"]
+
+    def cancel_hold(self, username, isbn):
+        return self._call("DELETE", f"/users/{self._key(username)}/holds/{self._key(isbn)}")["ok"]
+
+    def get_hold_rows(self, username):
+        return self._call("GET", f"/users/{self._key(username)}/holds")
+
+    def overdue_counts(self):
+        return self._call("GET", "/overdue")
+
+    def get_borrow_rows(self, username=None, status="all", days=7, order=None):
+        path = f"/borrows?rows=1&status={self._key(status)}&days={int(days)}"
+        if username is not None:
+            path += f"&username={self._key(username)}"
+        if order is not None:
+            path += f"&order={self._key(order)}"
+        return self._call("GET", path)
+
+    def load_users(self):
+        return self._collection("/users")
+
+    def get_user(self, username):
+        return self._call("GET", f"/users/{self._key(username)}")
+
+    def add_user(self, user):
+        try:
+            self._call("POST", "/users", user)
+        except ServiceError as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    def authenticate(self, username, password):
+        return self._call("POST", "/login", {"username": username, "password": password})
+
+    def delete_user(self, username):
+        return self._call("DELETE", f"/users/{self._key(username)}")
+
+    def load_favorites(self, username):
+        return self._collection(f"/users/{self._key(username)}/favorites")
+
+    def is_favorite(self, username, isbn):
+        return self._call("GET", f"/users/{self._key(username)}/favorites/{self._key(isbn)}")["ok"]
+
+    def add_favorite(self, username, isbn):
+        return self._call("PUT", f"/users/{self._key(username)}/favorites/{self._key(isbn)}")["ok"]
+
+    def remove_favorite(self, username, isbn):
+        return self._call("DELETE", f"/users/{self._key(username)}/favorites/{self._key(isbn)}")["ok"]
+
+    def favorite_books(self, username):
+        return self._call("GET", f"/users/{self._key(username)}/favorites/books")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the E-Library stores to desk clients over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--engine", default=os.environ.get("ELIBRARY_STORAGE", "journal"),
+                        help="storage engine: json, journal or sqlite")
+    parser.add_argument("--books-file", default=f"books.{os.environ.get('ELIBRARY_BOOKS_FORMAT', 'json')}")
+    parser.add_argument("--durability", default=os.environ.get("ELIBRARY_DURABILITY", "normal"))
+    parser.add_argument("--key", default=os.environ.get("ELIBRARY_SERVICE_KEY"),
+                        help="the key desks send with every change, a new one is made up when not given")
+    args = parser.parse_args(argv)
+    key = args.key or secrets.token_urlsafe(16)
+
+    repository = LibraryRepository(open_backend(args.engine, books_file=args.books_file, durability=args.durability))
+    repository.warm_up()
+    server = serve(repository, key, args.host, args.port)
+    print(f"Serving the library on http://{args.host}:{args.port}")
+    if not args.key:
+        print(f"Start the desks with ELIBRARY_SERVICE_KEY={key}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        repository.close()
+
+
+if __name__ == "__main__":
+    main()
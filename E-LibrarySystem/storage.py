@@ -0,0 +1,2064 @@
+import atexit
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+from urllib.parse import quote, unquote
+
+from loans import LOAN_LIMIT, DueDateIndex, HoldQueues, available_copies, copies, is_overdue, new_loan, set_copies
+from perf import timings
+from search import SearchIndex
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+DURABILITY_LEVELS = ("off", "normal", "full")
+USERS_FILE = "users.jsonl"
+FAVORITES_DIR = "favorites"
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def is_json_lines(path):
+    return path.endswith(".jsonl")
+
+
+def _decode_lines(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # a torn last line from an interrupted write
+            return
+
+
+def iter_json_lines(path):
+    """Yield one record per line of a JSON Lines file."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from _decode_lines(f)
+    except FileNotFoundError:
+        return
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """Yield the items of a top-level JSON array without reading the whole file first.
+
+    Raises json.JSONDecodeError when the file isn't a JSON array or ends before the array does.
+    """
+    decoder = json.JSONDecoder()
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+
+    with f:
+        buffer, pos, eof = "", 0, False
+        # "[", then the first item or "]", then an item after every ","
+        expecting = "["
+        read_more = False
+        while True:
+            if read_more:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos, read_more = buffer[pos:] + chunk, 0, False
+
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    raise json.JSONDecodeError("Unexpected end of the array", buffer, pos)
+                read_more = True
+                continue
+
+            char = buffer[pos]
+            if expecting == "[":
+                if char != "[":
+                    raise json.JSONDecodeError("Expecting '['", buffer, pos)
+                pos, expecting = pos + 1, "first"
+            elif expecting == "first" and char == "]":
+                return
+            else:
+                # an item only counts once a delimiter follows it,
+                # a number at the end of the buffer may go on in the next chunk
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    read_more = True
+                    continue
+                after = _WHITESPACE.match(buffer, end).end()
+                if after == len(buffer) or buffer[after] not in ",]":
+                    if eof:
+                        raise json.JSONDecodeError("Expecting ',' delimiter", buffer, after)
+                    read_more = True
+                    continue
+                yield item
+                if buffer[after] == "]":
+                    return
+                pos, expecting = after + 1, "item"
+
+
+def iter_records(path):
+    """Stream the records of a store, JSON Lines or a JSON array depending on the extension."""
+    return iter_json_lines(path) if is_json_lines(path) else iter_json_array(path)
+
+
+def read_json(path, default=list):
+    # read and parsed in two steps, so the timings tell disk and JSON apart
+    try:
+        with timings.timed("io.read"), open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return [] if is_json_lines(path) else default()
+
+    with timings.timed("json.parse"):
+        if is_json_lines(path):
+            return list(_decode_lines(text.splitlines()))
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return default()
+
+
+def dump_json(path, data, indent=4):
+    """The text for a store; a JSON Lines store is produced line by line."""
+    if is_json_lines(path):
+        return (json.dumps(item) + "\n" for item in data)
+    return json.dumps(data, indent=indent)
+
+
+if os.name == "nt":
+    def _lock_file(f, blocking):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.005)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    def _lock_file(f, blocking):
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class InterProcessLock:
+    """Advisory lock on a file shared by every process that uses the same stores.
+
+    Holds are counted, so an operation and the commit it queued share one OS
+    lock. Callers hold the backend's thread lock around acquire and release.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._holds = 0
+        self._acquired_at = 0.0
+
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_held = 0.0
+        self.max_held = 0.0
+
+    def acquire(self):
+        if self._holds == 0:
+            if self._file is None:
+                self._file = open(self.path, "a+b")
+
+            started = time.perf_counter()
+            if not _lock_file(self._file, blocking=False):
+                self.contended += 1
+                _lock_file(self._file, blocking=True)
+
+            self._acquired_at = time.perf_counter()
+            wait = self._acquired_at - started
+            self.acquisitions += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        self._holds += 1
+
+    def release(self):
+        self._holds -= 1
+        if self._holds == 0:
+            _unlock_file(self._file)
+            held = time.perf_counter() - self._acquired_at
+            self.total_held += held
+            self.max_held = max(self.max_held, held)
+
+    def stats(self):
+        acquisitions = self.acquisitions or 1
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "avg_wait_ms": self.total_wait / acquisitions * 1000,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_held_ms": self.total_held / acquisitions * 1000,
+            "max_held_ms": self.max_held * 1000,
+        }
+
+
+def _lock_path(store_file, lock_file):
+    # the lock lives next to the stores, so every process using them shares it
+    return os.path.join(os.path.dirname(os.path.abspath(store_file)), lock_file)
+
+
+def _fsync_directory(directory):
+    # makes the rename itself durable; directories can't be opened on Windows
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path, text, durability="normal"):
+    """Replace ``path`` with ``text``; readers and crashes see the old file or the new one, never half.
+
+    ``text`` is a string or an iterable of string chunks.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            if isinstance(text, str):
+                f.write(text)
+            else:
+                f.writelines(text)
+            f.flush()
+            if durability != "off":
+                os.fsync(f.fileno())
+        # mkstemp creates the file private, keep the permissions of the file we replace
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if durability == "full":
+        _fsync_directory(directory)
+
+
+def append_text(path, text, durability="normal"):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        if durability != "off":
+            os.fsync(f.fileno())
+
+
+def write_json(path, data, indent=4, durability="normal"):
+    write_atomic(path, dump_json(path, data, indent), durability)
+
+
+class GroupCommitWriter:
+    """Coalesces the writes queued within ``window`` seconds into one commit.
+
+    A queued write keeps only the latest content for its file and is rendered
+    when the commit runs, so a burst of edits costs one serialize, fsync and
+    rename per file. ``durability`` is "off" (atomic rename only), "normal"
+    (fsync the file) or "full" (fsync the directory as well); a ``window`` of
+    0 commits every write immediately. Queuing returns at once, callers that
+    need their change on disk before they report it pass ticket() to wait(),
+    which returns straight away with durability "off"; the last of a group of
+    concurrent callers commits for all of them. ``lock`` is held for
+    the whole commit, callers hold it around mutations of the data a pending
+    write renders. With a ``file_lock`` an open batch holds it until the
+    batch is on disk, so other processes never read files that lag behind
+    our changes.
+    """
+
+    def __init__(self, window=0.05, durability="normal", file_lock=None):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        self.window = window
+        self.durability = durability
+        self.lock = threading.RLock()
+        self.file_lock = file_lock
+        self._writes = {}
+        self._appends = {}
+        self._callbacks = {}
+        self._queued_at = None
+        self._changes = 0
+        self._timer = None
+        # batches are numbered as they open, waiters are woken after each commit
+        self._committed = threading.Condition(self.lock)
+        self._batch = 0
+        self._committed_batch = 0
+        self.queued_changes = 0
+
+        self.commits = 0
+        self.mutations = 0
+        self.max_batch = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        self.total_write_time = 0.0
+        atexit.register(self.flush)
+
+    def write(self, path, render, on_commit=None):
+        """Replace ``path`` with the text returned by ``render()`` on the next commit."""
+        with self.lock:
+            # a full rewrite supersedes what is still queued for the file and
+            # moves it to the back, so commits happen in the order they were asked for
+            self._appends.pop(path, None)
+            self._writes.pop(path, None)
+            self._writes[path] = render
+            self._queue(path, on_commit)
+
+    def append(self, path, text, on_commit=None):
+        with self.lock:
+            self._appends.setdefault(path, []).append(text)
+            self._queue(path, on_commit)
+
+    def pending(self):
+        return self._changes > 0
+
+    def ticket(self):
+        """The batch holding everything queued so far."""
+        return self._batch
+
+    def wait(self, ticket, now=False):
+        """Block until batch ``ticket`` is on disk, unless durability is "off".
+
+        With ``now`` the batch is committed right away, otherwise at the end of
+        the window or by a caller that passes ``now``. Releases ``lock`` while
+        it waits, even if the caller holds it more than once.
+        """
+        if self.durability == "off":
+            return
+        with self._committed:
+            while self._committed_batch < ticket:
+                # without a timer no commit is coming, e.g. the timed one failed; this one raises to the caller
+                if now or self._timer is None:
+                    self.flush()
+                else:
+                    self._committed.wait()
+
+    def appending(self, path):
+        """Whether lines are queued for ``path`` that aren't on disk yet."""
+        return path in self._appends
+
+    def queued(self, path):
+        """Whether anything is queued for ``path``; read without the lock, so it may be a moment behind."""
+        return path in self._writes or path in self._appends
+
+    def _queue(self, path, on_commit):
+        if on_commit is not None:
+            self._callbacks[path] = on_commit
+        if self._queued_at is None:
+            if self.file_lock is not None:
+                self.file_lock.acquire()
+            self._queued_at = time.perf_counter()
+            self._batch += 1
+        self._changes += 1
+        self.queued_changes += 1
+
+        if self.window <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.window, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Commit everything queued so far and return the number of changes it covered."""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._changes:
+                return 0
+
+            batch = (self._writes, self._appends, self._callbacks, self._queued_at, self._changes)
+            self._writes, self._appends, self._callbacks = {}, {}, {}
+            self._queued_at, self._changes = None, 0
+            writes, appends, callbacks, queued_at, changes = batch
+
+            started = time.perf_counter()
+            try:
+                for path, render in writes.items():
+                    with timings.timed("json.dump"):
+                        text = render()
+                    with timings.timed("io.write"):
+                        write_atomic(path, text, self.durability)
+                for path, texts in appends.items():
+                    with timings.timed("io.append"):
+                        append_text(path, "".join(texts), self.durability)
+            except BaseException:
+                # keep the batch queued; rewrites are idempotent and so are journal entries
+                self._writes, self._appends, self._callbacks = writes, appends, callbacks
+                self._queued_at, self._changes = queued_at, changes
+                self._committed.notify_all()
+                raise
+
+            for callback in callbacks.values():
+                callback()
+            if self.file_lock is not None:
+                self.file_lock.release()
+            self._committed_batch = self._batch
+            self._committed.notify_all()
+
+            finished = time.perf_counter()
+            latency = finished - queued_at
+            self.commits += 1
+            self.mutations += changes
+            self.max_batch = max(self.max_batch, changes)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.last_latency = latency
+            self.total_write_time += finished - started
+            return changes
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def stats(self):
+        """Commit counters; latency runs from the first queued change to the commit being on disk."""
+        with self.lock:
+            commits = self.commits or 1
+            return {
+                "durability": self.durability,
+                "commits": self.commits,
+                "mutations": self.mutations,
+                "pending": self._changes,
+                "avg_batch": self.mutations / commits,
+                "max_batch": self.max_batch,
+                "avg_latency_ms": self.total_latency / commits * 1000,
+                "max_latency_ms": self.max_latency * 1000,
+                "last_latency_ms": self.last_latency * 1000,
+                "avg_write_ms": self.total_write_time / commits * 1000,
+            }
+
+
+class JSONFileCache:
+    """Parsed JSON files, reused until the file's mtime, size or inode changes."""
+
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path, default=list, before_reload=None):
+        signature = file_signature(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry[1]
+
+        if before_reload is not None:
+            before_reload()
+            signature = file_signature(path)
+
+        self.misses += 1
+        data = read_json(path, default) if signature is not None else default()
+        self._entries[path] = (signature, data)
+        return data
+
+    def put(self, path, data):
+        """Remember ``data`` as the contents of ``path`` in the state it is on disk right now."""
+        self._entries[path] = (file_signature(path), data)
+
+    def invalidate(self, path=None):
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(path, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class RecordIndex:
+    """Persistent ``key`` -> byte range index over a JSON Lines store.
+
+    The index is saved next to the store (``<store>.idx``) together with the
+    inode and size it covers. Appends keep the inode, so only the lines added
+    since are read; a store that was rewritten has a new inode and is indexed
+    again. A lookup reads one line and checks its key, so an index that is
+    out of date in any other way is noticed and rebuilt as well. Callers
+    serialize access.
+    """
+
+    def __init__(self, path, key, index_file=None, save_every=1000):
+        self.path = path
+        self.key = key
+        self.index_file = index_file or path + ".idx"
+        self.save_every = save_every
+        self._offsets = None
+        self._inode = None
+        self._size = 0
+        self._unsaved = 0
+
+        self.lookups = 0
+        self.scanned = 0
+        self.rebuilds = 0
+
+    def get(self, key):
+        """The record stored under ``key``, or None."""
+        self.lookups += 1
+        for attempt in range(2):
+            self.refresh()
+            entry = self._offsets.get(key)
+            if entry is None:
+                return None
+
+            offset, length = entry
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                line = f.read(length)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict) and record.get(self.key) == key:
+                return record
+            # changed in a way the stat can't tell, index it again
+            self._inode = None
+        return None
+
+    def refresh(self):
+        """Catch up with the store; a single stat when it hasn't changed."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._offsets, self._inode, self._size = {}, None, 0
+            return
+
+        if self._offsets is None:
+            self._load_saved()
+        if self._offsets is None or stat.st_ino != self._inode or stat.st_size < self._size \
+                or not self._ends_line(self._size):
+            self._offsets, self._inode, self._size = {}, stat.st_ino, 0
+            self.rebuilds += 1
+            self._unsaved = self.save_every
+        if stat.st_size > self._size:
+            self._scan()
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        # only a cache of the store, so it isn't worth an fsync
+        data = {"inode": self._inode, "size": self._size, "offsets": self._offsets}
+        write_atomic(self.index_file, json.dumps(data, separators=(",", ":")), durability="off")
+        self._unsaved = 0
+
+    def _load_saved(self):
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self._offsets, self._inode, self._size = dict(saved["offsets"]), saved["inode"], int(saved["size"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self._offsets = None
+
+    def _ends_line(self, size):
+        # appends start on a line boundary, anything else means the store was replaced
+        if not size:
+            return True
+        with open(self.path, "rb") as f:
+            f.seek(size - 1)
+            return f.read(1) == b"\n"
+
+    def _scan(self):
+        offset = self._size
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # a line still being written, picked up on a later refresh
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict) and isinstance(record.get(self.key), str):
+                    self._offsets[record[self.key]] = (offset, len(line))
+                offset += len(line)
+                self.scanned += 1
+                self._unsaved += 1
+        self._size = offset
+
+    def stats(self):
+        return {"entries": len(self._offsets or ()), "lookups": self.lookups,
+                "scanned": self.scanned, "rebuilds": self.rebuilds}
+
+
+class JSONBackend:
+    """The original stores: one JSON file per collection, rewritten on every change.
+
+    Mutations receive the already updated in-memory collection, which is what
+    gets written; the row arguments are only there for row-level backends.
+    Rewrites go through a GroupCommitWriter, so they are atomic and a burst
+    of changes to one file is committed once. Users are kept as JSON Lines
+    with a RecordIndex by username: a signup appends one line and a login
+    reads one, neither touches the rest of the accounts. Favorites are one
+    small file per user in ``favorites_dir``, so a toggle rewrites only that.
+    """
+
+    def __init__(self, books_file="books.json", borrows_file="borrows.json", users_file=USERS_FILE,
+                 favorites_dir=FAVORITES_DIR, cache=None, writer=None, lock_file="library.lock",
+                 holds_file="holds.json"):
+        self.books_file = books_file
+        self.borrows_file = borrows_file
+        self.users_file = users_file
+        self.favorites_dir = favorites_dir
+        self.holds_file = holds_file
+        self.cache = cache or JSONFileCache()
+        self.writer = writer or GroupCommitWriter()
+        if lock_file and self.writer.file_lock is None:
+            self.writer.file_lock = InterProcessLock(_lock_path(books_file, lock_file))
+        self.file_lock = self.writer.file_lock
+        self.lock = self.writer.lock
+        # transactions on this thread's stack, and the ones started on any thread that haven't ended
+        self._transactions = 0
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self.user_index = RecordIndex(users_file, "username") if is_json_lines(users_file) else None
+
+    def close(self):
+        self.writer.close()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread and inter-process locks around one read-modify-write."""
+        with self.lock:
+            if self.file_lock is None:
+                yield
+                return
+
+            self.file_lock.acquire()
+            try:
+                yield
+            finally:
+                self.file_lock.release()
+
+    @contextmanager
+    def transaction(self):
+        """One read-modify-write under the locks, which returns once its changes are committed.
+
+        Only the outermost transaction waits, with the locks released. While
+        transactions on other threads are still running it waits for them to
+        join its commit; the last one to end commits right away.
+        """
+        with self._active_lock:
+            self._active += 1
+        try:
+            with self.lock:
+                queued = self.writer.queued_changes
+                self._transactions += 1
+                try:
+                    with self._locked():
+                        yield
+                finally:
+                    self._transactions -= 1
+                ticket = self.writer.ticket() if not self._transactions and self.writer.queued_changes != queued else None
+        finally:
+            with self._active_lock:
+                self._active -= 1
+                last = not self._active
+        if ticket is not None:
+            self.writer.wait(ticket, now=last)
+
+    def lock_stats(self):
+        return self.file_lock.stats() if self.file_lock is not None else {}
+
+    def stats(self):
+        stats = {"writer": self.writer.stats(), "lock": self.lock_stats(), "cache": self.cache.stats()}
+        if self.user_index is not None:
+            stats["user_index"] = self.user_index.stats()
+        return stats
+
+    def _load(self, path):
+        # a file changed by someone else is only re-read once our queued writes are on disk,
+        # and so is one with queued lines, which the cached list may be missing
+        if self.writer.appending(path):
+            self.writer.flush()
+        return self.cache.load(path, before_reload=self.writer.flush)
+
+    def _store(self, path, data, indent=4):
+        # until the commit the cache still matches the old file, afterwards the new one
+        self.cache.put(path, data)
+        self.writer.write(path, lambda: dump_json(path, data, indent),
+                          on_commit=lambda: self.cache.put(path, data))
+
+    def _iter(self, path):
+        # straight from disk once our own queued writes are there, used for a
+        # first page before the catalog is loaded and for streaming exports;
+        # the lock is only taken to flush, a first page never waits for a load
+        if self.writer.queued(path):
+            self.writer.flush()
+        return iter_records(path)
+
+    def iter_books(self):
+        return self._iter(self.books_file)
+
+    def iter_borrows(self):
+        return self._iter(self.borrows_file)
+
+    def iter_users(self):
+        return self._iter(self.users_file)
+
+    def load_books(self):
+        return self._load(self.books_file)
+
+    def save_books(self, books):
+        self._store(self.books_file, books)
+
+    def insert_book(self, books, book):
+        self.save_books(books)
+
+    def insert_books(self, books, new_books):
+        self.save_books(books)
+
+    def update_book(self, books, isbn, book):
+        self.save_books(books)
+
+    def delete_book(self, books, isbn):
+        self.save_books(books)
+
+    def load_borrows(self):
+        return self._load(self.borrows_file)
+
+    def save_borrows(self, borrows):
+        self._store(self.borrows_file, borrows)
+
+    def record_borrow(self, books, book, borrows, record):
+        self.save_books(books)
+        self.save_borrows(borrows)
+
+    def record_return(self, books, book, borrows, isbn, username):
+        self.save_books(books)
+        self.save_borrows(borrows)
+
+    def load_users(self):
+        return self._load(self.users_file)
+
+    def save_users(self, users):
+        self._store(self.users_file, users)
+
+    def find_user(self, username):
+        with self.transaction():
+            if self.user_index is None:
+                return next((user for user in self._load(self.users_file) if user.get("username") == username), None)
+            # the index reads the file, so our queued changes go to disk first
+            if self.writer.pending():
+                self.writer.flush()
+            return self.user_index.get(username)
+
+    def insert_user(self, users, user):
+        """Add ``user``; ``users`` is None when the caller never loaded the accounts."""
+        if self.user_index is None:
+            self.save_users(users if users is not None else self.load_users() + [user])
+            return
+
+        # one appended line; a users list the cache holds already has the user in it
+        on_commit = (lambda: self.cache.put(self.users_file, users)) if users is not None else None
+        self.writer.append(self.users_file, json.dumps(user) + "\n", on_commit=on_commit)
+
+    def delete_user(self, users, username):
+        self.save_users(users)
+
+    def load_holds(self):
+        return self._load(self.holds_file)
+
+    def save_holds(self, holds):
+        self._store(self.holds_file, holds)
+
+    def insert_hold(self, holds, record):
+        self.save_holds(holds)
+
+    def delete_hold(self, holds, isbn, username):
+        self.save_holds(holds)
+
+    def _favorites_path(self, username):
+        return favorites_path(self.favorites_dir, username)
+
+    def load_favorites(self, username):
+        return self._load(self._favorites_path(username))
+
+    def iter_favorites(self):
+        """``(username, isbns)`` for every user with a favorites file."""
+        self.writer.flush()
+        try:
+            names = sorted(os.listdir(self.favorites_dir))
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.endswith(".json"):
+                yield unquote(name[:-len(".json")]), read_json(os.path.join(self.favorites_dir, name))
+
+    def save_favorites(self, username, favorites):
+        os.makedirs(self.favorites_dir, exist_ok=True)
+        self._store(self._favorites_path(username), favorites, indent=None)
+
+    def insert_favorite(self, favorites, username, isbn):
+        self.save_favorites(username, favorites)
+
+    def delete_favorite(self, favorites, username, isbn):
+        self.save_favorites(username, favorites)
+
+
+class JournalBackend(JSONBackend):
+    """JSON snapshots plus an append-only journal of mutations.
+
+    Each change appends one line to the journal instead of rewriting whole
+    files, and the in-memory state is the snapshots with the journal replayed
+    on top. compact() rewrites the snapshots from that state and empties the
+    journal; it runs every ``compact_every`` entries (at least as many as
+    there are books) and on close. Entries are idempotent, so replaying a
+    journal over a newer snapshot is harmless. Appends and snapshots share
+    the group commit of the JSON backend. A user's favorites file is read
+    the first time they are asked for and only rewritten if they changed.
+    Logins without a current state read the users snapshot through its
+    index and the journal's account entries through an overlay that only
+    reads the lines appended since it last looked.
+    """
+
+    def __init__(self, books_file="books.json", borrows_file="borrows.json", users_file=USERS_FILE,
+                 favorites_dir=FAVORITES_DIR, journal_file="journal.jsonl", compact_every=1000, writer=None):
+        super().__init__(books_file, borrows_file, users_file, favorites_dir, writer=writer)
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self._state = None
+        self._usernames = None
+        # users whose favorites file is behind the state
+        self._unsaved_favorites = set()
+        self._signature = None
+        self._stale = False
+        self._entries = 0
+        # username -> the account as the journal last left it, None once deleted,
+        # for the journal file and the bytes of it read so far
+        self._journal_users = {}
+        self._journal_users_inode = None
+        self._journal_users_size = 0
+
+    def _snapshots(self):
+        return {"books": (self.books_file, 4), "borrows": (self.borrows_file, 4), "users": (self.users_file, 4),
+                "holds": (self.holds_file, 4)}
+
+    def _current_signature(self):
+        paths = [path for path, indent in self._snapshots().values()] + [self.journal_file]
+        return tuple(file_signature(path) for path in paths)
+
+    def _load_state(self):
+        with self.lock:
+            return self._read_state()
+
+    def _read_state(self):
+        # anything but our own commits (another process writing or compacting)
+        # shows up as a changed signature and the state is rebuilt from disk
+        signature = self._current_signature()
+        if self._state is not None and signature == self._signature:
+            return self._state
+
+        if self.writer.pending():
+            # our queued entries have to be on disk before it is read back
+            self._stale = True
+            self.writer.flush()
+            signature = self._current_signature()
+
+        started = time.perf_counter()
+        books = {book.get("isbn"): book for book in read_json(self.books_file)}
+        users = {user.get("username"): user for user in read_json(self.users_file)}
+        # only the users the journal touches, the others are read on demand
+        favorites = {}
+        borrows = read_json(self.borrows_file)
+        borrow_keys = {json.dumps(record, sort_keys=True) for record in borrows}
+        holds = read_json(self.holds_file)
+        hold_keys = {(record.get("isbn"), record.get("username")) for record in holds}
+
+        entries = 0
+        for entry in self._read_journal():
+            entries += 1
+            op = entry["op"]
+            # borrow and return entries also carry the updated book
+            if op in ("put_book", "borrow", "return"):
+                books = self._put_book(books, entry.get("isbn"), entry["book"])
+            if op == "delete_book":
+                books.pop(entry["isbn"], None)
+            elif op == "borrow":
+                key = json.dumps(entry["record"], sort_keys=True)
+                if key not in borrow_keys:
+                    borrow_keys.add(key)
+                    borrows.append(entry["record"])
+            elif op == "return":
+                kept = []
+                for b in borrows:
+                    if b.get("isbn") == entry["isbn"] and b.get("username") == entry["username"]:
+                        # the same loan may be borrowed again later in the journal
+                        borrow_keys.discard(json.dumps(b, sort_keys=True))
+                    else:
+                        kept.append(b)
+                borrows = kept
+            elif op == "put_user":
+                users[entry["user"].get("username")] = entry["user"]
+            elif op == "delete_user":
+                users.pop(entry["username"], None)
+            elif op == "place_hold":
+                key = (entry["record"].get("isbn"), entry["record"].get("username"))
+                if key not in hold_keys:
+                    hold_keys.add(key)
+                    holds.append(entry["record"])
+            elif op == "remove_hold":
+                key = (entry["isbn"], entry["username"])
+                if key in hold_keys:
+                    hold_keys.discard(key)
+                    holds = [h for h in holds if (h.get("isbn"), h.get("username")) != key]
+            elif op in ("add_favorite", "remove_favorite") and "username" in entry:
+                # entries from before per-user favorites have no username and no owner
+                username = entry["username"]
+                if username not in favorites:
+                    favorites[username] = dict.fromkeys(read_json(self._favorites_path(username)))
+                if op == "add_favorite":
+                    favorites[username][entry["isbn"]] = None
+                else:
+                    favorites[username].pop(entry["isbn"], None)
+
+        self._state = {"books": list(books.values()), "borrows": borrows, "users": list(users.values()),
+                       "holds": holds, "favorites": {username: list(isbns) for username, isbns in favorites.items()}}
+        self._unsaved_favorites = set(favorites)
+        self._entries = entries
+        self._signature = signature
+        self._stale = False
+        timings.record("journal.load", time.perf_counter() - started)
+        return self._state
+
+    @staticmethod
+    def _put_book(books, isbn, book):
+        new_isbn = book.get("isbn")
+        if isbn is None or isbn == new_isbn or isbn not in books:
+            books[new_isbn] = book
+            return books
+
+        # an ISBN change keeps the book's place in the catalog
+        return {(new_isbn if key == isbn else key): (book if key == isbn else value)
+                for key, value in books.items()}
+
+    def _read_journal(self):
+        return iter_json_lines(self.journal_file)
+
+    def _snapshot_current(self):
+        signature = file_signature(self.journal_file)
+        return self._state is None and (signature is None or signature[1] == 0)
+
+    def _iter(self, path):
+        # the snapshot on its own is only current while the journal is empty; with
+        # nothing of ours queued that is checked without the lock, so a first page
+        # doesn't wait for the state being loaded on another thread
+        if not self.writer.pending() and self._snapshot_current():
+            return iter_records(path)
+
+        with self.lock:
+            self.writer.flush()
+            if self._snapshot_current():
+                return iter_records(path)
+
+            name = next(name for name, (snapshot, indent) in self._snapshots().items() if snapshot == path)
+            return iter(list(self._load_state()[name]))
+
+    def _committed(self):
+        if not self._stale:
+            self._signature = self._current_signature()
+
+    def _append(self, *entries):
+        with self.lock:
+            # if someone else wrote since our last load, stop following our own
+            # commits so the next read rebuilds the state with their changes
+            if self._current_signature() != self._signature:
+                self._stale = True
+
+            text = "".join(json.dumps(entry) + "\n" for entry in entries)
+            self.writer.append(self.journal_file, text, on_commit=self._committed)
+            self._entries += len(entries)
+            # never compact more often than once per catalog's worth of entries,
+            # or a bulk load would rewrite the whole snapshot for every batch
+            threshold = max(self.compact_every, len(self._state["books"]) if self._state else 0)
+            if not self._stale and self._entries >= threshold:
+                self.compact()
+
+    def compact(self):
+        """Rewrite the JSON snapshots from the current state and empty the journal."""
+        # the state is read under the inter-process lock as well, or entries another
+        # process appends before our batch takes it would be emptied out with the journal
+        with self._locked():
+            state = self._load_state()
+            for name, (path, indent) in self._snapshots().items():
+                # rendered at commit time, so later changes are included too
+                self.writer.write(path, lambda path=path, data=state[name], indent=indent: dump_json(path, data, indent),
+                                  on_commit=self._committed)
+
+            if self._unsaved_favorites:
+                os.makedirs(self.favorites_dir, exist_ok=True)
+            for username in self._unsaved_favorites:
+                path = self._favorites_path(username)
+                self.writer.write(path, lambda path=path, data=state["favorites"][username]: dump_json(path, data, None),
+                                  on_commit=self._committed)
+            self._unsaved_favorites = set()
+
+            # queued after the snapshots, so the journal is only emptied once they are on disk
+            self.writer.write(self.journal_file, lambda: "", on_commit=self._committed)
+            self._entries = 0
+
+    def close(self):
+        with self.lock:
+            if self._entries:
+                self.compact()
+        super().close()
+
+    def load_books(self):
+        return self._load_state()["books"]
+
+    def save_books(self, books):
+        self._load_state()["books"] = books
+        self.compact()
+
+    def insert_book(self, books, book):
+        self._append({"op": "put_book", "book": book})
+
+    def insert_books(self, books, new_books):
+        self._append(*({"op": "put_book", "book": book} for book in new_books))
+
+    def update_book(self, books, isbn, book):
+        self._append({"op": "put_book", "isbn": isbn, "book": book})
+
+    def delete_book(self, books, isbn):
+        self._append({"op": "delete_book", "isbn": isbn})
+
+    def load_borrows(self):
+        return self._load_state()["borrows"]
+
+    def save_borrows(self, borrows):
+        self._load_state()["borrows"] = borrows
+        self.compact()
+
+    def record_borrow(self, books, book, borrows, record):
+        self._append({"op": "borrow", "book": book, "record": record})
+
+    def record_return(self, books, book, borrows, isbn, username):
+        self._append({"op": "return", "book": book, "isbn": isbn, "username": username})
+
+    def load_users(self):
+        return self._load_state()["users"]
+
+    def save_users(self, users):
+        self._load_state()["users"] = users
+        self.compact()
+
+    def _users_by_name(self):
+        # follows the state's users list, rebuilt only when the list is replaced
+        users = self._state["users"]
+        if self._usernames is None or self._usernames[0] is not users:
+            self._usernames = (users, {user.get("username"): user for user in users})
+        return self._usernames[1]
+
+    def find_user(self, username):
+        with self.transaction():
+            if self._state is not None and self._current_signature() == self._signature:
+                return self._users_by_name().get(username)
+
+            # no current state: the journal's user entries over the indexed snapshot,
+            # which is far less to read than rebuilding the state
+            if self.writer.pending():
+                self.writer.flush()
+            self._catch_up_journal_users()
+            if username in self._journal_users:
+                return self._journal_users[username]
+            return super().find_user(username)
+
+    def _catch_up_journal_users(self):
+        # like RecordIndex: appends keep the inode and are read from where we stopped,
+        # a compaction replaces the journal and it is read from the start again
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            self._journal_users, self._journal_users_inode, self._journal_users_size = {}, None, 0
+            return
+
+        offset = self._journal_users_size
+        if stat.st_ino != self._journal_users_inode or stat.st_size < offset:
+            self._journal_users, self._journal_users_inode, offset = {}, stat.st_ino, 0
+        if stat.st_size == offset:
+            return
+
+        with open(self.journal_file, "rb") as f:
+            if offset:
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    # appends start on a line boundary, anything else is a new journal
+                    self._journal_users, offset = {}, 0
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # a line still being written, read on a later call
+                    break
+                offset += len(line)
+                if b"_user" not in line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("op") == "put_user":
+                    self._journal_users[entry["user"].get("username")] = entry["user"]
+                elif entry.get("op") == "delete_user":
+                    self._journal_users[entry.get("username")] = None
+        self._journal_users_size = offset
+
+    def insert_user(self, users, user):
+        with self.lock:
+            if self._state is not None:
+                if users is None:
+                    self._state["users"].append(user)
+                self._users_by_name()[user.get("username")] = user
+            self._append({"op": "put_user", "user": user})
+
+    def delete_user(self, users, username):
+        with self.lock:
+            if self._state is not None:
+                self._users_by_name().pop(username, None)
+            self._append({"op": "delete_user", "username": username})
+
+    def load_holds(self):
+        return self._load_state()["holds"]
+
+    def save_holds(self, holds):
+        self._load_state()["holds"] = holds
+        self.compact()
+
+    def insert_hold(self, holds, record):
+        self._append({"op": "place_hold", "record": record})
+
+    def delete_hold(self, holds, isbn, username):
+        self._append({"op": "remove_hold", "isbn": isbn, "username": username})
+
+    def load_favorites(self, username):
+        with self.lock:
+            favorites = self._load_state()["favorites"]
+            if username not in favorites:
+                favorites[username] = read_json(self._favorites_path(username))
+            return favorites[username]
+
+    def iter_favorites(self):
+        with self.lock:
+            # the state only holds the users asked for so far, the rest are on disk
+            favorites = self._load_state()["favorites"]
+            on_disk = [(username, isbns) for username, isbns in super().iter_favorites() if username not in favorites]
+            return iter(on_disk + list(favorites.items()))
+
+    def save_favorites(self, username, favorites):
+        with self.lock:
+            self._load_state()["favorites"][username] = favorites
+            self._unsaved_favorites.add(username)
+            self.compact()
+
+    def _change_favorite(self, op, favorites, username, isbn):
+        with self.lock:
+            if self._state is not None:
+                self._state["favorites"][username] = favorites
+            self._unsaved_favorites.add(username)
+            self._append({"op": op, "username": username, "isbn": isbn})
+
+    def insert_favorite(self, favorites, username, isbn):
+        self._change_favorite("add_favorite", favorites, username, isbn)
+
+    def delete_favorite(self, favorites, username, isbn):
+        self._change_favorite("remove_favorite", favorites, username, isbn)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    isbn TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS borrows (
+    id INTEGER PRIMARY KEY,
+    isbn TEXT NOT NULL,
+    username TEXT NOT NULL,
+    due_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS borrows_isbn ON borrows (isbn);
+CREATE INDEX IF NOT EXISTS borrows_username ON borrows (username);
+CREATE INDEX IF NOT EXISTS borrows_due_date ON borrows (due_date);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS holds (
+    id INTEGER PRIMARY KEY,
+    isbn TEXT NOT NULL,
+    username TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (isbn, username)
+);
+CREATE TABLE IF NOT EXISTS user_favorites (
+    username TEXT NOT NULL,
+    isbn TEXT NOT NULL,
+    UNIQUE (username, isbn)
+);
+-- the one favorites list every user shared before, moved to user_favorites on open
+CREATE TABLE IF NOT EXISTS favorites (
+    isbn TEXT PRIMARY KEY
+);
+"""
+
+
+class SQLiteBackend:
+    """SQLite store in WAL mode where each change is a single-row transaction.
+
+    Collections are read once and kept in memory; ``PRAGMA data_version``
+    tells us when another connection has committed, so reads stay cheap and
+    still see changes made by other processes. ``durability`` maps onto
+    SQLite's own synchronous setting.
+    """
+
+    def __init__(self, database_file="library.db", durability="normal", lock_file="library.lock"):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        self.database_file = database_file
+        # imported here, the JSON engines never need it
+        import sqlite3
+
+        self.lock = threading.RLock()
+        self.file_lock = InterProcessLock(_lock_path(database_file, lock_file)) if lock_file else None
+        self.connection = sqlite3.connect(database_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(f"PRAGMA synchronous={durability.upper()}")
+        self.connection.executescript(SQLITE_SCHEMA)
+        self._migrate_favorites()
+        self._version = None
+        self._collections = {}
+
+    def _migrate_favorites(self):
+        # every account gets its own copy of the old shared list
+        with self.connection:
+            if self.connection.execute("SELECT 1 FROM favorites LIMIT 1").fetchone():
+                self.connection.execute("INSERT OR IGNORE INTO user_favorites (username, isbn) "
+                                        "SELECT users.username, favorites.isbn FROM users, favorites "
+                                        "ORDER BY users.rowid, favorites.rowid")
+                self.connection.execute("DELETE FROM favorites")
+
+    def close(self):
+        self.connection.close()
+
+    # the same locks and lock_stats() as the JSON stores: SQLite keeps single
+    # statements consistent and commits them itself, the lock covers the read before them
+    transaction = JSONBackend._locked
+    lock_stats = JSONBackend.lock_stats
+
+    def stats(self):
+        return {"lock": self.lock_stats()}
+
+    def is_empty(self):
+        tables = ("books", "borrows", "users", "holds", "user_favorites")
+        return not any(self.connection.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in tables)
+
+    def import_from(self, backend):
+        """Copy every collection of another backend, e.g. the JSON files on first run."""
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO books (isbn, data) VALUES (?, ?)",
+                                        [(book.get("isbn"), json.dumps(book)) for book in backend.load_books()])
+            self.connection.executemany("INSERT INTO borrows (isbn, username, due_date, data) VALUES (?, ?, ?, ?)",
+                                        [self._borrow_row(record) for record in backend.load_borrows()])
+            self.connection.executemany("INSERT OR REPLACE INTO users (username, data) VALUES (?, ?)",
+                                        [(user.get("username"), json.dumps(user)) for user in backend.load_users()])
+            self.connection.executemany("INSERT OR IGNORE INTO holds (isbn, username, data) VALUES (?, ?, ?)",
+                                        [self._hold_row(record) for record in backend.load_holds()])
+            self.connection.executemany("INSERT OR IGNORE INTO user_favorites (username, isbn) VALUES (?, ?)",
+                                        [(username, isbn) for username, isbns in backend.iter_favorites()
+                                         for isbn in isbns])
+        self._collections.clear()
+
+    def _load(self, name, query, decode=json.loads, parameters=()):
+        version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            # another connection committed since our last read
+            self._version = version
+            self._collections.clear()
+
+        if name not in self._collections:
+            with timings.timed("sqlite.read"):
+                rows = self.connection.execute(query, parameters).fetchall()
+            with timings.timed("json.parse"):
+                self._collections[name] = [decode(row[0]) for row in rows]
+        return self._collections[name]
+
+    @staticmethod
+    def _borrow_row(record):
+        return record.get("isbn"), record.get("username"), record.get("due_date"), json.dumps(record)
+
+    def _iter(self, query):
+        for (data,) in self.connection.execute(query):
+            yield json.loads(data)
+
+    def iter_books(self):
+        return self._iter("SELECT data FROM books ORDER BY rowid")
+
+    def iter_borrows(self):
+        return self._iter("SELECT data FROM borrows ORDER BY id")
+
+    def iter_users(self):
+        return self._iter("SELECT data FROM users ORDER BY rowid")
+
+    def load_books(self):
+        return self._load("books", "SELECT data FROM books ORDER BY rowid")
+
+    def save_books(self, books):
+        with self.connection:
+            self.connection.execute("DELETE FROM books")
+            self.connection.executemany("INSERT INTO books (isbn, data) VALUES (?, ?)",
+                                        [(book.get("isbn"), json.dumps(book)) for book in books])
+        self._collections["books"] = books
+
+    def insert_book(self, books, book):
+        with self.connection:
+            self.connection.execute("INSERT INTO books (isbn, data) VALUES (?, ?)",
+                                    (book.get("isbn"), json.dumps(book)))
+
+    def insert_books(self, books, new_books):
+        with self.connection:
+            self.connection.executemany("INSERT INTO books (isbn, data) VALUES (?, ?)",
+                                        [(book.get("isbn"), json.dumps(book)) for book in new_books])
+
+    def update_book(self, books, isbn, book):
+        with self.connection:
+            self.connection.execute("UPDATE books SET isbn = ?, data = ? WHERE isbn = ?",
+                                    (book.get("isbn"), json.dumps(book), isbn))
+
+    def delete_book(self, books, isbn):
+        with self.connection:
+            self.connection.execute("DELETE FROM books WHERE isbn = ?", (isbn,))
+
+    def load_borrows(self):
+        return self._load("borrows", "SELECT data FROM borrows ORDER BY id")
+
+    def save_borrows(self, borrows):
+        with self.connection:
+            self.connection.execute("DELETE FROM borrows")
+            self.connection.executemany("INSERT INTO borrows (isbn, username, due_date, data) VALUES (?, ?, ?, ?)",
+                                        [self._borrow_row(record) for record in borrows])
+        self._collections["borrows"] = borrows
+
+    def record_borrow(self, books, book, borrows, record):
+        with self.connection:
+            self.connection.execute("UPDATE books SET data = ? WHERE isbn = ?", (json.dumps(book), book.get("isbn")))
+            self.connection.execute("INSERT INTO borrows (isbn, username, due_date, data) VALUES (?, ?, ?, ?)",
+                                    self._borrow_row(record))
+
+    def record_return(self, books, book, borrows, isbn, username):
+        with self.connection:
+            self.connection.execute("UPDATE books SET data = ? WHERE isbn = ?", (json.dumps(book), isbn))
+            self.connection.execute("DELETE FROM borrows WHERE isbn = ? AND username = ?", (isbn, username))
+
+    def load_users(self):
+        return self._load("users", "SELECT data FROM users ORDER BY rowid")
+
+    def save_users(self, users):
+        with self.connection:
+            self.connection.execute("DELETE FROM users")
+            self.connection.executemany("INSERT INTO users (username, data) VALUES (?, ?)",
+                                        [(user.get("username"), json.dumps(user)) for user in users])
+        self._collections["users"] = users
+
+    def find_user(self, username):
+        # the username is the primary key, so this is an index lookup
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def insert_user(self, users, user):
+        with self.connection:
+            self.connection.execute("INSERT INTO users (username, data) VALUES (?, ?)",
+                                    (user.get("username"), json.dumps(user)))
+        if users is None and "users" in self._collections:
+            self._collections["users"].append(user)
+
+    def delete_user(self, users, username):
+        with self.connection:
+            self.connection.execute("DELETE FROM users WHERE username = ?", (username,))
+
+    @staticmethod
+    def _hold_row(record):
+        return record.get("isbn"), record.get("username"), json.dumps(record)
+
+    def load_holds(self):
+        return self._load("holds", "SELECT data FROM holds ORDER BY id")
+
+    def save_holds(self, holds):
+        with self.connection:
+            self.connection.execute("DELETE FROM holds")
+            self.connection.executemany("INSERT INTO holds (isbn, username, data) VALUES (?, ?, ?)",
+                                        [self._hold_row(record) for record in holds])
+        self._collections["holds"] = holds
+
+    def insert_hold(self, holds, record):
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO holds (isbn, username, data) VALUES (?, ?, ?)",
+                                    self._hold_row(record))
+
+    def delete_hold(self, holds, isbn, username):
+        with self.connection:
+            self.connection.execute("DELETE FROM holds WHERE isbn = ? AND username = ?", (isbn, username))
+
+    def load_favorites(self, username):
+        # (username, isbn) is unique, so the lookup runs on that index
+        return self._load(("favorites", username), "SELECT isbn FROM user_favorites WHERE username = ? ORDER BY rowid",
+                          decode=str, parameters=(username,))
+
+    def iter_favorites(self):
+        rows = self.connection.execute("SELECT username, isbn FROM user_favorites ORDER BY username, rowid")
+        for username, group in itertools.groupby(rows, key=lambda row: row[0]):
+            yield username, [isbn for _, isbn in group]
+
+    def save_favorites(self, username, favorites):
+        with self.connection:
+            self.connection.execute("DELETE FROM user_favorites WHERE username = ?", (username,))
+            self.connection.executemany("INSERT INTO user_favorites (username, isbn) VALUES (?, ?)",
+                                        [(username, isbn) for isbn in favorites])
+        self._collections[("favorites", username)] = favorites
+
+    def insert_favorite(self, favorites, username, isbn):
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO user_favorites (username, isbn) VALUES (?, ?)",
+                                    (username, isbn))
+
+    def delete_favorite(self, favorites, username, isbn):
+        with self.connection:
+            self.connection.execute("DELETE FROM user_favorites WHERE username = ? AND isbn = ?", (username, isbn))
+
+
+STORAGE_ENGINES = ("json", "journal", "sqlite")
+
+
+def convert_to_json_lines(path, legacy_path, durability="normal"):
+    """Create the JSON Lines store ``path`` from the JSON array in ``legacy_path``, one record at a time.
+
+    Does nothing once ``path`` exists or when there is nothing to convert;
+    the old file is left in place.
+    """
+    if os.path.exists(path) or not os.path.exists(legacy_path):
+        return False
+    write_atomic(path, dump_json(path, iter_json_array(legacy_path)), durability)
+    return True
+
+
+def favorites_path(directory, username):
+    """The favorites file of ``username``; the name is quoted, so any username is a safe file name."""
+    return os.path.join(directory, quote(username, safe="") + ".json")
+
+
+def convert_favorites(directory, legacy_path, users_file=USERS_FILE, durability="normal"):
+    """Split the favorites list all users shared in ``legacy_path`` into one file per user in ``directory``.
+
+    Every account gets a copy, as that is what each of them saw before. Does
+    nothing once ``directory`` exists or when there is nothing to convert;
+    the old file is left in place.
+    """
+    if os.path.exists(directory) or not os.path.exists(legacy_path):
+        return False
+
+    # built next to the target and renamed, so a crash never leaves half the users converted
+    favorites = json.dumps(read_json(legacy_path))
+    tmp_directory = tempfile.mkdtemp(prefix=os.path.basename(directory) + ".", suffix=".tmp",
+                                     dir=os.path.dirname(os.path.abspath(directory)))
+    if favorites != "[]" and os.path.exists(users_file):
+        for user in iter_records(users_file):
+            write_atomic(favorites_path(tmp_directory, user.get("username")), favorites, durability)
+    os.chmod(tmp_directory, 0o755)
+    os.rename(tmp_directory, directory)
+    return True
+
+
+def open_backend(engine="json", books_file="books.json", favorites_dir=FAVORITES_DIR,
+                 database_file="library.db", durability="normal"):
+    """The backend for a storage engine name, shared by the app and the command line tools."""
+    # accounts used to be one JSON array, rewritten for every signup,
+    # and favorites one list shared by all of them
+    convert_to_json_lines(USERS_FILE, "users.json", durability)
+    convert_favorites(favorites_dir, "favorites.json", USERS_FILE, durability)
+    if engine == "sqlite":
+        backend = SQLiteBackend(database_file, durability)
+        # first run on SQLite: bring the existing JSON data along
+        if backend.is_empty():
+            json_backend = JSONBackend(books_file, favorites_dir=favorites_dir)
+            backend.import_from(json_backend)
+            json_backend.close()
+        return backend
+
+    if engine not in STORAGE_ENGINES:
+        raise ValueError(f"Unknown storage engine: {engine}")
+
+    writer = GroupCommitWriter(durability=durability)
+    if engine == "journal":
+        return JournalBackend(books_file, favorites_dir=favorites_dir, writer=writer)
+    return JSONBackend(books_file, favorites_dir=favorites_dir, writer=writer)
+
+
+class LibraryRepository:
+    """In-memory catalog shared by every page, indexed by ISBN.
+
+    Reads are served from memory; the backend decides how each change is
+    persisted and tells us (by handing back a new list) when another process
+    changed the data underneath us. Mutations run in a backend transaction,
+    so neither a background commit nor another process sees half of one.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or JSONBackend()
+        self.lock = self.backend.lock
+        self._books = None
+        self._by_isbn = {}
+        self._index = None
+        self._users = None
+        self._by_username = {}
+        self._borrows = None
+        self._loan_counts = Counter()
+        # (username, isbn) of every active loan, a user holds one copy of a title at a time
+        self._loans = set()
+        self._due_dates = DueDateIndex()
+        self._holds = None
+        self._hold_queues = HoldQueues()
+        # username -> (the backend's favorites list, the same ISBNs as a set)
+        self._favorites = {}
+        # bumped by every catalog change, tells warm_up its index went stale
+        self._changes = 0
+
+    def close(self):
+        self.backend.close()
+
+    def _ensure_loaded(self):
+        # the backend hands back the same list until the data changes
+        # underneath us, so the index is only rebuilt when it has to be
+        with self.lock:
+            books = self.backend.load_books()
+            if books is not self._books:
+                self._books = books
+                self._by_isbn = {book.get("isbn"): book for book in books}
+                # the search index is rebuilt lazily on the next search
+                self._index = None
+                self._changes += 1
+
+    def _ensure_index(self):
+        with self.lock:
+            self._ensure_loaded()
+            if self._index is None:
+                with timings.timed("search.index"):
+                    self._index = SearchIndex()
+                    self._index.build(self._books)
+            return self._index
+
+    def is_loaded(self):
+        return self._books is not None
+
+    def stats(self):
+        """Catalog and backend counters, e.g. for a metrics dump."""
+        return {"books": len(self._books) if self._books is not None else None,
+                "indexed": self._index is not None, **self.backend.stats()}
+
+    def preview_books(self, limit):
+        """The first ``limit`` books in catalog order, streamed from the store if it isn't loaded yet."""
+        if self.is_loaded():
+            return self.get_books()[:limit]
+        try:
+            return list(itertools.islice(self.backend.iter_books(), limit))
+        except ValueError:
+            # a damaged store is the full load's to deal with, there's just no first page
+            return []
+
+    def warm_up(self):
+        """Load the catalog and build the search index, meant to run on a background thread."""
+        with self.lock:
+            self._ensure_loaded()
+            if self._index is not None:
+                return
+            books, changes = list(self._books), self._changes
+
+        # indexing runs without the lock, so pages can use the loaded catalog meanwhile
+        with timings.timed("search.index"):
+            index = SearchIndex()
+            index.build(books)
+        with self.lock:
+            if self._index is None and self._changes == changes:
+                self._index = index
+
+    def get_books(self):
+        # callers get the live list, so treat it as read-only
+        self._ensure_loaded()
+        return self._books
+
+    def get_book(self, isbn):
+        self._ensure_loaded()
+        return self._by_isbn.get(isbn)
+
+    def has_book(self, isbn):
+        self._ensure_loaded()
+        return isbn in self._by_isbn
+
+    def add_book(self, book):
+        """Add ``book`` unless its ISBN is taken; returns whether it was added.
+
+        With a ``copies`` count, all of them start on the shelf unless it says otherwise.
+        """
+        if "copies" in book:
+            set_copies(book, copies(book), min(available_copies(book), copies(book)))
+        with self.backend.transaction():
+            self._ensure_loaded()
+            if book.get("isbn") in self._by_isbn:
+                return False
+
+            self._books.append(book)
+            self._changes += 1
+            self._by_isbn[book.get("isbn")] = book
+            if self._index is not None:
+                self._index.add(book)
+            self.backend.insert_book(self._books, book)
+            return True
+
+    def add_books(self, books):
+        """Add a batch of new books with a single backend write, e.g. during a bulk import."""
+        with self.backend.transaction():
+            self._ensure_loaded()
+            self._books.extend(books)
+            self._changes += 1
+            for book in books:
+                self._by_isbn[book.get("isbn")] = book
+                if self._index is not None:
+                    self._index.add(book)
+            self.backend.insert_books(self._books, books)
+
+    def update_book(self, isbn, data):
+        """The updated book, None when there is no such book or False when the new ISBN is taken."""
+        with self.backend.transaction():
+            self._ensure_loaded()
+            book = self._by_isbn.get(isbn)
+            if book is None:
+                return None
+            if data.get("isbn", isbn) != isbn and data["isbn"] in self._by_isbn:
+                return False
+
+            del self._by_isbn[isbn]
+
+            # a new copy count keeps the copies on loan on loan, and can't go below them
+            on_loan = copies(book) - available_copies(book)
+            book.update(data)
+            if "copies" in data:
+                total = max(copies(book), on_loan)
+                set_copies(book, total, total - on_loan)
+            self._changes += 1
+            self._by_isbn[book.get("isbn")] = book
+            if self._index is not None:
+                self._index.update(isbn, book)
+            self.backend.update_book(self._books, isbn, book)
+            # new copies go to the users waiting for the title first
+            if "copies" in data:
+                self._lend_to_holders(book, self.load_borrows())
+            return book
+
+    def delete_book(self, isbn):
+        with self.backend.transaction():
+            self._ensure_loaded()
+            book = self._by_isbn.pop(isbn, None)
+            if book is None:
+                return None
+
+            self._books.remove(book)
+            self._changes += 1
+            if self._index is not None:
+                self._index.remove(isbn)
+            self.backend.delete_book(self._books, isbn)
+            return book
+
+    def search_books(self, query):
+        with self.lock:
+            index = self._ensure_index()
+            with timings.timed("search"):
+                isbns = index.search(query)
+                return [self._by_isbn[isbn] for isbn in isbns]
+
+    def _track_borrows(self, borrows):
+        # per-user loan counters and the due date index follow the borrows list,
+        # rebuilt only when it is replaced
+        if borrows is not self._borrows:
+            self._borrows = borrows
+            self._loan_counts = Counter(record.get("username") for record in borrows)
+            self._loans = {(record.get("username"), record.get("isbn")) for record in borrows}
+            self._due_dates.build(borrows)
+
+    def load_borrows(self):
+        with self.lock:
+            borrows = self.backend.load_borrows()
+            self._track_borrows(borrows)
+            return borrows
+
+    def loan_count(self, username):
+        self.load_borrows()
+        return self._loan_counts[username]
+
+    def loan_counts(self):
+        """Active loans per username, only users with any are listed."""
+        with self.lock:
+            self.load_borrows()
+            return dict(self._loan_counts)
+
+    def has_loan(self, username, isbn):
+        with self.lock:
+            self.load_borrows()
+            return (username, isbn) in self._loans
+
+    def overdue_loans(self, today=None):
+        """Loans due today or earlier, the longest overdue first; ``today`` is ``YYYY-MM-DD``."""
+        with self.lock:
+            self.load_borrows()
+            return self._due_dates.overdue(today)
+
+    def loans_due_within(self, days, today=None):
+        """Loans not overdue yet that are due in the next ``days`` days, the earliest first."""
+        with self.lock:
+            self.load_borrows()
+            return self._due_dates.due_within(days, today)
+
+    def overdue_counts(self, today=None):
+        """Overdue loans per username, only users with any are listed."""
+        with self.lock:
+            self.load_borrows()
+            return dict(self._due_dates.overdue_counts(today))
+
+    def borrow_book(self, record):
+        """Take a copy off the shelf and add the loan in one backend transaction.
+
+        False when the book does not exist, every copy is on loan, the user
+        already has a copy or LOAN_LIMIT loans; a return gives back the one
+        copy they have.
+        """
+        with self.backend.transaction():
+            book = self.get_book(record.get("isbn"))
+            if book is None or available_copies(book) <= 0:
+                return False
+
+            borrows = self.load_borrows()
+            username = record.get("username")
+            if (username, record.get("isbn")) in self._loans or self._loan_counts[username] >= LOAN_LIMIT:
+                return False
+            set_copies(book, copies(book), available_copies(book) - 1)
+            self._add_loan(borrows, record)
+            self.backend.record_borrow(self._books, book, borrows, record)
+            # a copy for someone waiting for the title ends their wait
+            self.cancel_hold(record.get("username"), record.get("isbn"))
+            return True
+
+    def _add_loan(self, borrows, record):
+        borrows.append(record)
+        self._loan_counts[record.get("username")] += 1
+        self._loans.add((record.get("username"), record.get("isbn")))
+        self._due_dates.add(record)
+
+    def return_book(self, isbn, username, today=None):
+        """Take the book back and lend it straight to the first user holding it who may borrow it.
+
+        Holders with LOAN_LIMIT loans or a copy already, or without an account,
+        are passed over and keep their place. Returns the new loan when someone
+        was waiting, True when nobody was and False when there is no such book
+        or ``username`` doesn't have it.
+        """
+        with self.backend.transaction():
+            book = self.get_book(isbn)
+            if book is None:
+                return False
+
+            borrows = self.load_borrows()
+            if (username, isbn) not in self._loans:
+                return False
+            kept = []
+            returned = []
+            for b in borrows:
+                (returned if b.get("isbn") == isbn and b.get("username") == username else kept).append(b)
+
+            # update the list in place so the counters and the index are adjusted, not rebuilt
+            borrows[:] = kept
+            self._loan_counts[username] -= len(returned)
+            if self._loan_counts[username] <= 0:
+                del self._loan_counts[username]
+            self._loans.discard((username, isbn))
+            for record in returned:
+                self._due_dates.remove(record)
+
+            # the copies come back on the shelf, never more than the library owns
+            set_copies(book, copies(book), min(available_copies(book) + len(returned), copies(book)))
+            self.backend.record_return(self._books, book, borrows, isbn, username)
+
+            loans = self._lend_to_holders(book, borrows, today)
+            return loans[0] if loans else True
+
+    def _lend_to_holders(self, book, borrows, today=None):
+        """Lend the copies on the shelf to the first holders who may borrow them; returns the new loans."""
+        isbn = book.get("isbn")
+        holds = self.load_holds()
+        loans = []
+        while available_copies(book) > 0:
+            hold = self._hold_queues.pop(isbn, self._may_borrow)
+            if hold is None:
+                break
+
+            holds.remove(hold)
+            self.backend.delete_hold(holds, isbn, hold.get("username"))
+            loan = new_loan(isbn, hold.get("username"), today)
+            set_copies(book, copies(book), available_copies(book) - 1)
+            self._add_loan(borrows, loan)
+            self.backend.record_borrow(self._books, book, borrows, loan)
+            loans.append(loan)
+        return loans
+
+    def _may_borrow(self, record):
+        username = record.get("username")
+        return (self._loan_counts[username] < LOAN_LIMIT and (username, record.get("isbn")) not in self._loans
+                and self.backend.find_user(username) is not None)
+
+    def _track_holds(self, holds):
+        # the queues follow the holds list like the loan counters follow the borrows
+        if holds is not self._holds:
+            self._holds = holds
+            self._hold_queues.build(holds)
+
+    def load_holds(self):
+        with self.lock:
+            holds = self.backend.load_holds()
+            self._track_holds(holds)
+            return holds
+
+    def place_hold(self, username, isbn, today=None):
+        """Queue ``username`` for a borrowed book and return their place in line.
+
+        None when the book does not exist, has a copy on the shelf, is on
+        loan to ``username`` or they already hold it, or there is no such user.
+        """
+        with self.backend.transaction():
+            book = self.get_book(isbn)
+            if book is None or available_copies(book) > 0:
+                return None
+            if self.backend.find_user(username) is None:
+                return None
+
+            holds = self.load_holds()
+            if self._hold_queues.has(username, isbn):
+                return None
+            if self.has_loan(username, isbn):
+                return None
+
+            record = {"isbn": isbn, "username": username, "hold_date": today or date.today().isoformat()}
+            holds.append(record)
+            position = self._hold_queues.add(record)
+            self.backend.insert_hold(holds, record)
+            return position
+
+    def cancel_hold(self, username, isbn):
+        with self.backend.transaction():
+            holds = self.load_holds()
+            record = self._hold_queues.cancel(username, isbn)
+            if record is None:
+                return False
+
+            holds.remove(record)
+            self.backend.delete_hold(holds, isbn, username)
+            return True
+
+    def get_hold_rows(self, username):
+        """The holds of ``username`` with their book and place in line, from the queues' user index."""
+        with self.lock:
+            self._ensure_loaded()
+            self.load_holds()
+            rows = []
+            for record, position in self._hold_queues.holds_of(username):
+                book = self._by_isbn.get(record.get("isbn"))
+                row = dict(record)
+                row["book_title"] = book.get("title", "Unknown") if book else "Unknown"
+                row["author"] = book.get("author", "Unknown") if book else "Unknown"
+                row["position"] = position
+                row["waiting"] = self._hold_queues.queue_length(record.get("isbn"))
+                rows.append(row)
+            return rows
+
+    def load_users(self):
+        with self.lock:
+            users = self.backend.load_users()
+            if users is not self._users:
+                self._users = users
+                self._by_username = {user.get("username"): user for user in users}
+            return users
+
+    def get_user(self, username):
+        # straight from the backend's username index, the accounts aren't loaded for this
+        return self.backend.find_user(username)
+
+    def add_user(self, user):
+        """Add an account unless the username is taken; returns whether it was added."""
+        with timings.timed("signup"), self.backend.transaction():
+            username = user.get("username")
+            if self.backend.find_user(username) is not None:
+                return False
+
+            # a users list we already hold is kept current, a signup never loads one
+            users = self.load_users() if self._users is not None else None
+            if users is not None:
+                users.append(user)
+                self._by_username[username] = user
+            self.backend.insert_user(users, user)
+            return True
+
+    def authenticate(self, username, password):
+        with timings.timed("login"):
+            user = self.get_user(username)
+        if user and user.get("password") == password:
+            return user
+        return None
+
+    def delete_user(self, username):
+        with self.backend.transaction():
+            users = self.load_users()
+            user = self._by_username.pop(username, None)
+            if user is None:
+                return None
+
+            users.remove(user)
+            self.backend.delete_user(users, username)
+
+            # nobody to lend the books they were waiting for to
+            holds = self.load_holds()
+            for record, position in self._hold_queues.holds_of(username):
+                self._hold_queues.cancel(username, record.get("isbn"))
+                holds.remove(record)
+                self.backend.delete_hold(holds, record.get("isbn"), username)
+            return user
+
+    def _favorite_set(self, username):
+        # the set follows the backend's list, rebuilt only when the list is replaced
+        favorites = self.backend.load_favorites(username)
+        cached = self._favorites.get(username)
+        if cached is None or cached[0] is not favorites:
+            cached = self._favorites[username] = (favorites, set(favorites))
+        return cached
+
+    def load_favorites(self, username):
+        with self.lock:
+            return self._favorite_set(username)[0]
+
+    def is_favorite(self, username, isbn):
+        with self.lock:
+            return isbn in self._favorite_set(username)[1]
+
+    def add_favorite(self, username, isbn):
+        """Add ``isbn`` to the favorites of ``username``; False if it was there already."""
+        with self.backend.transaction():
+            favorites, isbns = self._favorite_set(username)
+            if isbn in isbns:
+                return False
+
+            favorites.append(isbn)
+            isbns.add(isbn)
+            self.backend.insert_favorite(favorites, username, isbn)
+            return True
+
+    def remove_favorite(self, username, isbn):
+        with self.backend.transaction():
+            favorites, isbns = self._favorite_set(username)
+            if isbn not in isbns:
+                return False
+
+            favorites.remove(isbn)
+            isbns.discard(isbn)
+            self.backend.delete_favorite(favorites, username, isbn)
+            return True
+
+    def favorite_books(self, username):
+        """The favorite books of ``username`` in the order they were added, looked up by ISBN."""
+        with self.lock:
+            self._ensure_loaded()
+            return [self._by_isbn[isbn] for isbn in self._favorite_set(username)[0] if isbn in self._by_isbn]
+
+    def get_borrow_rows(self, username=None, status="all", days=7, order=None, today=None):
+        """Borrow records joined with their book title, author and borrower name in one pass.
+
+        ``status`` is "all", "overdue" or "due_soon" (due in the next ``days``
+        days), ``order`` None for the order they were borrowed in, "due_date"
+        or "-due_date"; both come from the due date index. Every row has an
+        ``overdue`` flag.
+        """
+        today = today or date.today().isoformat()
+        with self.lock:
+            self._ensure_loaded()
+            self.load_users()
+            borrows = self.load_borrows()
+
+            if status == "overdue":
+                records = self._due_dates.overdue(today)
+            elif status == "due_soon":
+                records = self._due_dates.due_within(days, today)
+            elif status == "all" and order in ("due_date", "-due_date"):
+                records = self._due_dates.ordered()
+            elif status == "all":
+                records = borrows
+            else:
+                raise ValueError(f"Unknown loan status: {status}")
+            if order == "-due_date":
+                records = records[::-1]
+            elif order not in (None, "due_date"):
+                raise ValueError(f"Unknown loan order: {order}")
+            if status == "all" and order is not None:
+                # the index leaves out loans without a due date, they go last either way
+                records = records + [record for record in borrows if not record.get("due_date")]
+
+            rows = []
+            for record in records:
+                borrower = record.get("username", "")
+                if username is not None and borrower != username:
+                    continue
+
+                book = self._by_isbn.get(record.get("isbn", ""))
+                user = self._by_username.get(borrower)
+
+                row = dict(record)
+                row["book_title"] = book.get("title", "Unknown") if book else "Unknown"
+                row["book_author"] = book.get("author", "Unknown") if book else "Unknown"
+                row["user_name"] = user.get("name", borrower or "Unknown") if user else borrower or "Unknown"
+                row["overdue"] = is_overdue(record, today)
+                rows.append(row)
+            return rows
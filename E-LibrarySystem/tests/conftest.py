@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules import each other by their flat names, as when main.py is run from its folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+
+from storage import JSONBackend, LibraryRepository
+
+
+class BookTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+        self.repository = LibraryRepository(JSONBackend())
+        for isbn in ("1", "2"):
+            self.assertTrue(self.repository.add_book({"isbn": isbn, "title": f"Book {isbn}"}))
+
+    def tearDown(self):
+        self.repository.close()
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def test_isbns_stay_unique(self):
+        self.assertFalse(self.repository.add_book({"isbn": "1", "title": "Copy"}))
+        self.assertFalse(self.repository.update_book("2", {"isbn": "1"}))
+        self.assertIsNone(self.repository.update_book("3", {"isbn": "4"}))
+
+        self.assertEqual([book["title"] for book in self.repository.get_books()], ["Book 1", "Book 2"])
+        self.assertEqual(self.repository.get_book("2")["isbn"], "2")
+        self.assertEqual(self.repository.update_book("2", {"isbn": "3"})["title"], "Book 2")
+        self.assertFalse(self.repository.has_book("2"))
+
+        other = LibraryRepository(JSONBackend())
+        try:
+            self.assertEqual(sorted(book["isbn"] for book in other.get_books()), ["1", "3"])
+        finally:
+            other.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from bulk import export_records, import_books, record_filter
+from loans import new_loan
+from storage import STORAGE_ENGINES, JSONBackend, LibraryRepository, open_backend
+
+
+def isbn10(number):
+    """An ISBN-10 for ``number``, or None when its check digit would be an X."""
+    digits = f"{number:09d}"
+    check = -sum((10 - i) * int(digit) for i, digit in enumerate(digits)) % 11
+    return digits + str(check) if check < 10 else None
+
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+        self.repository = LibraryRepository(JSONBackend())
+        self.repository.add_book({"isbn": "9780306406157", "title": "Already here", "author": "A"})
+
+    def tearDown(self):
+        self.repository.close()
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def write(self, path, text):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_csv_rows_are_checked_like_the_form(self):
+        self.write("books.csv", "Title,Author,ISBN,Genre,Copies\n"
+                                "Dune,Herbert,0-306-40615-2,SF,3\n"
+                                "Dune again,Herbert,0306406152,SF,\n"
+                                "Here,A,978-0-306-40615-7,,\n"
+                                "Typo,B,9780306406158,,\n"
+                                ",C,9781861972712,,\n"
+                                "Zero,D,9781861972712,,0\n"
+                                "Fine,E,9781861972712,,\n")
+        report = import_books(self.repository, "books.csv", workers=1, chunk_size=2, batch_size=1)
+
+        self.assertEqual((report.rows, report.imported, report.duplicates, report.batches), (7, 2, 2, 2))
+        self.assertEqual([reason for _, reason in report.rejected],
+                         ["ISBN check digit does not match", "Missing title",
+                          "Copies must be a whole number of at least 1"])
+        self.assertEqual([line for line, _ in report.rejected], [5, 6, 7])
+        book = self.repository.get_book("0306406152")
+        self.assertEqual((book["title"], book["copies"], book["available_copies"]), ("Dune", 3, 3))
+        self.assertEqual(self.repository.get_book("9781861972712")["title"], "Fine")
+
+    def test_json_lines_in_worker_processes(self):
+        rows = [{"title": f"Book {i}", "author": "A", "isbn": isbn10(i)} for i in range(1, 40) if isbn10(i)]
+        self.write("books.jsonl", "\n".join(json.dumps(row) for row in rows) + "\nnot json\n")
+        report = import_books(self.repository, "books.jsonl", workers=2, chunk_size=5)
+
+        self.assertEqual(report.imported, len(rows))
+        self.assertEqual(report.rejected, [(len(rows) + 1, "Row could not be parsed")])
+        self.assertEqual([book["title"] for book in self.repository.get_books()[1:]], [row["title"] for row in rows])
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def fill(self, repository):
+        for isbn in ("1", "2", "3"):
+            repository.add_book({"isbn": isbn, "title": f"Book {isbn}", "genre": "SF" if isbn != "3" else "Crime"})
+        for username in ("u1", "u2"):
+            repository.add_user({"username": username, "password": "secret", "role": "student"})
+        repository.borrow_book(new_loan("1", "u1", "2026-01-05"))
+        repository.borrow_book(new_loan("2", "u2", "2026-10-10"))
+        repository.update_book("2", {"title": "Renamed"})
+
+    def export(self, backend, collection, fmt, **filters):
+        out = io.StringIO()
+        keep = record_filter(today="2026-10-18", **filters) if filters else None
+        count = export_records(backend, collection, out, fmt, keep, chunk_size=1)
+        out.seek(0)
+        records = list(csv.DictReader(out)) if fmt == "csv" else [json.loads(line) for line in out]
+        self.assertEqual(len(records), count)
+        return records
+
+    def test_every_engine_streams_its_current_records(self):
+        for engine in STORAGE_ENGINES:
+            with self.subTest(engine=engine):
+                # each engine gets its own stores
+                os.chdir(self._directory.name)
+                os.mkdir(engine)
+                os.chdir(engine)
+                repository = LibraryRepository(open_backend(engine))
+                try:
+                    self.fill(repository)
+                    self.check_exports(repository)
+                finally:
+                    repository.close()
+
+    def check_exports(self, repository):
+        books = self.export(repository.backend, "books", "csv", available=False, genre="sf")
+        self.assertEqual([(book["isbn"], book["title"]) for book in books], [("1", "Book 1"), ("2", "Renamed")])
+        users = self.export(repository.backend, "users", "jsonl")
+        self.assertEqual([user["username"] for user in users], ["u1", "u2"])
+        self.assertFalse(any("password" in user for user in users))
+        overdue = self.export(repository.backend, "borrows", "csv", overdue=True)
+        self.assertEqual([(loan["isbn"], loan["username"]) for loan in overdue], [("1", "u1")])
+        self.assertEqual(repository.preview_books(2), repository.get_books()[:2])
+
+    def test_first_page_before_the_catalog_is_loaded(self):
+        repository = LibraryRepository(JSONBackend())
+        self.fill(repository)
+        repository.close()
+
+        repository = LibraryRepository(open_backend("journal"))
+        try:
+            self.assertEqual([book["title"] for book in repository.preview_books(2)], ["Book 1", "Renamed"])
+            self.assertFalse(repository.is_loaded())
+        finally:
+            repository.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
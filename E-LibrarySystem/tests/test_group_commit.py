@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from loans import new_loan
+from storage import GroupCommitWriter, JSONBackend, LibraryRepository
+
+
+class GroupCommitTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_writes_are_batched(self):
+        writer = GroupCommitWriter(window=60)
+        self.addCleanup(writer.close)
+        writer.write("a.json", lambda: "first")
+        writer.write("a.json", lambda: "second")
+        writer.append("b.jsonl", "1\n")
+        writer.append("b.jsonl", "2\n")
+        self.assertTrue(writer.pending())
+        self.assertFalse(os.path.exists("a.json"))
+
+        self.assertEqual(writer.flush(), 4)
+        self.assertEqual(self.read("a.json"), "second")
+        self.assertEqual(self.read("b.jsonl"), "1\n2\n")
+        self.assertEqual(writer.stats()["commits"], 1)
+        self.assertEqual(writer.flush(), 0)
+
+    def test_wait_returns_once_the_batch_is_on_disk(self):
+        writer = GroupCommitWriter(window=0.01)
+        self.addCleanup(writer.close)
+        writer.write("a.json", lambda: "timed")
+        writer.wait(writer.ticket())
+        self.assertEqual(self.read("a.json"), "timed")
+
+        writer = GroupCommitWriter(window=60)
+        self.addCleanup(writer.close)
+        writer.write("b.json", lambda: "now")
+        writer.wait(writer.ticket(), now=True)
+        self.assertEqual(self.read("b.json"), "now")
+
+    def test_a_failed_commit_stays_queued(self):
+        writer = GroupCommitWriter(window=60)
+        self.addCleanup(writer.close)
+        attempts = []
+
+        def render():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise OSError("disk full")
+            return "kept"
+
+        writer.write("a.json", render)
+        with self.assertRaises(OSError):
+            writer.flush()
+        self.assertTrue(writer.pending())
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(self.read("a.json"), "kept")
+
+    def test_concurrent_borrows_share_commits(self):
+        repository = LibraryRepository(JSONBackend(writer=GroupCommitWriter(window=0.05)))
+        self.addCleanup(repository.close)
+        for isbn in range(20):
+            repository.add_book({"isbn": str(isbn), "title": f"Book {isbn}"})
+        commits = repository.backend.writer.stats()["commits"]
+
+        barrier = threading.Barrier(20)
+        results = []
+
+        def borrow(isbn):
+            barrier.wait()
+            results.append(repository.borrow_book(new_loan(str(isbn), f"u{isbn}")))
+
+        threads = [threading.Thread(target=borrow, args=(isbn,)) for isbn in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [True] * 20)
+        self.assertFalse(repository.backend.writer.pending())
+        self.assertLess(repository.backend.writer.stats()["commits"] - commits, 20)
+        other = LibraryRepository(JSONBackend())
+        self.addCleanup(other.close)
+        self.assertEqual(len(other.load_borrows()), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from loans import LOAN_LIMIT, new_loan
+from storage import JSONBackend, LibraryRepository
+
+
+class HoldHandOffTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+        self.repository = LibraryRepository(JSONBackend())
+        for isbn in ("1", "2", "3", "4"):
+            self.repository.add_book({"isbn": isbn, "title": f"Book {isbn}"})
+        for username in ("reader", "busy", "next"):
+            self.repository.add_user({"username": username, "password": "secret"})
+
+    def tearDown(self):
+        self.repository.close()
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def test_holds_need_an_account(self):
+        self.assertTrue(self.repository.borrow_book(new_loan("1", "reader")))
+        self.assertIsNone(self.repository.place_hold("bob", "1"))
+        self.assertEqual(self.repository.place_hold("busy", "1"), 1)
+
+    def test_only_a_returned_copy_serves_a_hold(self):
+        self.repository.update_book("1", {"copies": 2})
+        self.assertTrue(self.repository.borrow_book(new_loan("1", "reader")))
+        self.assertTrue(self.repository.borrow_book(new_loan("1", "busy")))
+        self.assertEqual(self.repository.place_hold("next", "1"), 1)
+
+        self.assertFalse(self.repository.return_book("1", "nobody"))
+        self.assertFalse(self.repository.return_book("2", "reader"))
+        self.assertEqual(self.repository.get_book("1")["available_copies"], 0)
+        self.assertEqual([row["position"] for row in self.repository.get_hold_rows("next")], [1])
+
+    def test_new_copies_go_to_holders(self):
+        self.assertTrue(self.repository.borrow_book(new_loan("1", "reader")))
+        self.assertEqual(self.repository.place_hold("busy", "1"), 1)
+        self.assertEqual(self.repository.place_hold("next", "1"), 2)
+
+        book = self.repository.update_book("1", {"copies": 4})
+        self.assertEqual(self.repository.loan_count("busy"), 1)
+        self.assertEqual(self.repository.loan_count("next"), 1)
+        self.assertEqual(self.repository.get_hold_rows("busy") + self.repository.get_hold_rows("next"), [])
+        self.assertEqual(book["available_copies"], 1)
+
+    def test_holders_at_the_limit_are_passed_over(self):
+        self.assertTrue(self.repository.borrow_book(new_loan("1", "reader")))
+        self.assertEqual(self.repository.place_hold("busy", "1"), 1)
+        self.assertEqual(self.repository.place_hold("next", "1"), 2)
+        for isbn in ("2", "3", "4"):
+            self.assertTrue(self.repository.borrow_book(new_loan(isbn, "busy")))
+
+        loan = self.repository.return_book("1", "reader")
+        self.assertEqual(loan["username"], "next")
+        self.assertEqual(self.repository.loan_count("busy"), LOAN_LIMIT)
+        # still waiting, and first in line for the next copy
+        self.assertEqual([row["position"] for row in self.repository.get_hold_rows("busy")], [1])
+
+        self.assertTrue(self.repository.return_book("2", "busy"))
+        self.assertEqual(self.repository.return_book("1", "next")["username"], "busy")
+        self.assertEqual(self.repository.get_hold_rows("busy"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
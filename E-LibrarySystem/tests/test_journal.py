@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from loans import new_loan
+from storage import JournalBackend, LibraryRepository
+
+
+class JournalReplayTest(unittest.TestCase):
+    def setUp(self):
+        # the stores are relative paths, so every test gets a directory of its own
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+        self.repository = LibraryRepository(JournalBackend())
+
+    def tearDown(self):
+        self.repository.close()
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def reopen(self):
+        """What another desk sees: a second backend replaying the journal from disk."""
+        self.repository.backend.writer.flush()
+        return LibraryRepository(JournalBackend())
+
+    def test_borrow_return_borrow_on_the_same_day(self):
+        self.repository.add_book({"isbn": "1", "title": "Dune", "available": True})
+        loan = new_loan("1", "u1", "2026-01-05")
+        self.assertTrue(self.repository.borrow_book(dict(loan)))
+        self.assertTrue(self.repository.return_book("1", "u1"))
+        self.assertTrue(self.repository.borrow_book(dict(loan)))
+
+        other = self.reopen()
+        try:
+            self.assertEqual(other.load_borrows(), [loan])
+            self.assertFalse(other.get_book("1")["available"])
+            self.assertTrue(other.return_book("1", "u1"))
+            self.assertTrue(other.get_book("1")["available"])
+        finally:
+            other.close()
+
+    def test_logins_follow_the_journal(self):
+        self.repository.add_user({"username": "u1", "password": "secret"})
+        other = JournalBackend()
+        try:
+            self.repository.backend.writer.flush()
+            self.assertEqual(other.find_user("u1")["password"], "secret")
+
+            self.repository.delete_user("u1")
+            self.repository.add_user({"username": "u2", "password": "other"})
+            self.repository.backend.writer.flush()
+            self.assertIsNone(other.find_user("u1"))
+            self.assertEqual(other.find_user("u2")["password"], "other")
+
+            self.repository.backend.compact()
+            self.repository.backend.writer.flush()
+            self.assertIsNone(other.find_user("u1"))
+            self.assertEqual(other.find_user("u2")["password"], "other")
+        finally:
+            other.writer.close()
+
+    def test_one_copy_per_user(self):
+        self.repository.add_book({"isbn": "1", "title": "Dune", "copies": 3})
+        loan = new_loan("1", "u1", "2026-01-05")
+        self.assertTrue(self.repository.borrow_book(dict(loan)))
+        self.assertFalse(self.repository.borrow_book(dict(loan)))
+        self.assertTrue(self.repository.borrow_book(new_loan("1", "u2", "2026-01-05")))
+
+        other = self.reopen()
+        try:
+            self.assertEqual(len(other.load_borrows()), 2)
+            self.assertEqual(other.get_book("1")["available_copies"], 1)
+            self.assertTrue(other.return_book("1", "u1"))
+            self.assertEqual(other.get_book("1")["available_copies"], 2)
+        finally:
+            other.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+from loans import LOAN_LIMIT, DueDateIndex, available_copies, is_overdue, new_loan
+from storage import JSONBackend, LibraryRepository
+
+
+class LoanTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+        self.repository = LibraryRepository(JSONBackend())
+        for isbn in range(LOAN_LIMIT + 1):
+            self.repository.add_book({"isbn": str(isbn), "title": f"Book {isbn}"})
+
+    def tearDown(self):
+        self.repository.close()
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def test_loan_limit(self):
+        for isbn in range(LOAN_LIMIT):
+            self.assertTrue(self.repository.borrow_book(new_loan(str(isbn), "u")))
+        self.assertFalse(self.repository.borrow_book(new_loan(str(LOAN_LIMIT), "u")))
+        self.assertEqual(self.repository.loan_count("u"), LOAN_LIMIT)
+        self.assertEqual(available_copies(self.repository.get_book(str(LOAN_LIMIT))), 1)
+
+        self.assertTrue(self.repository.return_book("0", "u"))
+        self.assertTrue(self.repository.borrow_book(new_loan(str(LOAN_LIMIT), "u")))
+
+
+class DueDateTest(unittest.TestCase):
+    today = "2026-10-18"
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+        self.repository = LibraryRepository(JSONBackend())
+        rng = random.Random(23)
+        start = date.fromisoformat(self.today) - timedelta(days=30)
+        for isbn in range(30):
+            self.repository.add_book({"isbn": str(isbn), "title": f"Book {isbn}"})
+            borrowed = (start + timedelta(days=rng.randrange(30))).isoformat()
+            self.assertTrue(self.repository.borrow_book(new_loan(str(isbn), f"u{isbn % 10}", borrowed)))
+        self.repository.add_book({"isbn": "undated", "title": "Old loan"})
+        self.assertTrue(self.repository.borrow_book({"isbn": "undated", "username": "u10", "borrow_date": "2020-01-01"}))
+
+    def tearDown(self):
+        self.repository.close()
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def rows(self, *args, **kwargs):
+        return [(row["isbn"], row["username"]) for row in
+                self.repository.get_borrow_rows(*args, today=self.today, **kwargs)]
+
+    def test_index_matches_the_overdue_rule(self):
+        borrows = self.repository.load_borrows()
+        index = DueDateIndex()
+        index.build(reversed(borrows))
+        dated = [record for record in borrows if record.get("due_date")]
+
+        self.assertEqual(index.ordered(), sorted(dated, key=lambda record: (record["due_date"], record["username"],
+                                                                             record["isbn"])))
+        self.assertEqual(index.overdue(self.today), [record for record in index.ordered()
+                                                     if is_overdue(record, self.today)])
+        self.assertEqual(index.due_within(3, self.today),
+                         [record for record in index.ordered() if not is_overdue(record, self.today)
+                          and record["due_date"] <= "2026-10-21"])
+
+    def test_borrow_rows(self):
+        borrows = self.repository.load_borrows()
+        self.assertEqual(self.rows(), [(record["isbn"], record["username"]) for record in borrows])
+        ordered = self.rows(order="due_date")
+        self.assertEqual(ordered[-1], ("undated", "u10"))
+        # loans without a due date go last in either order
+        self.assertEqual(self.rows(order="-due_date"), ordered[:-1][::-1] + [("undated", "u10")])
+
+        overdue = self.rows(status="overdue")
+        self.assertEqual(sorted(overdue), sorted((record["isbn"], record["username"]) for record in borrows
+                                                 if is_overdue(record, self.today)))
+        self.assertEqual(sum(self.repository.overdue_counts(self.today).values()), len(overdue))
+        self.assertEqual(self.rows("u1", status="overdue"), [row for row in overdue if row[1] == "u1"])
+
+        isbn, username = overdue[0]
+        self.assertTrue(self.repository.return_book(isbn, username))
+        self.assertEqual(self.rows(status="overdue"), overdue[1:])
+        with self.assertRaises(ValueError):
+            self.rows(status="lost")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from loans import new_loan
+from storage import InterProcessLock, LibraryRepository, _lock_file, open_backend
+
+
+def lock_is_free(path):
+    # closing the file lets go of the lock again
+    with open(path, "a+b") as f:
+        return _lock_file(f, blocking=False)
+
+
+def borrow(directory, engine, username):
+    os.chdir(directory)
+    repository = LibraryRepository(open_backend(engine))
+    try:
+        return repository.borrow_book(new_loan("1", username))
+    finally:
+        repository.close()
+
+
+class InterProcessLockTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+        self.executor = ProcessPoolExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def test_holds_are_counted(self):
+        lock = InterProcessLock(os.path.abspath("library.lock"))
+        lock.acquire()
+        lock.acquire()
+        lock.release()
+        self.assertFalse(self.executor.submit(lock_is_free, lock.path).result())
+        lock.release()
+        self.assertTrue(self.executor.submit(lock_is_free, lock.path).result())
+        self.assertEqual(lock.stats()["acquisitions"], 1)
+
+    def test_processes_never_lend_the_same_copy(self):
+        for engine in ("json", "journal", "sqlite"):
+            with self.subTest(engine=engine):
+                directory = os.path.join(self._directory.name, engine)
+                os.mkdir(directory)
+                os.chdir(directory)
+                repository = LibraryRepository(open_backend(engine))
+                repository.add_book({"isbn": "1", "title": "Dune", "copies": 3})
+                repository.close()
+
+                results = list(self.executor.map(borrow, [directory] * 8, [engine] * 8,
+                                                 [f"u{i}" for i in range(8)]))
+                self.assertEqual(results.count(True), 3)
+                repository = LibraryRepository(open_backend(engine))
+                try:
+                    self.assertEqual(len(repository.load_borrows()), 3)
+                    self.assertEqual(repository.get_book("1")["available_copies"], 0)
+                finally:
+                    repository.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
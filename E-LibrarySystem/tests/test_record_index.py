@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+
+from storage import RecordIndex, write_atomic
+
+
+def line(username, **fields):
+    return json.dumps(dict(fields, username=username)) + "\n"
+
+
+class RecordIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "users.jsonl")
+        self.append(line("u1", name="One") + line("u2", name="Two"))
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def append(self, text):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_appends_are_read_incrementally(self):
+        index = RecordIndex(self.path, "username")
+        self.assertEqual(index.get("u2")["name"], "Two")
+        self.assertIsNone(index.get("u3"))
+
+        self.append(line("u3", name="Three") + line("u1", name="Renamed") + '{"username": "u4"')
+        self.assertEqual(index.get("u3")["name"], "Three")
+        self.assertEqual(index.get("u1")["name"], "Renamed")
+        # the unfinished line is picked up once it is complete
+        self.assertIsNone(index.get("u4"))
+        self.append("}\n")
+        self.assertEqual(index.get("u4"), {"username": "u4"})
+        self.assertEqual(index.stats()["scanned"], 5)
+        self.assertEqual(index.stats()["rebuilds"], 1)
+
+    def test_saved_index_is_reused(self):
+        index = RecordIndex(self.path, "username", save_every=1)
+        index.get("u1")
+        self.assertTrue(os.path.exists(self.path + ".idx"))
+
+        reopened = RecordIndex(self.path, "username")
+        self.assertEqual(reopened.get("u2")["name"], "Two")
+        self.assertEqual(reopened.stats()["scanned"], 0)
+        self.assertEqual(reopened.stats()["rebuilds"], 0)
+
+    def test_rewritten_stores_are_indexed_again(self):
+        index = RecordIndex(self.path, "username")
+        index.get("u1")
+        write_atomic(self.path, line("u2", name="Moved"), durability="off")
+        self.assertIsNone(index.get("u1"))
+        self.assertEqual(index.get("u2")["name"], "Moved")
+
+        # same size and inode, only the key check can tell
+        with open(self.path, "r+", encoding="utf-8") as f:
+            f.write(line("u9", name="Moved"))
+        self.assertIsNone(index.get("u2"))
+        self.assertEqual(index.get("u9")["name"], "Moved")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import random
+import unittest
+
+from search import SearchIndex, book_matches
+
+WORDS = ["Dune", "dusk", "Gödel", "a", "ab", "the", "Thesis", "Ünder", "978-0", "x"]
+
+
+def random_book(rng, isbn):
+    return {"isbn": isbn, "title": " ".join(rng.sample(WORDS, 2)), "author": rng.choice(WORDS),
+            "genre": rng.choice(WORDS + [None, ""])}
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.books = [random_book(rng, str(i)) for i in range(200)]
+        self.index = SearchIndex()
+        self.index.build(self.books)
+        self.queries = ["", "d", "Du", "the", "THESIS", "sis th", "ö", "der", "-0", "9", "nothing", "e d"]
+
+    def scan(self, query):
+        return [book["isbn"] for book in self.books if book_matches(book, query.lower())]
+
+    def test_matches_the_substring_search(self):
+        for query in self.queries:
+            self.assertEqual(self.index.search(query), self.scan(query), query)
+
+    def test_changes_keep_catalog_order(self):
+        self.books[5] = dict(self.books[5], isbn="500", title="Dune Messiah")
+        self.index.update("5", self.books[5])
+        self.index.remove(self.books.pop(7)["isbn"])
+        self.books.append({"isbn": "new", "title": "The Dune Encyclopedia"})
+        self.index.add(self.books[-1])
+
+        self.assertEqual(len(self.index), len(self.books))
+        for query in self.queries + ["messiah", "5"]:
+            self.assertEqual(self.index.search(query), self.scan(query), query)
+
+    def test_removed_grams_leave_no_short_keys(self):
+        index = SearchIndex()
+        index.add({"isbn": "1", "title": "qzj"})
+        self.assertEqual(index.search("zj"), ["1"])
+        index.remove("1")
+        self.assertEqual(index.search("zj"), [])
+        self.assertEqual(index.search("qzj"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from loans import LOAN_LIMIT, new_loan
+from service import RemoteRepository, ServiceError, serve
+from storage import JSONBackend, LibraryRepository
+
+
+class ServiceTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+        self.repository = LibraryRepository(JSONBackend())
+        self.server = serve(self.repository, "desk-key", port=0)
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+        self.url = f"127.0.0.1:{self.server.server_address[1]}"
+        self.client = RemoteRepository(self.url, "desk-key")
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.repository.close()
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def test_accounts_leave_without_passwords(self):
+        self.assertTrue(self.client.add_user({"username": "u1", "password": "secret", "name": "Una"}))
+        self.assertFalse(self.client.add_user({"username": "u1", "password": "other"}))
+
+        self.assertEqual(self.client.authenticate("u1", "secret"), {"username": "u1", "name": "Una"})
+        self.assertIsNone(self.client.authenticate("u1", "wrong"))
+        self.assertEqual(self.client.get_user("u1"), {"username": "u1", "name": "Una"})
+        self.assertEqual(self.client.load_users(), [{"username": "u1", "name": "Una"}])
+
+    def test_changes_need_the_desk_key(self):
+        stranger = RemoteRepository(self.url, "guess")
+        self.addCleanup(stranger.close)
+        with self.assertRaises(ServiceError) as raised:
+            stranger.add_book({"isbn": "1", "title": "Dune"})
+        self.assertEqual(raised.exception.status, 403)
+        self.assertEqual(stranger.get_books(), [])
+
+    def test_catalog_rules_hold_over_the_wire(self):
+        for isbn in range(LOAN_LIMIT + 1):
+            self.assertTrue(self.client.add_book({"isbn": str(isbn), "title": f"Book {isbn}"}))
+        self.assertFalse(self.client.add_book({"isbn": "0", "title": "Again"}))
+        self.assertFalse(self.client.update_book("1", {"isbn": "0"}))
+        self.assertIsNone(self.client.update_book("missing", {"title": "x"}))
+
+        for isbn in range(LOAN_LIMIT):
+            self.assertTrue(self.client.borrow_book(new_loan(str(isbn), "u1")))
+        self.assertFalse(self.client.borrow_book(new_loan(str(LOAN_LIMIT), "u1")))
+        self.assertEqual(self.client.loan_counts(), {"u1": LOAN_LIMIT})
+
+    def test_collections_are_revalidated(self):
+        self.client.add_book({"isbn": "1", "title": "Dune"})
+        books = self.client.get_books()
+        self.assertIs(self.client.get_books(), books)
+
+        self.client.update_book("1", {"title": "Dune Messiah"})
+        self.assertEqual([book["title"] for book in self.client.get_books()], ["Dune Messiah"])
+
+        # another process writing the files, the service's repository picks up a new list
+        self.repository.backend.writer.flush()
+        other = LibraryRepository(JSONBackend())
+        other.add_book({"isbn": "2", "title": "Emma"})
+        other.close()
+        self.assertEqual([book["isbn"] for book in self.client.get_books()], ["1", "2"])
+
+    def test_unexpected_errors_are_reported(self):
+        def fail():
+            raise OSError("disk gone")
+
+        self.repository.overdue_counts = fail
+        with self.assertRaises(ServiceError) as raised:
+            self.client.overdue_counts()
+        self.assertEqual(raised.exception.status, 500)
+        # the connection pool and the service keep working
+        self.assertEqual(self.client.get_books(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
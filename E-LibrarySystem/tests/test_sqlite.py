@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from loans import available_copies, new_loan
+from storage import LibraryRepository, SQLiteBackend, open_backend
+
+
+class SQLiteEngineTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._directory = tempfile.TemporaryDirectory()
+        os.chdir(self._directory.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._directory.cleanup()
+
+    def open(self, engine="sqlite"):
+        repository = LibraryRepository(open_backend(engine))
+        self.addCleanup(repository.close)
+        return repository
+
+    def test_first_run_imports_the_json_stores(self):
+        json_repository = LibraryRepository(open_backend("json"))
+        json_repository.add_book({"isbn": "1", "title": "Dune", "copies": 2})
+        json_repository.add_user({"username": "u1", "password": "secret"})
+        json_repository.borrow_book(new_loan("1", "u1", "2026-01-05"))
+        json_repository.add_favorite("u1", "1")
+        json_repository.close()
+
+        repository = self.open()
+        self.assertEqual([book["title"] for book in repository.get_books()], ["Dune"])
+        self.assertEqual(available_copies(repository.get_book("1")), 1)
+        self.assertEqual(repository.authenticate("u1", "secret")["username"], "u1")
+        self.assertEqual(repository.load_borrows(), [new_loan("1", "u1", "2026-01-05")])
+        self.assertEqual(repository.load_favorites("u1"), ["1"])
+
+    def test_other_connections_see_the_changes(self):
+        repository = self.open()
+        other = self.open()
+        self.assertEqual(other.get_books(), [])
+
+        repository.add_book({"isbn": "1", "title": "Dune"})
+        repository.add_user({"username": "u1", "password": "secret"})
+        self.assertTrue(repository.borrow_book(new_loan("1", "u1", "2026-01-05")))
+        self.assertEqual(available_copies(other.get_book("1")), 0)
+        self.assertEqual(other.loan_count("u1"), 1)
+
+        self.assertTrue(other.return_book("1", "u1"))
+        self.assertEqual(repository.load_borrows(), [])
+        self.assertEqual(available_copies(repository.get_book("1")), 1)
+
+        repository.update_book("1", {"isbn": "2"})
+        self.assertIsNone(other.get_book("1"))
+        self.assertEqual(other.get_book("2")["title"], "Dune")
+
+    def test_unknown_durability(self):
+        with self.assertRaises(ValueError):
+            SQLiteBackend(durability="sometimes")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import json
+import os
+import tempfile
+import unittest
+
+from storage import iter_json_array
+
+
+class JSONArrayStreamTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "books.json")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def stream(self, text, chunk_size):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return list(iter_json_array(self.path, chunk_size))
+
+    def test_items_across_chunk_boundaries(self):
+        items = [1.5, 22, -3e-5, "a, ]", {"isbn": "1", "tags": [1, 2]}, None, True, []]
+        for text in (json.dumps(items), json.dumps(items, indent=4), "[]", " [ ] "):
+            for chunk_size in (1, 2, 3, 7, 1 << 16):
+                self.assertEqual(self.stream(text, chunk_size), json.loads(text), (text, chunk_size))
+
+    def test_damaged_files_raise(self):
+        for text in ("[1.5, 22", "[1.5,", "[1,]", "[1 2]", "[,1]", '[1, "abc', "[tru]", '{"isbn": "1"}', ""):
+            for chunk_size in (1, 3, 1 << 16):
+                with self.assertRaises(json.JSONDecodeError, msg=(text, chunk_size)):
+                    self.stream(text, chunk_size)
+
+    def test_missing_file(self):
+        self.assertEqual(list(iter_json_array(self.path)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()